@@ -1,99 +1,53 @@
 from __future__ import annotations
 
+import hashlib
+import hmac
+import json
 import os
 import re
 import uuid
+from collections import Counter
 from functools import wraps
-from flask import (Flask, render_template, request, redirect, url_for,
-                   flash, session, jsonify, send_from_directory, Response, make_response)
+from flask import (Flask, render_template, request, redirect, url_for, abort,
+                   flash, session, jsonify, send_from_directory, Response, make_response,
+                   stream_with_context)
+from sqlalchemy import func, select
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect
 from config import Config
-from models import db, Category, Product, SiteSetting
+from models import db, Category, Product, SiteSetting, parse_aliases
 from meta_capi import send_capi_event, user_data_from_request
+from catalog_cache import catalog_version, init_catalog_cache, versioned_table
+import catalog_io
+from db_pool import pool_status
+from db_routing import bind_engines, init_db_routing, replicas
+from image_pipeline import to_rgb, write_variants
+from image_migration import job_status, start_migration
+from upload_serving import serve_upload
+from surrogate_keys import init_surrogate_keys, is_private, is_storable, tag as surrogate_tag
+from view_cache import cached_view, init_view_cache, page_event_id
+from catalog_snapshot import (current_snapshot, init_catalog_snapshot, is_disconnect, load_snapshot,
+                              mark_db_down, refresh_snapshot, snapshot_error_page, snapshot_fallback)
+from pagination import InvalidCursor, canonical_cursor, keyset_page, keyset_slice
+from product_index import product_index
+from related_products import related_graph
+from perf import init_perf, route_metrics
+from slowlog import init_slowlog, worst_requests
+from metrics import (IMAGE_JOB_DURATION, init_metrics, record_rate_limit, render_metrics,
+                     sample_pool)
 from seo_aliases import PRODUCT_ALIASES, lookup as seo_lookup
 from guias_data import GUIDES, get_guide, list_guides
 from categories_data import CATEGORY_CONTENT, get_category_content
+from structured_data import product_structured_data
+from template_cache import init_template_cache
+from template_filters import TEMPLATE_FILTERS, img_sm
 
 
-def default_product_faq(product) -> list[dict]:
-    """Generic high-quality B2B FAQ template for products without dedicated
-    guides. Parameterized by product attributes so each product gets a
-    coherent FAQ that actually relates to itself, not boilerplate.
-
-    Used by the producto() route to populate FAQPage schema on every
-    canonical /producto/<slug> page. Products that DO have a dedicated
-    guide pull the richer FAQ from that guide instead.
-    """
-    aliases = product.alias_list[:4] if product.alias_list else []
-    aliases_str = ', '.join(aliases) if aliases else ''
-    cat_lower = product.category.name.lower() if product.category else ''
-    return [
-        {
-            'q': f'¿Qué es {product.name}?',
-            'a': (
-                f'{product.name}'
-                + (f' (también conocido como {aliases_str})' if aliases_str else '')
-                + f' es un producto de la categoría {product.category.name} importado al por mayor por Especias del Paraguay '
-                + (f'desde {product.origin}. ' if product.origin else 'con calidad estable lote a lote. ')
-                + (product.description if product.description else f'Ideal para industria, gastronomía profesional y reventa.')
-            ),
-        },
-        {
-            'q': f'¿De dónde es el origen de {product.name}?',
-            'a': (
-                f'Origen: {product.origin}. Importación directa con certificado de origen y análisis bromatológico básico.'
-                if product.origin else
-                'Importación directa con certificado de origen disponible bajo pedido. Cada lote viene con análisis bromatológico básico.'
-            ),
-        },
-        {
-            'q': '¿Cuál es la presentación al por mayor disponible?',
-            'a': (
-                f'Presentación estándar: {product.presentation}. Para volúmenes mayores se cotiza por proyecto.'
-                if product.presentation else
-                'Presentación según volumen requerido. Consulte por WhatsApp para cotización al volumen específico.'
-            ),
-        },
-        {
-            'q': '¿Hacen entregas a todo el Paraguay?',
-            'a': 'Sí. Despachamos a todo el territorio nacional con factura legal. Para volúmenes mayoristas trabajamos transferencia bancaria y coordinamos logística según destino.',
-        },
-        {
-            'q': '¿Trabajan con factura legal y crédito fiscal IVA?',
-            'a': 'Sí. Toda venta lleva factura legal con IVA discriminado, apta para crédito fiscal y registro contable. Sin factura no operamos.',
-        },
-        {
-            'q': f'¿Cuál es el pedido mínimo para mayoristas de {product.name}?',
-            'a': (
-                f'El formato mayorista de {product.name} es {product.presentation}. Para volúmenes menores y reventa al por menor también atendemos por consulta directa por WhatsApp.'
-                if product.presentation else
-                f'Atendemos cualquier volumen serio. Para consultar disponibilidad y cotización para {product.name}, contactar por WhatsApp.'
-            ),
-        },
-    ]
-
-
-def product_faq_and_howto(product, slug: str) -> tuple[list[dict], dict | None]:
-    """Resolve the FAQ and HowTo data for a product page. If a dedicated
-    editorial guide exists for this product slug, use the curated FAQ +
-    first HowTo from the guide. Otherwise fall back to the generic
-    template. Returns (faq_list, howto_dict_or_None).
-    """
-    guide = get_guide(slug)
-    if guide:
-        faq = guide.get('faq', []) or default_product_faq(product)
-        howto = None
-        for section in guide.get('sections', []):
-            if section.get('howto'):
-                howto = section['howto']
-                break
-        return faq, howto
-    return default_product_faq(product), None
-
 app = Flask(__name__)
 app.config.from_object(Config)
 # Fail loud if SECRET_KEY is missing in production. Config.py auto-generates
@@ -103,7 +57,32 @@ if not app.config.get('SECRET_KEY'):
         'SECRET_KEY environment variable is required in production. '
         'Set it in Railway Variables.'
     )
+# Compiled templates are read from TEMPLATE_CACHE_DIR (see template_cache.py);
+# set up before anything creates app.jinja_env.
+init_template_cache(app)
 db.init_app(app)
+# Request timing (Server-Timing header + per-route histograms). Registered
+# before any other hook so its after_request runs last.
+init_perf(app)
+# Public GETs read from the replicas in DATABASE_REPLICA_URLS, if any
+# (see db_routing.py).
+init_db_routing(app, db)
+# Prometheus collectors (see metrics.py); pool gauges (one set per bind)
+# are refreshed from the request hook at most once a second per worker.
+def sample_pools():
+    for bind, engine in bind_engines(db):
+        sample_pool(bind, pool_status(engine))
+
+
+init_metrics(app, pool_sampler=sample_pools)
+# Slow-request log + sampling profiler (see slowlog.py).
+init_slowlog(app)
+init_catalog_cache()
+init_surrogate_keys(app)
+init_view_cache(app)
+# Serve public pages from the local catalog snapshot while the database is
+# unreachable (see catalog_snapshot.py).
+init_catalog_snapshot(app)
 
 # Rate limiter. In-memory is OK for single-instance deploys; move to Redis
 # later if scaling out. `get_remote_address` reads X-Forwarded-For-aware IP.
@@ -112,6 +91,7 @@ limiter = Limiter(
     app=app,
     default_limits=[],  # no blanket limit; apply per-route explicitly
     storage_uri='memory://',
+    on_breach=record_rate_limit,
 )
 
 # CSRF protection. Active for every POST by default. sendBeacon-style
@@ -136,6 +116,15 @@ def slugify(text):
     text = re.sub(r'[^a-z0-9]+', '-', text)
     return text.strip('-')
 
+def metrics_authorized():
+    """Monitoring endpoints accept a logged-in admin session or, for
+    scrapers, `Authorization: Bearer <METRICS_TOKEN>` when one is set."""
+    if session.get('admin_logged_in'):
+        return True
+    token = app.config.get('METRICS_TOKEN') or ''
+    auth = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(auth, f'Bearer {token}')
+
 def login_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -155,13 +144,25 @@ def add_security_headers(response):
     response.headers['Permissions-Policy'] = 'geolocation=(), microphone=(), camera=()'
     if not app.debug:
         response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
-    # Cache headers for static assets
-    if response.content_type and ('css' in response.content_type or 'javascript' in response.content_type):
-        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
-    elif response.content_type and 'image' in response.content_type:
-        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
-    elif response.content_type and 'text/html' in response.content_type:
-        response.headers['Cache-Control'] = 'public, max-age=300'
+    # Cache headers for static assets. Views that set their own (uploads,
+    # the catalog API) keep them.
+    if 'Cache-Control' not in response.headers or request.endpoint == 'static':
+        if response.content_type and ('css' in response.content_type or 'javascript' in response.content_type):
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        elif response.content_type and 'image' in response.content_type:
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        elif response.content_type and 'text/html' in response.content_type:
+            # Admin and session-bound pages must never come out of a shared
+            # cache; only pages the edge may store get the stale windows.
+            if is_private(response):
+                response.headers['Cache-Control'] = 'private, no-store'
+            elif is_storable(response):
+                response.headers['Cache-Control'] = (
+                    f"public, max-age=300, stale-while-revalidate={app.config['CDN_STALE_WHILE_REVALIDATE']}, "
+                    f"stale-if-error={app.config['CDN_STALE_IF_ERROR']}"
+                )
+            else:
+                response.headers['Cache-Control'] = 'public, max-age=300'
     return response
 
 def save_image(file):
@@ -181,29 +182,11 @@ def save_image(file):
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
     try:
-        img = PILImage.open(file)
-        img.load()  # force decode — raises on fake/corrupt images
-
-        if img.mode == 'RGBA':
-            bg = PILImage.new('RGB', img.size, (255, 255, 255))
-            bg.paste(img, mask=img.split()[3])
-            img = bg
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-
-        sizes = {'': 600, '-sm': 400}
-        for suffix, size in sizes.items():
-            resized = img.copy()
-            w, h = resized.size
-            if w != h:
-                side = min(w, h)
-                left = (w - side) // 2
-                top = (h - side) // 2
-                resized = resized.crop((left, top, left + side, top + side))
-            if max(w, h) > size:
-                resized = resized.resize((size, size), PILImage.LANCZOS)
-            out_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{unique}{suffix}.webp")
-            resized.save(out_path, format='WEBP', quality=85, method=4)
+        with IMAGE_JOB_DURATION.labels('upload').time():
+            img = PILImage.open(file)
+            img.load()  # force decode — raises on fake/corrupt images
+            write_variants(to_rgb(img), app.config['UPLOAD_FOLDER'], unique,
+                           quality=app.config['IMAGE_WEBP_QUALITY'], method=app.config['IMAGE_WEBP_METHOD'])
 
         filename = f"{unique}.webp"
     except Exception:
@@ -216,33 +199,16 @@ def save_image(file):
 
 # ──────────────────── TEMPLATE FILTERS ────────────────────
 
-@app.template_filter('img_sm')
-def img_sm_filter(image_path):
-    """Return the -sm (400px thumbnail) variant of an image path,
-    but ONLY if the -sm file actually exists on disk. Otherwise return
-    the original path so the browser always has a working image."""
-    if not image_path:
-        return image_path
-    if '.' not in image_path:
-        return image_path
-    base, ext = image_path.rsplit('.', 1)
-    sm_path = f"{base}-sm.{ext}"
-
-    # Resolve the filesystem path to check existence
-    sm_filename = sm_path.split('/')[-1]
-    full_path = os.path.join(app.config['UPLOAD_FOLDER'], sm_filename)
-    if os.path.isfile(full_path):
-        # Return the -sm URL using the same prefix as the original
-        prefix = image_path.rsplit('/', 1)[0]  # e.g. /static/uploads or /uploads
-        return f"{prefix}/{sm_filename}"
-    return image_path
+app.jinja_env.filters.update(TEMPLATE_FILTERS)
 
 # ──────────────────── CONTEXT PROCESSOR ────────────────────
 
 @app.context_processor
 def inject_site_settings():
     """Make site settings available in ALL templates."""
-    whatsapp_raw = SiteSetting.get('whatsapp', '')
+    snapshot = current_snapshot()
+    setting = snapshot.setting if snapshot is not None else SiteSetting.get
+    whatsapp_raw = setting('whatsapp', '')
     # Strip everything except digits for the wa.me link
     whatsapp_digits = re.sub(r'[^0-9]', '', whatsapp_raw)
     return {
@@ -250,8 +216,8 @@ def inject_site_settings():
         'site_whatsapp_digits': whatsapp_digits,
         'site_whatsapp_link': f"https://wa.me/{whatsapp_digits}" if whatsapp_digits else '#',
         'site_whatsapp_display': whatsapp_raw if whatsapp_raw else '+595 XXX XXX XXX',
-        'site_email': SiteSetting.get('email', ''),
-        'site_hero_image': SiteSetting.get('hero_image', ''),
+        'site_email': setting('email', ''),
+        'site_hero_image': setting('hero_image', ''),
     }
 
 @app.context_processor
@@ -261,7 +227,7 @@ def inject_meta_tracking():
     return {
         'meta_pixel_id': app.config.get('META_PIXEL_ID') or '',
         'meta_domain_verification': app.config.get('META_DOMAIN_VERIFICATION') or '',
-        'meta_page_event_id': uuid.uuid4().hex,
+        'meta_page_event_id': page_event_id(),
     }
 
 EP_EXTERNAL_ID_COOKIE = '_ep_eid'
@@ -290,7 +256,7 @@ def ensure_external_id_cookie(response):
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
     """Serve uploaded files from Railway persistent volume or local uploads folder."""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return serve_upload(app, filename)
 
 @app.route('/static/uploads/<filename>')
 def static_uploads_fallback(filename):
@@ -298,7 +264,7 @@ def static_uploads_fallback(filename):
     serve from the persistent volume instead of the (empty) static dir.
     In development this route is shadowed by Flask's built-in static handler,
     so it only activates on Railway where static/uploads/ doesn't exist."""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return serve_upload(app, filename)
 
 @app.route('/favicon.ico')
 def favicon():
@@ -308,83 +274,365 @@ def favicon():
 # ──────────────────── PUBLIC ROUTES ────────────────────
 
 @app.route('/')
+@snapshot_fallback
+@cached_view('page_index')
 def index():
-    featured = Product.query.filter_by(active=True, featured=True).order_by(Product.name).limit(8).all()
-    categories = Category.query.order_by(Category.order).all()
+    featured = product_index().featured(limit=8)
+    categories = site_categories()
+    surrogate_tag('catalog')
     return render_template('index.html', featured=featured, categories=categories)
 
+def site_categories():
+    """Categories in menu order."""
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        return snapshot.categories
+    return Category.query.order_by(Category.order).all()
+
+
+def category_or_404(slug):
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        return snapshot.category(slug) or abort(404)
+    return Category.query.filter_by(slug=slug).first_or_404()
+
+
+def active_product_or_404(slug):
+    """Active product with its category loaded."""
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        return snapshot.product(slug) or abort(404)
+    return (Product.query.options(joinedload(Product.category))
+            .filter_by(slug=slug, active=True).first_or_404())
+
+
+def _listing_query(category=None):
+    query = Product.query.filter_by(active=True)
+    if category is not None:
+        query = query.filter_by(category_id=category.id)
+    return query
+
+
+# Listing cursors in canonical form for the view cache keys.
+CURSOR_ARGS = {'after': canonical_cursor, 'before': canonical_cursor}
+
+
+def page_cursor():
+    """('after' | 'before', canonical cursor) the listing page is addressed
+    by, or None on page one. `after` wins, as in keyset_page()."""
+    for arg in ('after', 'before'):
+        if request.args.get(arg):
+            try:
+                return arg, canonical_cursor(request.args[arg])
+            except InvalidCursor:
+                abort(400)
+    return None
+
+
+def catalog_page(category=None):
+    """Current page of the listing from the `after` / `before` cursor
+    query args, with each product's category eager-loaded for the cards."""
+    snapshot = current_snapshot()
+    try:
+        if snapshot is not None:
+            return keyset_slice(
+                snapshot.listing(category), app.config['CATALOG_PAGE_SIZE'],
+                after=request.args.get('after'), before=request.args.get('before'),
+            )
+        query = _listing_query(category).options(joinedload(Product.category))
+        return keyset_page(
+            query, Product.name, Product.id, app.config['CATALOG_PAGE_SIZE'],
+            after=request.args.get('after'), before=request.args.get('before'),
+        )
+    except InvalidCursor:
+        abort(400)
+
+
+# Longest search query the listing API accepts.
+SEARCH_QUERY_MAX = 100
+
+
+def search_page(query, category=None):
+    """Page of the products matching `query` (see ProductIndex.search),
+    addressed by the same cursors as the listing."""
+    matches = product_index().search(query, category.id if category is not None else None)
+    try:
+        return keyset_slice(
+            matches, app.config['CATALOG_PAGE_SIZE'],
+            after=request.args.get('after'), before=request.args.get('before'),
+        )
+    except InvalidCursor:
+        abort(400)
+
+
+def _build_alias_pools(limit=30):
+    """{category id: pool, None: whole-catalog pool} in one pass over the
+    product index, featured products first, then by name."""
+    # The index is in name order; a stable sort keeps it within each group.
+    products = sorted((p for p in product_index() if p.alias_list), key=lambda p: not p.featured)
+    pools, seen = {}, {}
+    for p in products:
+        for scope in (None, p.category_id):
+            pool = pools.setdefault(scope, [])
+            if len(pool) >= limit:
+                continue
+            keys = seen.setdefault(scope, set())
+            for a in p.alias_list:
+                key = a.lower()
+                if key in keys:
+                    continue
+                keys.add(key)
+                pool.append(a)
+                if len(pool) >= limit:
+                    break
+    return {scope: tuple(pool) for scope, pool in pools.items()}
+
+
+def listing_alias_pool(category=None):
+    """Aggregated, deduped alias pool for the listing page's SEO blocks.
+
+    Featured products contribute their aliases first so the head-of-list
+    in meta tags and the "Incluye:" header surfaces the highest-volume
+    search terms (manzanilla, canela, etc.) ahead of alphabetical noise.
+    Cap at 30 keeps meta tags within reasonable size limits. Pools for the
+    whole catalog and every category are built together once per catalog
+    version."""
+    pools = versioned_table('alias_pools', _build_alias_pools)
+    return pools.get(category.id if category is not None else None, ())
+
+
+def product_card(p):
+    """Card payload for the infinite-scroll listing; mirrors the product
+    card markup in productos.html."""
+    return {
+        'slug': p.slug,
+        'name': p.name,
+        'url': url_for('producto', slug=p.slug),
+        'category_name': p.category_name,
+        'origin': p.origin or '',
+        'presentation': p.presentation or '',
+        'image': img_sm(p.image) if p.image else '',
+        'aliases': list(p.alias_list),
+        'scientific_name': p.scientific_name or '',
+    }
+
+
 @app.route('/productos')
 @app.route('/productos/<slug>')
+@snapshot_fallback
+@cached_view('page_productos', vary_args=('after', 'before'), normalize=CURSOR_ARGS)
 def productos(slug=None):
-    categories = Category.query.order_by(Category.order).all()
-    cat_counts = {c.id: Product.query.filter_by(active=True, category_id=c.id).count() for c in categories}
-    total_count = Product.query.filter_by(active=True).count()
-    if slug:
-        cat = Category.query.filter_by(slug=slug).first_or_404()
-        products = Product.query.filter_by(active=True, category_id=cat.id).order_by(Product.name).all()
-        current_cat = cat
-    else:
-        products = Product.query.filter_by(active=True).order_by(Product.name).all()
-        current_cat = None
-    # Aggregated, deduped alias pool for the listing page's SEO blocks.
-    # Featured products contribute their aliases first so the head-of-list
-    # in meta tags and the "Incluye:" header surfaces the highest-volume
-    # search terms (manzanilla, canela, etc.) ahead of alphabetical noise.
-    # Cap at 30 keeps meta tags within reasonable size limits.
-    products_for_aliases = sorted(products, key=lambda p: (not p.featured, p.name))
-    alias_pool: list[str] = []
-    seen: set[str] = set()
-    for p in products_for_aliases:
-        for a in p.alias_list:
-            key = a.lower()
-            if key in seen:
-                continue
-            seen.add(key)
-            alias_pool.append(a)
-            if len(alias_pool) >= 30:
-                break
-        if len(alias_pool) >= 30:
-            break
+    categories = site_categories()
+    cat_counts = Counter(p.category_id for p in product_index())
+    total_count = sum(cat_counts.values())
+    current_cat = category_or_404(slug) if slug else None
+    page = catalog_page(current_cat)
+    alias_pool = listing_alias_pool(current_cat)
     # Editorial intro + FAQ for category hub pages. None when on the
     # all-products page (no current_cat) or when the category was not
     # curated yet — the template gates the render with `if`.
     category_content = get_category_content(current_cat.slug) if current_cat else None
+    surrogate_tag('catalog', current_cat and f'category:{current_cat.slug}')
     return render_template(
         'productos.html',
-        products=products, categories=categories, current_cat=current_cat,
-        cat_counts=cat_counts, total_count=total_count, alias_pool=alias_pool,
+        products=page.items, page=page, page_cursor=page_cursor(), categories=categories,
+        current_cat=current_cat, cat_counts=cat_counts, total_count=total_count, alias_pool=alias_pool,
         category_content=category_content,
     )
 
+@app.route('/api/productos/pagina')
+@snapshot_fallback
+@cached_view('api_productos_pagina', vary_args=('categoria', 'after', 'before'), bypass_args=('q',),
+             normalize=CURSOR_ARGS)
+def api_productos_pagina():
+    """Infinite-scroll feed for the listing: one page of card data plus
+    the cursors for the neighbouring pages. With `q`, pages through the
+    search results instead (the listing's search box)."""
+    slug = request.args.get('categoria')
+    category = category_or_404(slug) if slug else None
+    query = request.args.get('q', '').strip()[:SEARCH_QUERY_MAX]
+    page = search_page(query, category) if query else catalog_page(category)
+    surrogate_tag('catalog', category and f'category:{category.slug}')
+    return jsonify({
+        'items': [product_card(p) for p in page.items],
+        'next': page.next_cursor,
+        'prev': page.prev_cursor,
+    })
+
 @app.route('/producto/<slug>')
+@snapshot_fallback
 def producto(slug):
-    product = Product.query.filter_by(slug=slug, active=True).first_or_404()
-    related = Product.query.filter(
-        Product.category_id == product.category_id,
-        Product.id != product.id,
-        Product.active == True
-    ).limit(4).all()
+    product = active_product_or_404(slug)
+    related = related_graph().related(product.id, limit=4)
     # FAQPage and HowTo schema population. If the product has a dedicated
-    # guide we reuse the curated FAQ and HowTo; otherwise the helper
-    # synthesizes a high-quality B2B FAQ from the product's own attributes.
-    faq, howto = product_faq_and_howto(product, slug)
-    # If a dedicated guide exists, expose the URL so the product page can
-    # promote it as an authoritative deep dive related to this product.
-    has_guide = bool(get_guide(slug))
+    # guide we reuse the curated FAQ and HowTo; otherwise a high-quality B2B
+    # FAQ is synthesized from the product's own attributes. `has_guide` lets
+    # the page promote the guide as an authoritative deep dive. All of it,
+    # plus the serialized JSON-LD, is memoized per product version.
+    structured = product_structured_data(product)
+    # Related products can come from other categories; tag each one so
+    # renaming or hiding it purges the pages linking to it.
+    surrogate_tag(f'product:{product.slug}', f'category:{product.category.slug}',
+                  *(f'product:{r.slug}' for r in related))
     return render_template(
         'producto.html', product=product, related=related,
-        faq=faq, howto=howto, has_guide=has_guide,
+        faq=structured.faq, howto=structured.howto, has_guide=structured.has_guide,
+        json_ld=structured.json_ld,
     )
 
 @app.route('/api/producto/<slug>')
+@snapshot_fallback
 def api_producto(slug):
-    product = Product.query.filter_by(slug=slug, active=True).first_or_404()
+    product = active_product_or_404(slug)
+    surrogate_tag(f'product:{product.slug}')
     return jsonify(product.to_dict())
 
+# Upper bound on slugs per /api/productos/lote call; the client batches
+# visible cards well under this.
+PRODUCT_BATCH_MAX = 60
+
+
+@app.route('/api/productos/lote')
+def api_productos_lote():
+    """Detail payloads for many products at once (`slugs=a,b,c`), for the
+    product modal prefetch. One query; unknown or inactive slugs come back
+    under `missing`."""
+    slugs = list(dict.fromkeys(s.strip() for s in request.args.get('slugs', '').split(',') if s.strip()))
+    if not slugs:
+        return jsonify({'error': 'slugs is required'}), 400
+    if len(slugs) > PRODUCT_BATCH_MAX:
+        return jsonify({'error': f'at most {PRODUCT_BATCH_MAX} slugs per request'}), 400
+    etag = hashlib.sha1(f"{catalog_version()}|{','.join(slugs)}".encode('utf-8')).hexdigest()
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'public, no-cache'}
+    surrogate_tag(*(f'product:{s}' for s in slugs))
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    products = (Product.query.options(joinedload(Product.category))
+                .filter(Product.slug.in_(slugs), Product.active == True).all())
+    found = {p.slug: p.to_dict() for p in products}
+    response = jsonify({'products': found, 'missing': [s for s in slugs if s not in found]})
+    response.headers.update(headers)
+    return response
+
+# Columns the bulk catalog API can return, by output field name. The
+# category columns come from a join, so no row triggers a lazy load.
+CATALOG_API_FIELDS = {
+    'id': Product.id,
+    'slug': Product.slug,
+    'name': Product.name,
+    'category_id': Product.category_id,
+    'category_name': Category.name,
+    'category_slug': Category.slug,
+    'origin': Product.origin,
+    'description': Product.description,
+    'presentation': Product.presentation,
+    'image': Product.image,
+    'featured': Product.featured,
+    'aliases': Product.aliases,
+    'scientific_name': Product.scientific_name,
+    'updated_at': Product.updated_at,
+}
+
+
+def _api_value(field, value):
+    if field == 'aliases':
+        return list(parse_aliases(value))
+    if field == 'updated_at':
+        return value.isoformat() + 'Z' if value else None
+    return value
+
+
+def _parse_updated_since(raw):
+    from datetime import datetime, timezone
+    try:
+        since = datetime.fromisoformat(raw)
+    except ValueError:
+        return None
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+
+@app.route('/api/productos')
+@limiter.limit('30 per minute')
+def api_productos():
+    """Bulk catalog export for distributors' sync jobs.
+
+    Query args: `format` (json | ndjson, or Accept: application/x-ndjson),
+    `fields` (comma-separated subset of CATALOG_API_FIELDS), `categoria`
+    (category slug) and `updated_since` (ISO 8601, UTC when naive). The body
+    is streamed from one joined query; the ETag covers the catalog version
+    and the matching rows' count and newest updated_at, so an unchanged
+    catalog costs two small queries and a 304.
+    """
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'ndjson' if 'application/x-ndjson' in request.headers.get('Accept', '') else 'json'
+    if fmt not in ('json', 'ndjson'):
+        return jsonify({'error': 'format must be json or ndjson'}), 400
+
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    fields = fields or list(CATALOG_API_FIELDS)
+    unknown = [f for f in fields if f not in CATALOG_API_FIELDS]
+    if unknown:
+        return jsonify({'error': f"unknown fields: {', '.join(unknown)}",
+                        'fields': list(CATALOG_API_FIELDS)}), 400
+
+    filters = [Product.active == True]
+    category_slug = request.args.get('categoria', '')
+    if category_slug:
+        filters.append(Category.slug == category_slug)
+    since_raw = request.args.get('updated_since', '')
+    if since_raw:
+        since = _parse_updated_since(since_raw)
+        if since is None:
+            return jsonify({'error': 'updated_since must be an ISO 8601 timestamp'}), 400
+        filters.append(Product.updated_at > since)
+
+    count, newest = db.session.execute(
+        select(func.count(Product.id), func.max(Product.updated_at))
+        .join(Category, Product.category_id == Category.id).where(*filters)
+    ).one()
+    etag = hashlib.sha1('|'.join(map(str, (
+        catalog_version(), count, newest, fmt, ','.join(fields), category_slug, since_raw,
+    ))).encode('utf-8')).hexdigest()
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'public, no-cache', 'Vary': 'Accept',
+               'X-Total-Count': str(count)}
+    surrogate_tag('catalog')
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    stmt = (
+        select(*(CATALOG_API_FIELDS[f] for f in fields))
+        .select_from(Product).join(Category, Product.category_id == Category.id)
+        .where(*filters).order_by(Product.id)
+        .execution_options(yield_per=500)
+    )
+
+    def generate():
+        rows = db.session.execute(stmt)
+        if fmt == 'json':
+            yield '['
+        first = True
+        for row in rows:
+            item = json.dumps({f: _api_value(f, v) for f, v in zip(fields, row)}, ensure_ascii=False)
+            if fmt == 'ndjson':
+                yield item + '\n'
+            else:
+                yield item if first else ',\n' + item
+            first = False
+        if fmt == 'json':
+            yield ']'
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers=headers)
+
 # ──────────────────── GUÍAS / EDITORIAL CONTENT ────────────────────
 
 @app.route('/guias')
 @app.route('/guias/')
+@snapshot_fallback
+@cached_view('page_guias')
 def guias_index():
     """Editorial index page: listing of all curated long-form guides.
 
@@ -396,17 +644,14 @@ def guias_index():
     guides = list_guides()
     # Hydrate each guide summary with its related product (image, aliases)
     # so the index can render with editorial treatment.
-    enriched = []
-    for g in guides:
-        product = Product.query.filter_by(slug=g['product_slug'], active=True).first()
-        enriched.append({
-            **g,
-            'product': product,
-        })
+    products = product_index().get_many(g['product_slug'] for g in guides)
+    enriched = [{**g, 'product': products.get(g['product_slug'])} for g in guides]
+    surrogate_tag('catalog')
     return render_template('guias/index.html', guides=enriched)
 
 
 @app.route('/guias/<slug>')
+@snapshot_fallback
 def guia_detail(slug):
     """Single editorial guide. Falls back to 404 if the slug isn't curated.
 
@@ -421,37 +666,32 @@ def guia_detail(slug):
     guide = get_guide(slug)
     if not guide:
         return render_template('404.html'), 404
-    product = Product.query.filter_by(slug=guide['product_slug'], active=True).first()
-    related_guides = []
-    for rs in guide.get('related_slugs', []):
-        rg = get_guide(rs)
-        if rg:
-            related_guides.append({
-                'slug': rs,
-                'title': rg['title'],
-                'dek': rg['dek'],
-                'category': rg['category'],
-                'product_slug': rg['product_slug'],
-                'reading_time': rg['reading_time'],
-                'product': Product.query.filter_by(slug=rg['product_slug'], active=True).first(),
-            })
-    # Extra image variety: pull up to 6 OTHER products from the same category
+    linked = [(rs, get_guide(rs)) for rs in guide.get('related_slugs', [])]
+    linked = [(rs, rg) for rs, rg in linked if rg]
+    # The guide's own product and every related guide's product, from the
+    # worker-resident summary index.
+    products = product_index().get_many(
+        [guide['product_slug']] + [rg['product_slug'] for _, rg in linked]
+    )
+    product = products.get(guide['product_slug'])
+    related_guides = [
+        {
+            'slug': rs,
+            'title': rg['title'],
+            'dek': rg['dek'],
+            'category': rg['category'],
+            'product_slug': rg['product_slug'],
+            'reading_time': rg['reading_time'],
+            'product': products.get(rg['product_slug']),
+        }
+        for rs, rg in linked
+    ]
+    # Extra image variety: up to 6 OTHER products from the same category
     # (excluding the guide's main product) so the mid-article gallery has real
     # photos to show. Falls back to empty list if the product is detached.
-    category_products = []
-    if product:
-        category_products = (
-            Product.query
-            .filter(
-                Product.category_id == product.category_id,
-                Product.id != product.id,
-                Product.active == True,
-                Product.image != '',
-            )
-            .order_by(Product.featured.desc(), Product.name)
-            .limit(6)
-            .all()
-        )
+    category_products = related_graph().gallery(product.id, limit=6) if product else []
+    surrogate_tag(f'guide:{slug}', *(f'product:{s}' for s in products),
+                  product and f'category:{product.category_slug}')
     return render_template(
         'guias/article.html',
         guide=guide, product=product, related_guides=related_guides,
@@ -476,6 +716,8 @@ Sitemap: https://www.graos.com.py/sitemap-products.xml
     return Response(content, mimetype='text/plain')
 
 @app.route('/sitemap.xml')
+@snapshot_fallback
+@cached_view('sitemap')
 def sitemap():
     from datetime import datetime as dt
     today = dt.utcnow().strftime('%Y-%m-%d')
@@ -488,12 +730,11 @@ def sitemap():
     pages.append({'loc': base + '/nosotros', 'priority': '0.7', 'changefreq': 'monthly', 'lastmod': today})
     pages.append({'loc': base + '/contacto', 'priority': '0.7', 'changefreq': 'monthly', 'lastmod': today})
     # Category pages
-    categories = Category.query.order_by(Category.order).all()
+    categories = site_categories()
     for c in categories:
         pages.append({'loc': base + '/productos/' + c.slug, 'priority': '0.8', 'changefreq': 'weekly', 'lastmod': today})
     # Product pages
-    products = Product.query.filter_by(active=True).all()
-    for p in products:
+    for p in product_index():
         lastmod = p.created_at.strftime('%Y-%m-%d') if p.created_at else today
         pages.append({'loc': base + '/producto/' + p.slug, 'priority': '0.8', 'changefreq': 'weekly', 'lastmod': lastmod})
     # Editorial guides (long-form content, high SEO priority for topic clusters)
@@ -517,9 +758,12 @@ def sitemap():
     xml += '</urlset>'
     response = make_response(xml)
     response.headers['Content-Type'] = 'application/xml'
+    surrogate_tag('catalog')
     return response
 
 @app.route('/sitemap-products.xml')
+@snapshot_fallback
+@cached_view('sitemap_products')
 def sitemap_products():
     from datetime import datetime as dt
     today = dt.utcnow().strftime('%Y-%m-%d')
@@ -527,8 +771,7 @@ def sitemap_products():
     xml = '<?xml version="1.0" encoding="UTF-8"?>\n'
     xml += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"\n'
     xml += '        xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">\n'
-    products = Product.query.filter_by(active=True).all()
-    for p in products:
+    for p in product_index():
         lastmod = p.created_at.strftime('%Y-%m-%d') if p.created_at else today
         xml += '  <url>\n'
         xml += f'    <loc>{base}/producto/{p.slug}</loc>\n'
@@ -547,17 +790,21 @@ def sitemap_products():
     xml += '</urlset>'
     response = make_response(xml)
     response.headers['Content-Type'] = 'application/xml'
+    surrogate_tag('catalog')
     return response
 
 @app.errorhandler(404)
+@snapshot_error_page
 def page_not_found(e):
     return render_template('404.html'), 404
 
 @app.route('/nosotros')
+@snapshot_fallback
 def nosotros():
     return render_template('nosotros.html')
 
 @app.route('/contacto', methods=['GET', 'POST'])
+@snapshot_fallback
 @limiter.limit('3 per 10 minutes', methods=['POST'])
 def contacto():
     if request.method == 'POST':
@@ -605,6 +852,16 @@ def api_meta_capi_event():
     )
     return ('', 204)
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape target, merged across gunicorn workers. Requires
+    the METRICS_TOKEN bearer token (or an admin session); anyone else gets
+    a plain 404. gunicorn.conf.py can also serve it on METRICS_PORT."""
+    if not metrics_authorized():
+        return render_template('404.html'), 404
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
 # ──────────────────── ADMIN ROUTES ────────────────────
 
 @app.route('/admin/login', methods=['GET', 'POST'])
@@ -627,77 +884,19 @@ def admin_logout():
     session.pop('admin_logged_in', None)
     return redirect(url_for('admin_login'))
 
-@app.route('/admin/migrate-images')
+@app.route('/admin/migrate-images', methods=['GET', 'POST'])
 @login_required
 def admin_migrate_images():
-    """Full image migration: sync paths, copy WebP to volume, fix all DB paths."""
-    import json, shutil
-    volume = os.environ.get('RAILWAY_VOLUME_MOUNT_PATH')
-    results = []
-
-    # Step 1: Copy ALL WebP files from static/uploads/ to Railway volume
-    copied = 0
-    if volume:
-        src_dir = os.path.join(app.root_path, 'static', 'uploads')
-        dst_dir = os.path.join(volume, 'uploads')
-        os.makedirs(dst_dir, exist_ok=True)
-        if os.path.isdir(src_dir):
-            for f in os.listdir(src_dir):
-                src = os.path.join(src_dir, f)
-                dst = os.path.join(dst_dir, f)
-                if os.path.isfile(src) and not os.path.exists(dst):
-                    shutil.copy2(src, dst)
-                    copied += 1
-        results.append(f'Copied {copied} files to volume')
-
-    # Step 2: For every product, ensure image path points to existing WebP
-    fixed = 0
-    for p in Product.query.all():
-        if not p.image:
-            continue
-        old_path = p.image
-        new_path = old_path
-        # Fix /static/uploads/ → /uploads/ on Railway
-        if volume and new_path.startswith('/static/uploads/'):
-            new_path = new_path.replace('/static/uploads/', '/uploads/')
-        # Fix .png → .webp if WebP exists
-        if new_path.endswith('.png'):
-            webp_path = new_path.rsplit('.', 1)[0] + '.webp'
-            # Check if WebP file actually exists
-            if volume:
-                check_dir = os.path.join(volume, 'uploads')
-            else:
-                check_dir = os.path.join(app.root_path, 'static', 'uploads')
-            webp_filename = webp_path.split('/')[-1]
-            if os.path.exists(os.path.join(check_dir, webp_filename)):
-                new_path = webp_path
-        if new_path != old_path:
-            p.image = new_path
-            fixed += 1
-    db.session.commit()
-    results.append(f'Fixed {fixed} DB image paths')
-
-    # Step 3: Fill empty images from seed_data.json
-    data_path = os.path.join(os.path.dirname(__file__), 'seed_data.json')
-    synced = 0
-    if os.path.exists(data_path):
-        with open(data_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        seed_map = {p['slug']: p.get('image', '') for p in data['products']}
-        for p in Product.query.filter((Product.image == '') | (Product.image == None)).all():
-            seed_img = seed_map.get(p.slug, '')
-            if seed_img:
-                if volume:
-                    seed_img = seed_img.replace('/static/uploads/', '/uploads/')
-                if seed_img.endswith('.png'):
-                    seed_img = seed_img.rsplit('.', 1)[0] + '.webp'
-                p.image = seed_img
-                synced += 1
-        db.session.commit()
-    results.append(f'Synced {synced} empty products from seed')
-
-    flash(' | '.join(results), 'success')
-    return redirect(url_for('admin_dashboard'))
+    """Image migration (copy to the volume, fix DB paths, fill empty images
+    from the seed). Runs as a resumable background job; GET shows progress."""
+    state_path = app.config['IMAGE_MIGRATION_STATE_PATH']
+    if request.method == 'POST':
+        if start_migration(app, state_path):
+            flash('Migración de imágenes iniciada', 'success')
+        else:
+            flash('La migración ya está en curso', 'error')
+        return redirect(url_for('admin_migrate_images'))
+    return render_template('admin/migrate_images.html', job=job_status(state_path))
 
 @app.route('/admin')
 @login_required
@@ -712,6 +911,43 @@ def admin_dashboard():
         active_products=active_products,
         featured_products=featured_products)
 
+@app.route('/admin/db-pool')
+@login_required
+def admin_db_pool():
+    """Connection pool snapshot for this worker (JSON), for monitoring:
+    the primary's pool at the top level, each read replica's pool and
+    health under `replicas`."""
+    status = pool_status(db.engine)
+    engines = dict(bind_engines(db))
+    if replicas():
+        status['replicas'] = {
+            name: {**pool_status(engines[name]), **replica.status()}
+            for name, replica in replicas().items()
+        }
+    return jsonify(status)
+
+@app.route('/admin/rendimiento')
+@login_required
+def admin_slow_requests():
+    """Worst requests from the slow-request log, with their SQL and, when
+    the request was sampled, its heaviest stacks."""
+    entries, by_endpoint = worst_requests(app)
+    return render_template('admin/slow_requests.html',
+        entries=entries, by_endpoint=by_endpoint,
+        threshold_ms=app.config['SLOW_REQUEST_MS'])
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    """Per-route latency histograms and DB/template/HTTP/fs time totals
+    for the worker that answers, plus its connection pool snapshot."""
+    if not metrics_authorized():
+        return redirect(url_for('admin_login'))
+    return jsonify({
+        'worker_pid': os.getpid(),
+        'routes': route_metrics(),
+        'db_pool': pool_status(db.engine),
+    })
+
 # ── Admin Categories ──
 
 @app.route('/admin/categorias')
@@ -822,6 +1058,59 @@ def admin_product_delete(id):
     flash('Producto eliminado', 'success')
     return redirect(url_for('admin_products'))
 
+IMPORT_PREVIEW_ROWS = 20
+
+@app.route('/admin/productos/importar', methods=['GET', 'POST'])
+@login_required
+def admin_product_import():
+    """Bulk create/update products from CSV, XLSX or JSON, keyed by slug.
+    Always validates the whole file first; nothing is written when any row
+    fails or when "solo validar" is checked."""
+    if request.method == 'GET':
+        return render_template('admin/product_import.html', plan=None)
+
+    file = request.files.get('file')
+    if not file or not file.filename:
+        flash('Seleccione un archivo', 'error')
+        return redirect(url_for('admin_product_import'))
+    try:
+        rows = catalog_io.read_rows(file.stream, file.filename)
+    except catalog_io.ImportFileError as exc:
+        flash(str(exc), 'error')
+        return redirect(url_for('admin_product_import'))
+
+    plan = catalog_io.plan_import(rows, slugify)
+    dry_run = request.form.get('dry_run') == 'on'
+    applied = False
+    if plan.ok and not dry_run and (plan.inserts or plan.updates):
+        catalog_io.apply_import(plan)
+        applied = True
+        app.logger.info('catalog import %s: %s', file.filename, plan.summary())
+        flash(f'Importación aplicada: {len(plan.inserts)} nuevos, '
+              f'{len(plan.updates)} actualizados', 'success')
+    elif not plan.ok:
+        flash('El archivo tiene errores; no se aplicó ningún cambio', 'error')
+    return render_template('admin/product_import.html', plan=plan, applied=applied,
+                           dry_run=dry_run, filename=file.filename,
+                           preview=IMPORT_PREVIEW_ROWS)
+
+@app.route('/admin/productos/exportar')
+@login_required
+def admin_product_export():
+    fmt = request.args.get('formato', 'csv')
+    if fmt not in catalog_io.FORMATS:
+        abort(400)
+    filename = f'productos.{fmt}'
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if fmt == 'xlsx':
+        return Response(
+            catalog_io.export_xlsx(), headers=headers,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    generate = catalog_io.export_csv if fmt == 'csv' else catalog_io.export_json
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/json'
+    return Response(stream_with_context(generate()), headers=headers,
+                    content_type=f'{mimetype}; charset=utf-8')
+
 # ── Admin Settings ──
 
 @app.route('/admin/configuracion', methods=['GET', 'POST'])
@@ -911,6 +1200,47 @@ def _ensure_seo_columns():
         app.logger.info('SEO migration: added columns %s to products', added)
 
 
+def _ensure_updated_at():
+    """Idempotent ALTER TABLE for `products.updated_at` (the catalog API's
+    updated_since filter and the per-product cache keys). Existing rows are
+    backfilled from created_at so they don't all look brand new."""
+    from sqlalchemy import inspect, text
+    existing_cols = {c['name'] for c in inspect(db.engine).get_columns('products')}
+    if 'updated_at' in existing_cols:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text("ALTER TABLE products ADD COLUMN updated_at TIMESTAMP"))
+        conn.execute(text("UPDATE products SET updated_at = created_at WHERE updated_at IS NULL"))
+    app.logger.info('Catalog migration: added updated_at to products')
+
+
+def _ensure_indexes():
+    """Idempotent CREATE INDEX for every index declared on the models.
+
+    `db.create_all()` only creates indexes together with a brand new table,
+    so databases that predate an index never get it. This walks the
+    declared indexes, skips the ones the inspector already sees and issues
+    `CREATE INDEX IF NOT EXISTS` for the rest — a syntax both SQLite and
+    PostgreSQL accept, which also keeps concurrent worker boots from
+    tripping over each other.
+    """
+    from sqlalchemy import inspect
+    from sqlalchemy.schema import CreateIndex
+    inspector = inspect(db.engine)
+
+    created = []
+    with db.engine.begin() as conn:
+        for table in (Category.__table__, Product.__table__):
+            existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                if index.name in existing:
+                    continue
+                conn.execute(CreateIndex(index, if_not_exists=True))
+                created.append(index.name)
+    if created:
+        app.logger.info('Index migration: created %s', created)
+
+
 def _backfill_seo_aliases():
     """For every product whose aliases column is empty, look up the curated
     aliases in seo_aliases.PRODUCT_ALIASES and write them in. Runs on every
@@ -934,30 +1264,18 @@ def _backfill_seo_aliases():
 
 def init_db():
     """Create tables and run seed if database is empty."""
-    db.create_all()
+    # Primary only; read replicas get the schema through replication.
+    db.create_all(bind_key=None)
     _ensure_seo_columns()
+    _ensure_updated_at()
+    _ensure_indexes()
     if Category.query.count() == 0:
         # First run — seed all data
-        import json
         data_path = os.path.join(os.path.dirname(__file__), 'seed_data.json')
         with open(data_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
-        for c in data['categories']:
-            db.session.add(Category(name=c['name'], slug=c['slug'], order=c['order']))
-        db.session.commit()
-        for p in data['products']:
-            cat = Category.query.filter_by(slug=p['category_slug']).first()
-            if not cat:
-                continue
-            seo = seo_lookup(p['slug'])
-            db.session.add(Product(
-                name=p['name'], slug=p['slug'], category_id=cat.id,
-                origin=p.get('origin', ''), description=p.get('description', ''),
-                presentation=p.get('presentation', ''), image=p.get('image', ''),
-                featured=p.get('featured', False), active=p.get('active', True),
-                aliases=seo['aliases'], scientific_name=seo['scientific_name'],
-            ))
-        db.session.commit()
+        report = catalog_io.bulk_load(data)
+        app.logger.info('seeded %s', report)
         if not SiteSetting.get('whatsapp'):
             SiteSetting.set('whatsapp', '+595 983002684')
         if not SiteSetting.get('email'):
@@ -968,9 +1286,20 @@ def init_db():
         # Existing DB — backfill aliases for products that don't have them yet
         _backfill_seo_aliases()
     ensure_admin_password_hash()
+    try:
+        refresh_snapshot(app.config['CATALOG_SNAPSHOT_PATH'])
+    except OSError:
+        app.logger.exception('catalog snapshot not written')
 
 with app.app_context():
-    init_db()
+    try:
+        init_db()
+    except (OperationalError, InterfaceError) as exc:
+        # Database down while this worker boots: come up serving the catalog
+        # snapshot if there is one. The bootstrap runs again on the next boot.
+        if not is_disconnect(exc) or load_snapshot(app.config['CATALOG_SNAPSHOT_PATH']) is None:
+            raise
+        mark_db_down(app, exc)
 
 # ──────────────────── RUN ────────────────────
 
@@ -0,0 +1,302 @@
+"""
+Benchmark harness for the public routes.
+
+Seeds a database (a throwaway SQLite file by default, or --database-url),
+optionally grows the catalog to --products rows with catalog_generator.py,
+then drives the public routes either in-process through the WSGI test
+client, through a real gunicorn, or both. Reports throughput, p50/p95/p99 latency and SQL
+queries per request (read back from the Server-Timing header) and saves
+the run as JSON so two commits can be compared:
+
+    python bench.py                                 # 112 products, WSGI
+    python bench.py --products 10000 --mode both
+    python bench.py --compare bench_results/<old>.json
+
+A --database-url that already holds a catalog is reused as-is; only the
+missing synthetic rows are added. --guides registers generated guides in
+this process only, so gunicorn mode still serves the real ones. The
+rendered-page cache (view_cache.py) is off unless --view-cache is given.
+Never point it at production.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(ROOT, 'bench_results')
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+def parse_args(argv):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--database-url', default='', help='defaults to a temp SQLite file per catalog size')
+    p.add_argument('--products', type=int, default=0, help='grow the catalog to this many products')
+    p.add_argument('--guides', type=int, default=0, help='synthetic guides to register alongside --products')
+    p.add_argument('--mode', choices=('wsgi', 'gunicorn', 'both'), default='wsgi')
+    p.add_argument('--requests', type=int, default=200, help='measured requests per route')
+    p.add_argument('--warmup', type=int, default=5, help='unmeasured requests per route')
+    p.add_argument('--concurrency', type=int, default=8, help='client threads (gunicorn mode)')
+    p.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    p.add_argument('--view-cache', action=argparse.BooleanOptionalAction, default=False,
+                   help='serve through the rendered-page cache (off by default, so the routes '
+                        'themselves are measured rather than cache hits)')
+    p.add_argument('--out', default=RESULTS_DIR, help='directory for the JSON result')
+    p.add_argument('--compare', default='', help='previous result JSON to diff against')
+    return p.parse_args(argv)
+
+
+# ── Database preparation ──
+
+def prepare_environment(args):
+    """Set the env app.py reads at import time. Must run before importing it."""
+    url = args.database_url
+    if not url:
+        path = os.path.join(tempfile.gettempdir(), f'ep-bench-{args.products or "seed"}.sqlite')
+        url = f'sqlite:///{path}'
+    os.environ['DATABASE_URL'] = url
+    os.environ.setdefault('SECRET_KEY', secrets.token_hex(32))
+    # Keep the harness from measuring its own logging.
+    os.environ['SLOW_REQUEST_MS'] = '0'
+    # With the view cache on, start from an empty one of our own so pages
+    # cached by an earlier run or another catalog size are not measured.
+    os.environ['VIEW_CACHE_ENABLED'] = '1' if args.view_cache else '0'
+    if args.view_cache:
+        os.environ['VIEW_CACHE_DIR'] = tempfile.mkdtemp(prefix='ep-bench-view-cache-')
+    return url
+
+
+def synthesize_products(app, db, Product, target, guides=0):
+    """Grow the catalog to `target` products with catalog_generator.
+    Returns the number of rows inserted."""
+    from catalog_generator import generate_catalog, load_catalog, register_guides, write_placeholder_images
+    existing = Product.query.count()
+    if existing >= target:
+        return 0
+    prefix = '/uploads' if os.environ.get('RAILWAY_VOLUME_MOUNT_PATH') else '/static/uploads'
+    images = write_placeholder_images(app.config['UPLOAD_FOLDER'], prefix)
+    data = generate_catalog(target - existing, guides=guides, images=images, slug_prefix='gen-')
+    inserted, _ = load_catalog(db, data)
+    register_guides(data['guides'])
+    return inserted
+
+
+def resolve_targets(Category, Product, guides):
+    """Concrete URL per benchmarked route, picked from the seeded data."""
+    category = Category.query.order_by(Category.order).first()
+    product = (Product.query.filter_by(active=True, featured=True).order_by(Product.name).first()
+               or Product.query.filter_by(active=True).first())
+    guide_slug = next(iter(guides), None)
+    targets = {
+        'index': '/',
+        'productos': '/productos',
+        'productos_categoria': f'/productos/{category.slug}',
+        'producto': f'/producto/{product.slug}',
+        'sitemap': '/sitemap.xml',
+        'api_producto': f'/api/producto/{product.slug}',
+    }
+    if guide_slug:
+        targets['guia'] = f'/guias/{guide_slug}'
+    return targets
+
+
+# ── Measurement ──
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def summarize(latencies, queries, errors, wall):
+    latencies = sorted(latencies)
+    n = len(latencies)
+    return {
+        'requests': n,
+        'errors': errors,
+        'throughput_rps': round(n / wall, 1) if wall else 0.0,
+        'mean_ms': round(sum(latencies) / n * 1000, 2) if n else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if n else 0.0,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def _queries_from(headers):
+    match = QUERIES_RE.search(headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else 0
+
+
+def run_wsgi(app, targets, args):
+    client = app.test_client()
+    results = {}
+    for label, url in targets.items():
+        for _ in range(args.warmup):
+            client.get(url)
+        latencies, queries, errors = [], [], 0
+        wall_start = time.perf_counter()
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            resp = client.get(url)
+            latencies.append(time.perf_counter() - started)
+            queries.append(_queries_from(resp.headers))
+            errors += resp.status_code >= 400
+        results[label] = summarize(latencies, queries, errors, time.perf_counter() - wall_start)
+        print_row(label, results[label])
+    return results
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_gunicorn(targets, args):
+    import requests
+    port = _free_port()
+    base = f'http://127.0.0.1:{port}'
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-b', f'127.0.0.1:{port}', 'app:app'],
+        cwd=ROOT, env=dict(os.environ), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                requests.get(base + '/robots.txt', timeout=1)
+                break
+            except requests.RequestException:
+                if time.time() > deadline or proc.poll() is not None:
+                    raise RuntimeError('gunicorn did not come up')
+                time.sleep(0.2)
+
+        local = threading.local()
+
+        def fetch(url):
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            started = time.perf_counter()
+            resp = session.get(base + url, timeout=30)
+            return time.perf_counter() - started, _queries_from(resp.headers), resp.status_code >= 400
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for label, url in targets.items():
+                list(pool.map(fetch, [url] * (args.warmup * args.concurrency)))
+                wall_start = time.perf_counter()
+                samples = list(pool.map(fetch, [url] * args.requests))
+                wall = time.perf_counter() - wall_start
+                results[label] = summarize(
+                    [s[0] for s in samples], [s[1] for s in samples],
+                    sum(s[2] for s in samples), wall,
+                )
+                print_row(label, results[label])
+        return results
+    finally:
+        proc.terminate()
+        proc.wait(timeout=15)
+
+
+# ── Reporting ──
+
+def print_header(title):
+    print(f'\n{title}')
+    print(f"{'route':<22}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'q/req':>7}{'err':>5}")
+
+
+def print_row(label, r):
+    q = '-' if r['queries_per_request'] is None else f"{r['queries_per_request']:g}"
+    print(f"{label:<22}{r['throughput_rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+          f"{r['p99_ms']:>9}{r['max_ms']:>9}{q:>7}{r['errors']:>5}")
+
+
+def git_revision():
+    try:
+        rev = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet'], cwd=ROOT) != 0
+        return rev + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(previous_path, current):
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+    print(f"\nvs {previous['meta']['revision']} ({previous_path})")
+    for mode, routes in current['results'].items():
+        old_routes = previous['results'].get(mode, {})
+        for label, r in routes.items():
+            old = old_routes.get(label)
+            if not old:
+                continue
+            def delta(key):
+                return (r[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            print(f"  {mode:<9}{label:<22} p50 {delta('p50_ms'):+6.1f}%  p95 {delta('p95_ms'):+6.1f}%  "
+                  f"rps {delta('throughput_rps'):+6.1f}%")
+
+
+def main(argv):
+    args = parse_args(argv)
+    url = prepare_environment(args)
+    sys.path.insert(0, ROOT)
+
+    from app import app, db
+    from models import Category, Product
+    from guias_data import GUIDES
+
+    with app.app_context():
+        added = synthesize_products(app, db, Product, args.products, args.guides) if args.products else 0
+        product_count = Product.query.count()
+        targets = resolve_targets(Category, Product, GUIDES)
+    print(f'Database: {url} — {product_count} products ({added} synthesized)')
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'database': url.split(':', 1)[0],
+            'products': product_count,
+            'requests_per_route': args.requests,
+            'concurrency': args.concurrency,
+            'gunicorn_workers': args.workers,
+            'view_cache': args.view_cache,
+            'targets': targets,
+        },
+        'results': {},
+    }
+    if args.mode in ('wsgi', 'both'):
+        print_header('WSGI (in-process, sequential)')
+        report['results']['wsgi'] = run_wsgi(app, targets, args)
+    if args.mode in ('gunicorn', 'both'):
+        print_header(f'gunicorn ({args.workers} workers, {args.concurrency} client threads)')
+        report['results']['gunicorn'] = run_gunicorn(targets, args)
+
+    os.makedirs(args.out, exist_ok=True)
+    out_path = os.path.join(
+        args.out, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['revision']}-{product_count}.json",
+    )
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nSaved {out_path}')
+    if args.compare:
+        compare(args.compare, report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,153 @@
+"""Catalog version — the invalidation key for everything derived from the
+catalog (API ETags, precomputed tables, cached payloads).
+
+The version is a random token stored in the `catalog_version` SiteSetting
+row. Any ORM flush that adds, changes or deletes a Product or Category
+writes a fresh token in the same transaction, so every gunicorn worker
+sees the change as soon as it commits. Bulk Core statements
+(`session.execute(insert(Product), rows)`) bypass the ORM unit of work;
+callers doing those must call `bump_catalog_version()` themselves.
+
+Readers call `catalog_version()`, which costs one indexed SELECT per
+request (memoized on `g`) and nothing outside a request beyond that.
+`versioned_table()` builds on it: per-worker tables derived from the
+catalog that are rebuilt only when the version changes.
+
+A request can instead be pinned to a fixed version and a set of tables
+with `pin_catalog()` (catalog_snapshot.py does this when the database is
+unreachable); versioned_table() then builds into and reads from those
+tables and never touches the database on its own.
+"""
+import threading
+import uuid
+
+from flask import g, has_request_context
+from sqlalchemy import event
+
+from metrics import record_cache
+from models import Category, Product, SiteSetting, db
+
+
+CATALOG_VERSION_KEY = 'catalog_version'
+# Bumped by view_cache.py when a public site setting changes.
+SETTINGS_VERSION_KEY = 'settings_version'
+# SiteSetting rows that no public page renders.
+PRIVATE_SETTINGS = frozenset({CATALOG_VERSION_KEY, SETTINGS_VERSION_KEY, 'admin_password_hash'})
+
+_CATALOG_MODELS = (Product, Category)
+
+
+def _new_token():
+    return uuid.uuid4().hex
+
+
+def _write_version(session, token):
+    with session.no_autoflush:
+        row = session.query(SiteSetting).filter_by(key=CATALOG_VERSION_KEY).first()
+        if row is None:
+            session.add(SiteSetting(key=CATALOG_VERSION_KEY, value=token))
+        else:
+            row.value = token
+    if has_request_context():
+        g._catalog_version = token
+
+
+def pin_catalog(version, tables):
+    """Pin the current request to `version`; versioned_table() reads and
+    builds into the `tables` dict instead of the worker's tables."""
+    g._catalog_version = version
+    g._catalog_tables = tables
+
+
+def catalog_pinned():
+    return has_request_context() and g.get('_catalog_tables') is not None
+
+
+def catalog_version():
+    """Current catalog version token."""
+    if has_request_context():
+        cached = g.get('_catalog_version')
+        if cached is not None:
+            return cached
+    token = SiteSetting.get(CATALOG_VERSION_KEY)
+    if not token:
+        token = _new_token()
+        SiteSetting.set(CATALOG_VERSION_KEY, token)
+    if has_request_context():
+        g._catalog_version = token
+    return token
+
+
+def bump_catalog_version(session=None):
+    """Stage a new version in `session` (default: db.session). It is
+    committed together with the caller's own changes."""
+    token = _new_token()
+    _write_version(session or db.session, token)
+    return token
+
+
+def _touches_catalog(session):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, _CATALOG_MODELS) and (
+            obj in session.new or obj in session.deleted or session.is_modified(obj)
+        ):
+            return True
+    return False
+
+
+def init_catalog_cache():
+    """Register the flush hook that bumps the version on catalog writes."""
+
+    @event.listens_for(db.session, 'before_flush')
+    def _bump_on_catalog_write(session, flush_context, instances):
+        if _touches_catalog(session):
+            _write_version(session, _new_token())
+
+
+# ── Version-keyed derived tables ──
+
+_tables = {}
+# One lock per table: a build may itself read another versioned table
+# (related_products builds from product_index).
+_table_locks = {}
+_table_locks_guard = threading.Lock()
+
+
+def _table_lock(name):
+    lock = _table_locks.get(name)
+    if lock is None:
+        with _table_locks_guard:
+            lock = _table_locks.setdefault(name, threading.Lock())
+    return lock
+
+
+def versioned_table(name, build):
+    """Return the table `build()` produced for the current catalog version,
+    rebuilding it (once per worker, under a lock) when the version moves.
+    Hits and rebuilds are counted under ep_cache_requests_total{cache=name}."""
+    if catalog_pinned():
+        return _pinned_table(g._catalog_tables, name, build)
+    version = catalog_version()
+    entry = _tables.get(name)
+    if entry is not None and entry[0] == version:
+        record_cache(name, 'hit')
+        return entry[1]
+    with _table_lock(name):
+        entry = _tables.get(name)
+        if entry is None or entry[0] != version:
+            entry = _tables[name] = (version, build())
+            record_cache(name, 'miss')
+        else:
+            record_cache(name, 'hit')
+    return entry[1]
+
+
+def _pinned_table(tables, name, build):
+    if name in tables:
+        record_cache(name, 'hit')
+        return tables[name]
+    with _table_lock(name):
+        if name not in tables:
+            tables[name] = build()
+            record_cache(name, 'miss')
+    return tables[name]
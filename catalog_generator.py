@@ -0,0 +1,282 @@
+"""
+Synthetic catalog generator for scale testing.
+
+Builds realistic-looking catalogs of any size in the same shape as
+seed_data.json — categories, products with es/pt/en aliases, scientific
+names, origins and presentations, images pointing at generated
+placeholder WebPs — plus editorial guides shaped like guias_data.GUIDES,
+and bulk-loads them so routes, search and sitemaps can be measured at
+1k/10k/100k products:
+
+    python catalog_generator.py --products 10000 --guides 200 \\
+        --database-url sqlite:////tmp/ep-10k.sqlite
+    python catalog_generator.py --products 1000 --json /tmp/catalog-1k.json
+
+Generation is deterministic for a given --seed. Guides live in code
+(guias_data.py), so generated guides are only registered in the current
+process's GUIDES dict; they are not persisted. Never point
+--database-url at production.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Base ingredients: (spanish, portuguese, english, scientific name).
+INGREDIENTS = [
+    ('Cúrcuma', 'Açafrão da terra', 'Turmeric', 'Curcuma longa'),
+    ('Canela', 'Canela', 'Cinnamon', 'Cinnamomum verum'),
+    ('Clavo de olor', 'Cravo da índia', 'Cloves', 'Syzygium aromaticum'),
+    ('Comino', 'Cominho', 'Cumin', 'Cuminum cyminum'),
+    ('Pimentón', 'Páprica', 'Paprika', 'Capsicum annuum'),
+    ('Pimienta negra', 'Pimenta do reino', 'Black pepper', 'Piper nigrum'),
+    ('Jengibre', 'Gengibre', 'Ginger', 'Zingiber officinale'),
+    ('Nuez moscada', 'Noz moscada', 'Nutmeg', 'Myristica fragrans'),
+    ('Cardamomo', 'Cardamomo', 'Cardamom', 'Elettaria cardamomum'),
+    ('Anís estrellado', 'Anis estrelado', 'Star anise', 'Illicium verum'),
+    ('Orégano', 'Orégano', 'Oregano', 'Origanum vulgare'),
+    ('Romero', 'Alecrim', 'Rosemary', 'Salvia rosmarinus'),
+    ('Tomillo', 'Tomilho', 'Thyme', 'Thymus vulgaris'),
+    ('Albahaca', 'Manjericão', 'Basil', 'Ocimum basilicum'),
+    ('Manzanilla', 'Camomila', 'Chamomile', 'Matricaria chamomilla'),
+    ('Hibisco', 'Hibisco', 'Hibiscus', 'Hibiscus sabdariffa'),
+    ('Menta', 'Hortelã', 'Mint', 'Mentha spicata'),
+    ('Lavanda', 'Lavanda', 'Lavender', 'Lavandula angustifolia'),
+    ('Chía', 'Chia', 'Chia', 'Salvia hispanica'),
+    ('Quinoa', 'Quinoa', 'Quinoa', 'Chenopodium quinoa'),
+    ('Lino', 'Linhaça', 'Flaxseed', 'Linum usitatissimum'),
+    ('Sésamo', 'Gergelim', 'Sesame', 'Sesamum indicum'),
+    ('Almendra', 'Amêndoa', 'Almond', 'Prunus dulcis'),
+    ('Nuez', 'Noz', 'Walnut', 'Juglans regia'),
+    ('Castaña de cajú', 'Castanha de caju', 'Cashew', 'Anacardium occidentale'),
+    ('Pistacho', 'Pistache', 'Pistachio', 'Pistacia vera'),
+    ('Coco', 'Coco', 'Coconut', 'Cocos nucifera'),
+    ('Cacao', 'Cacau', 'Cocoa', 'Theobroma cacao'),
+    ('Moringa', 'Moringa', 'Moringa', 'Moringa oleifera'),
+    ('Espirulina', 'Espirulina', 'Spirulina', 'Arthrospira platensis'),
+    ('Arándano', 'Mirtilo', 'Blueberry', 'Vaccinium corymbosum'),
+    ('Mango', 'Manga', 'Mango', 'Mangifera indica'),
+    ('Ajo', 'Alho', 'Garlic', 'Allium sativum'),
+    ('Cebolla', 'Cebola', 'Onion', 'Allium cepa'),
+    ('Mostaza', 'Mostarda', 'Mustard', 'Sinapis alba'),
+    ('Hinojo', 'Funcho', 'Fennel', 'Foeniculum vulgare'),
+]
+
+# (spanish form, portuguese form, english form)
+FORMS = [
+    ('en Polvo', 'em pó', 'powder'),
+    ('en Grano', 'em grão', 'whole'),
+    ('Molido', 'moído', 'ground'),
+    ('Entero', 'inteiro', 'whole'),
+    ('en Hojas', 'em folhas', 'leaves'),
+    ('en Rama', 'em rama', 'stick'),
+    ('Deshidratado', 'desidratado', 'dried'),
+    ('Tostado', 'torrado', 'roasted'),
+    ('en Escamas', 'em flocos', 'flakes'),
+    ('Orgánico', 'orgânico', 'organic'),
+]
+
+GRADES = ['', 'Premium', 'Extra', 'Selección', 'Industrial', 'Tipo A', 'Tipo B']
+
+CATEGORY_NAMES = [
+    'Especias y Condimentos', 'Hierbas y Tés', 'Frutas Deshidratadas', 'Semillas y Granos',
+    'Frutos Secos', 'Suplementos y Superalimentos', 'Derivados de Coco', 'Harinas Especiales',
+    'Cacao', 'Mezclas y Blends', 'Sales y Minerales', 'Endulzantes Naturales',
+]
+
+ORIGINS = [
+    'India', 'Vietnam', 'Sri Lanka', 'Indonesia', 'China', 'Turquía', 'Egipto', 'Perú',
+    'Brasil', 'Argentina', 'Bolivia', 'España', 'Irán', 'Estados Unidos', 'Chile', 'Paraguay',
+]
+
+PRESENTATIONS = ['Bolsa 1 kg', 'Bolsa 5 kg', 'Bolsa 10 kg / 25 kg', 'Caja 20 kg', 'Saco 25 kg', 'Saco 50 kg']
+
+PLACEHOLDER_COLORS = [
+    (196, 120, 40), (160, 60, 30), (110, 80, 50), (200, 170, 60), (90, 120, 50),
+    (150, 40, 70), (70, 110, 90), (220, 200, 160), (120, 70, 30), (180, 90, 60),
+    (60, 90, 40), (230, 150, 70),
+]
+
+
+def _slugify(text):
+    # Local copy of app.slugify so generating a JSON file does not need
+    # the app (and its database) to be importable.
+    import re
+    text = text.lower().strip()
+    for pattern, repl in (('[áàãâä]', 'a'), ('[éèêë]', 'e'), ('[íìîï]', 'i'),
+                          ('[óòõôö]', 'o'), ('[úùûü]', 'u'), ('[ñ]', 'n')):
+        text = re.sub(pattern, repl, text)
+    return re.sub(r'[^a-z0-9]+', '-', text).strip('-')
+
+
+def write_placeholder_images(upload_folder, url_prefix='/static/uploads'):
+    """Write one placeholder WebP per colour (plus its -sm thumbnail) into
+    `upload_folder`, skipping existing files. Returns the image URLs."""
+    from PIL import Image as PILImage, ImageDraw
+
+    os.makedirs(upload_folder, exist_ok=True)
+    urls = []
+    for i, color in enumerate(PLACEHOLDER_COLORS):
+        name = f'synthetic-{i:02d}'
+        for suffix, size in (('', 600), ('-sm', 400)):
+            path = os.path.join(upload_folder, f'{name}{suffix}.webp')
+            if os.path.exists(path):
+                continue
+            img = PILImage.new('RGB', (size, size), color)
+            draw = ImageDraw.Draw(img)
+            r = size // 3
+            draw.ellipse((size // 2 - r, size // 2 - r, size // 2 + r, size // 2 + r),
+                         fill=tuple(min(255, c + 40) for c in color))
+            img.save(path, format='WEBP', quality=80, method=4)
+        urls.append(f'{url_prefix}/{name}.webp')
+    return urls
+
+
+def generate_catalog(products, categories=9, guides=0, seed=42, images=None, slug_prefix=''):
+    """Return {'categories', 'products', 'guides'} with `products` rows.
+
+    Names combine ingredient × form × grade; once those run out a numbered
+    lot suffix keeps names and slugs unique. `images` is a list of image
+    URLs assigned round-robin (empty image when None). `slug_prefix`
+    namespaces slugs so a generated batch can be added to an existing
+    catalog without collisions.
+    """
+    rng = random.Random(seed)
+    images = images or ['']
+    cats = [
+        {'name': name, 'slug': _slugify(name), 'order': i + 1}
+        for i, name in enumerate(CATEGORY_NAMES[:max(1, categories)])
+    ]
+    for i in range(len(cats), categories):
+        name = f'Categoría {i + 1}'
+        cats.append({'name': name, 'slug': _slugify(name), 'order': i + 1})
+
+    ingredient_index = {ing[0]: i for i, ing in enumerate(INGREDIENTS)}
+    combos = [(ing, form, grade) for ing in INGREDIENTS for form in FORMS for grade in GRADES]
+    rng.shuffle(combos)
+    rows = []
+    for i in range(products):
+        (es, pt, en, scientific), (form_es, form_pt, form_en), grade = combos[i % len(combos)]
+        lot = i // len(combos)
+        name = ' '.join(part for part in (es, form_es, grade) if part)
+        if lot:
+            name = f'{name} Lote {lot + 1}'
+        slug = slug_prefix + _slugify(name)
+        aliases = [
+            f'{es} {form_es}'.lower(), es.lower(), f'{pt} {form_pt}', pt.lower(),
+            f'{en} {form_en}'.lower(), en.lower(),
+        ]
+        # Keep an ingredient's variants together, like the real catalog.
+        category = cats[ingredient_index[es] % len(cats)]
+        origin = rng.choice(ORIGINS)
+        rows.append({
+            'name': name,
+            'slug': slug,
+            'category_slug': category['slug'],
+            'origin': origin,
+            'description': (
+                f'{name} importado al por mayor desde {origin}. Calidad estable lote a lote, '
+                f'ideal para industria alimentaria, gastronomía profesional y reventa.'
+            ),
+            'presentation': rng.choice(PRESENTATIONS),
+            'image': images[i % len(images)],
+            'featured': rng.random() < 0.05,
+            'active': rng.random() > 0.03,
+            'aliases': ', '.join(dict.fromkeys(aliases)),
+            'scientific_name': scientific,
+        })
+
+    generated_guides = {}
+    for i in range(min(guides, len(rows))):
+        p = rows[i]
+        category = next(c for c in cats if c['slug'] == p['category_slug'])
+        related = [rows[(i + k) % len(rows)]['slug'] for k in (1, 2, 3)]
+        generated_guides[p['slug']] = {
+            'product_slug': p['slug'],
+            'title': f"{p['name']}: guía completa para compradores mayoristas",
+            'dek': f"Origen, usos industriales y cómo comprar {p['name'].lower()} al por mayor en Paraguay.",
+            'meta_title': f"{p['name']} — Guía Completa | Especias del Paraguay",
+            'meta_description': f"Todo sobre {p['name'].lower()}: origen, usos y compra mayorista.",
+            'category': category['name'],
+            'reading_time': rng.randint(4, 12),
+            'published': '2026-05-03',
+            'updated': '2026-05-03',
+            'hero_treatment': rng.choice(['warm', 'earth', 'green']),
+            'intro': f"<p class=\"lead\"><strong>{p['name']}</strong> es uno de los productos de {category['name'].lower()} más pedidos.</p>",
+            'sections': [
+                {'id': f'seccion-{n}', 'heading': heading,
+                 'body': f"<p>{heading} de {p['name'].lower()}: contenido generado para pruebas de escala.</p>" * 4}
+                for n, heading in enumerate(['Qué es', 'Origen', 'Usos industriales', 'Cómo comprar'], 1)
+            ],
+            'faq': [
+                {'q': f"¿De dónde viene {p['name'].lower()}?", 'a': f"Importamos desde {p['origin']}."},
+                {'q': '¿Cuál es la presentación mayorista?', 'a': p['presentation']},
+            ],
+            'related_slugs': related,
+        }
+    return {'categories': cats, 'products': rows, 'guides': generated_guides}
+
+
+def load_catalog(db, data, batch_size=1000):
+    """Bulk-insert a generated catalog into the current app's database.
+
+    Categories that already exist (by slug) are reused; products whose slug
+    already exists are skipped. Returns (products inserted, seconds).
+    """
+    from catalog_io import bulk_load
+
+    report = bulk_load(data, batch_size=batch_size)
+    return report.products, report.seconds
+
+
+def register_guides(guides):
+    """Make generated guides visible to this process's views."""
+    from guias_data import GUIDES
+    GUIDES.update(guides)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--categories', type=int, default=9)
+    parser.add_argument('--guides', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', default='', help='load into this database')
+    parser.add_argument('--json', default='', help='write the catalog to this file instead of loading it')
+    parser.add_argument('--no-images', action='store_true', help='leave product images empty')
+    args = parser.parse_args(argv)
+
+    if args.json:
+        data = generate_catalog(args.products, args.categories, args.guides, args.seed,
+                                images=None if args.no_images else [f'/static/uploads/synthetic-{i:02d}.webp'
+                                                                    for i in range(len(PLACEHOLDER_COLORS))])
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        print(f"Wrote {len(data['products'])} products, {len(data['guides'])} guides to {args.json}")
+        return 0
+
+    if not args.database_url:
+        parser.error('--database-url is required when loading (or pass --json)')
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('SECRET_KEY', os.urandom(16).hex())
+    from app import app, db
+
+    with app.app_context():
+        images = None
+        if not args.no_images:
+            prefix = '/uploads' if os.environ.get('RAILWAY_VOLUME_MOUNT_PATH') else '/static/uploads'
+            images = write_placeholder_images(app.config['UPLOAD_FOLDER'], prefix)
+        data = generate_catalog(args.products, args.categories, args.guides, args.seed,
+                                images=images, slug_prefix='gen-')
+        inserted, seconds = load_catalog(db, data)
+    print(f'Loaded {inserted} products in {seconds:.2f}s ({inserted / seconds if seconds else 0:,.0f} rows/s)')
+    if data['guides']:
+        print(f"{len(data['guides'])} guides generated (in-process only, not persisted)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,415 @@
+"""Bulk catalog import/export (CSV, XLSX, JSON), keyed by product slug.
+
+Export writes one row per product with EXPORT_COLUMNS. Import reads the
+same shape back. Only the columns present in the file are touched, so a
+sheet with just `slug,presentation` updates presentations and nothing
+else. New slugs need at least `name` and `category_slug`.
+
+An import runs in three steps:
+
+1. read_rows(): parse the upload into dicts (openpyxl is imported only
+   for .xlsx files).
+2. plan_import(): validate every row in one pass and diff the file
+   against the database (one IN query per 500 slugs) into inserts,
+   updates and unchanged rows. Nothing is written if any row is invalid.
+3. apply_import(): batched INSERT plus executemany UPDATE by primary key,
+   one catalog version bump and one commit, so caches are invalidated
+   exactly once per import.
+
+bulk_load() is the insert-only path shared by seed.py, the first-run seed
+in init_db and catalog_generator: it takes seed_data.json-shaped data
+({'categories': [...], 'products': [...]}) and inserts whatever is not in
+the database yet.
+"""
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+
+from catalog_cache import bump_catalog_version
+from models import Category, Product, db
+from seo_aliases import lookup as seo_lookup
+from surrogate_keys import stage_purge
+
+
+EXPORT_COLUMNS = ('slug', 'name', 'category_slug', 'origin', 'description', 'presentation',
+                  'image', 'featured', 'active', 'aliases', 'scientific_name')
+
+# Max length per string column, mirroring models.Product.
+_LIMITS = {'slug': 200, 'name': 200, 'origin': 200, 'presentation': 300, 'image': 500,
+           'scientific_name': 200}
+_BOOL_COLUMNS = ('featured', 'active')
+_TRUE = {'1', 'true', 'si', 'sí', 'yes', 'x', 'verdadero'}
+_FALSE = {'0', 'false', 'no', '', 'falso'}
+_LOOKUP_CHUNK = 500
+_INSERT_BATCH = 1000
+
+FORMATS = ('csv', 'xlsx', 'json')
+
+
+class ImportFileError(ValueError):
+    """The upload can't be read at all (wrong format, broken file)."""
+
+
+# ── Reading ──
+
+def read_rows(stream, filename):
+    """Parse an uploaded file into a list of {column: value} dicts."""
+    ext = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if ext not in FORMATS:
+        raise ImportFileError('Formato no soportado: use .csv, .xlsx o .json')
+    data = stream.read()
+    if ext == 'csv':
+        try:
+            text = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ImportFileError('El CSV debe estar en UTF-8')
+        return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+    if ext == 'json':
+        try:
+            payload = json.loads(data.decode('utf-8-sig'))
+        except ValueError:
+            raise ImportFileError('JSON inválido')
+        if isinstance(payload, dict):
+            payload = payload.get('products')
+        if not isinstance(payload, list) or not all(isinstance(r, dict) for r in payload):
+            raise ImportFileError('El JSON debe ser una lista de productos (o {"products": [...]})')
+        return payload
+    return _read_xlsx(data)
+
+
+def _read_xlsx(data):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError('La importación de .xlsx requiere el paquete openpyxl')
+    try:
+        wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    except Exception:
+        raise ImportFileError('Archivo .xlsx inválido')
+    rows = wb.active.iter_rows(values_only=True)
+    header = next(rows, None)
+    if not header:
+        return []
+    header = [str(h).strip() if h is not None else '' for h in header]
+    out = []
+    for values in rows:
+        if values is None or all(v is None or v == '' for v in values):
+            continue
+        out.append({h: v for h, v in zip(header, values) if h})
+    wb.close()
+    return out
+
+
+# ── Validation and diff ──
+
+def _clean_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError(value)
+
+
+def _clean_aliases(value):
+    if isinstance(value, list):
+        value = ', '.join(str(v) for v in value)
+    return ', '.join(a.strip() for a in str(value or '').split(',') if a.strip())
+
+
+def _clean_row(raw, categories, slugify):
+    """(values, errors) for one input row. `values` maps Product column
+    names to cleaned values for the columns present in the row."""
+    raw = {str(k).strip().lower(): v for k, v in raw.items() if k is not None}
+    errors = []
+    values = {}
+    for column, value in raw.items():
+        if column in ('category_slug', 'categoria'):
+            slug = str(value or '').strip()
+            if slug not in categories:
+                errors.append(f'categoría desconocida "{slug}"')
+            else:
+                values['category_id'] = categories[slug]
+        elif column in _BOOL_COLUMNS:
+            try:
+                values[column] = _clean_bool(value)
+            except ValueError:
+                errors.append(f'{column}: valor no booleano "{value}"')
+        elif column == 'aliases':
+            values['aliases'] = _clean_aliases(value)
+        elif column in EXPORT_COLUMNS:
+            text = '' if value is None else str(value).strip()
+            limit = _LIMITS.get(column)
+            if limit and len(text) > limit:
+                errors.append(f'{column}: supera {limit} caracteres')
+            values[column] = text
+    if not values.get('slug') and values.get('name'):
+        values['slug'] = slugify(values['name'])
+    if not values.get('slug'):
+        errors.append('falta slug (o name para derivarlo)')
+    if 'name' in values and not values['name']:
+        errors.append('name vacío')
+    return values, errors
+
+
+def _stored(current, new):
+    # NULL text columns compare equal to an empty cell.
+    if current is None and isinstance(new, str):
+        return ''
+    if current is None and isinstance(new, bool):
+        return False
+    return current
+
+
+class ImportPlan:
+    """Validated, diffed import. `errors` is a list of (row number, message);
+    when it is non-empty the plan must not be applied."""
+
+    def __init__(self):
+        self.inserts = []     # full column dicts
+        self.updates = []     # (id, slug, {column: new value})
+        self.unchanged = 0
+        self.errors = []
+        self.category_ids = set()  # categories whose pages change
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def summary(self):
+        return {'inserts': len(self.inserts), 'updates': len(self.updates),
+                'unchanged': self.unchanged, 'errors': len(self.errors)}
+
+
+def plan_import(rows, slugify):
+    plan = ImportPlan()
+    categories = dict(db.session.execute(select(Category.slug, Category.id)).all())
+    cleaned = []
+    seen = {}
+    # Row numbers are 1-based and count the header line, like a spreadsheet.
+    for number, raw in enumerate(rows, start=2):
+        values, errors = _clean_row(raw, categories, slugify)
+        slug = values.get('slug')
+        if slug and slug in seen:
+            errors.append(f'slug repetido (ya en la fila {seen[slug]})')
+        elif slug:
+            seen[slug] = number
+        plan.errors.extend((number, e) for e in errors)
+        cleaned.append((number, values))
+
+    columns = [Product.id, Product.slug] + [getattr(Product, c) for c in EXPORT_COLUMNS
+                                             if c not in ('slug', 'category_slug')] + [Product.category_id]
+    existing = {}
+    slugs = list(seen)
+    for start in range(0, len(slugs), _LOOKUP_CHUNK):
+        chunk = slugs[start:start + _LOOKUP_CHUNK]
+        for row in db.session.execute(select(*columns).where(Product.slug.in_(chunk))):
+            existing[row.slug] = row._mapping
+
+    for number, values in cleaned:
+        slug = values.get('slug')
+        if not slug:
+            continue
+        current = existing.get(slug)
+        if current is None:
+            missing = [c for c in ('name', 'category_id') if not values.get(c)]
+            if missing:
+                plan.errors.append((number, 'producto nuevo sin name o category_slug'))
+                continue
+            row = {'origin': '', 'description': '', 'presentation': '', 'image': '',
+                   'featured': False, 'active': True, 'aliases': '', 'scientific_name': ''}
+            row.update(values)
+            plan.inserts.append(row)
+            plan.category_ids.add(row['category_id'])
+            continue
+        changes = {c: v for c, v in values.items() if c != 'slug' and _stored(current[c], v) != v}
+        if changes:
+            plan.updates.append((current['id'], slug, changes))
+            plan.category_ids.update({current['category_id'], changes.get('category_id', current['category_id'])})
+        else:
+            plan.unchanged += 1
+    return plan
+
+
+def apply_import(plan):
+    """Write a validated plan in one transaction with one version bump."""
+    if not plan.ok:
+        raise ValueError('plan has validation errors')
+    now = datetime.utcnow()
+    try:
+        for start in range(0, len(plan.inserts), _INSERT_BATCH):
+            batch = [dict(row, created_at=now, updated_at=now)
+                     for row in plan.inserts[start:start + _INSERT_BATCH]]
+            db.session.execute(insert(Product), batch)
+        # ORM bulk UPDATE by primary key: rows are grouped by the set of
+        # columns they change and sent as executemany.
+        if plan.updates:
+            db.session.execute(update(Product), [
+                {'id': id_, **changes, 'updated_at': now} for id_, _, changes in plan.updates
+            ])
+        bump_catalog_version()
+        category_slugs = db.session.execute(
+            select(Category.slug).where(Category.id.in_(plan.category_ids))
+        ).scalars()
+        stage_purge('catalog', *(f'category:{s}' for s in category_slugs),
+                    *(f'product:{row["slug"]}' for row in plan.inserts),
+                    *(f'product:{slug}' for _, slug, _ in plan.updates))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+# ── Bulk load ──
+
+_PRODUCT_DEFAULTS = {'origin': '', 'description': '', 'presentation': '', 'image': '',
+                     'featured': False, 'active': True}
+
+
+class LoadReport:
+    __slots__ = ('categories', 'products', 'skipped', 'missing_categories', 'seconds')
+
+    def __init__(self):
+        self.categories = 0
+        self.products = 0
+        self.skipped = 0
+        self.missing_categories = set()
+        self.seconds = 0.0
+
+    @property
+    def rate(self):
+        return self.products / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f'{self.categories} categories, {self.products} products '
+                f'({self.skipped} skipped) in {self.seconds:.2f}s ({self.rate:,.0f} rows/s)')
+
+
+def bulk_load(data, batch_size=_INSERT_BATCH):
+    """Insert the categories and products of `data` that don't exist yet
+    (matched by slug) in one transaction.
+
+    Categories are resolved through one slug -> id map, products go out as
+    executemany INSERT batches, and each product's aliases and
+    scientific_name are filled from seo_aliases when the row doesn't carry
+    its own. Products pointing at an unknown category are skipped and
+    listed in `missing_categories`. Returns a LoadReport.
+    """
+    report = LoadReport()
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    try:
+        cat_ids = dict(db.session.execute(select(Category.slug, Category.id)).all())
+        new_categories = [
+            {'name': c['name'], 'slug': c['slug'], 'order': c.get('order', 0)}
+            for c in data.get('categories', ()) if c['slug'] not in cat_ids
+        ]
+        if new_categories:
+            db.session.execute(insert(Category), new_categories)
+            cat_ids = dict(db.session.execute(select(Category.slug, Category.id)).all())
+            report.categories = len(new_categories)
+
+        existing = set(db.session.execute(select(Product.slug)).scalars())
+        batch = []
+        for p in data.get('products', ()):
+            category_id = cat_ids.get(p['category_slug'])
+            if category_id is None:
+                report.missing_categories.add(p['category_slug'])
+                report.skipped += 1
+                continue
+            if p['slug'] in existing:
+                report.skipped += 1
+                continue
+            existing.add(p['slug'])
+            seo = seo_lookup(p['slug'])
+            row = dict(_PRODUCT_DEFAULTS)
+            row.update((k, v) for k, v in p.items() if k in _PRODUCT_DEFAULTS or k in ('name', 'slug'))
+            row.update(
+                category_id=category_id,
+                aliases=p.get('aliases') or seo['aliases'],
+                scientific_name=p.get('scientific_name') or seo['scientific_name'],
+                created_at=now,
+                updated_at=now,
+            )
+            batch.append(row)
+            if len(batch) >= batch_size:
+                db.session.execute(insert(Product), batch)
+                report.products += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(Product), batch)
+            report.products += len(batch)
+        if report.categories or report.products:
+            bump_catalog_version()
+            stage_purge('catalog')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+# ── Export ──
+
+def _export_query():
+    return (
+        select(*(getattr(Product, c) for c in EXPORT_COLUMNS if c != 'category_slug'),
+               Category.slug.label('category_slug'))
+        .join(Category, Product.category_id == Category.id)
+        .order_by(Product.id)
+        .execution_options(yield_per=500)
+    )
+
+
+def _export_dicts():
+    for row in db.session.execute(_export_query()):
+        m = row._mapping
+        yield {c: m[c] for c in EXPORT_COLUMNS}
+
+
+def export_csv():
+    """Yield the catalog as CSV text chunks."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for row in _export_dicts():
+        writer.writerow({k: (int(v) if isinstance(v, bool) else v) for k, v in row.items()})
+        if buf.tell() > 64 * 1024:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def export_json():
+    """Yield the catalog as a JSON array, one product per line."""
+    yield '[\n'
+    first = True
+    for row in _export_dicts():
+        yield ('' if first else ',\n') + json.dumps(row, ensure_ascii=False)
+        first = False
+    yield '\n]\n'
+
+
+def export_xlsx():
+    """The catalog as .xlsx bytes (openpyxl write-only mode keeps memory
+    flat, but the zip container has to be finished before sending)."""
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('productos')
+    ws.append(list(EXPORT_COLUMNS))
+    for row in _export_dicts():
+        ws.append([row[c] for c in EXPORT_COLUMNS])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
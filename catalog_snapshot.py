@@ -0,0 +1,445 @@
+"""Read-only catalog snapshot for when the database is unreachable.
+
+Every worker runs a small background thread that, every SNAPSHOT_INTERVAL
+seconds, compares the catalog and site-settings versions with the ones
+recorded in the snapshot file (CATALOG_SNAPSHOT_PATH) and, when they
+moved, rewrites it: categories, active products and the public
+SiteSetting rows as gzipped JSON, written atomically by whichever worker
+takes the file's fcntl lock. init_db() refreshes it once on boot.
+
+When a query fails because the connection was lost or could not be made
+(`is_disconnect()`), the worker marks the database down for
+SNAPSHOT_RETRY_SECONDS and answers from the snapshot (a request that
+was reading from a read replica is first replayed on the primary, see
+db_routing.py). Errors in a single statement (timeouts, lock errors)
+are raised as usual. While the database is down:
+
+- public views marked `@snapshot_fallback` run as usual, but pinned to the
+  snapshot (catalog_cache.pin_catalog): product_index(), related_graph()
+  and the other versioned tables are built from it, and the views read
+  categories, products and settings through `current_snapshot()`;
+- admin pages get a 503 maintenance notice;
+- error pages wrapped in `@snapshot_error_page` (the 404) render their
+  site context from the snapshot too;
+- anything else gets a 503.
+
+While the database is marked down, requests go straight to the snapshot
+instead of waiting on the connect timeout again; the first request after
+the retry window tries the database. Responses served from the snapshot
+carry `X-Catalog-Snapshot: <written at>`, are not stored by the edge and
+are revalidated by browsers. Served responses are counted in
+ep_cache_requests_total{cache="catalog_snapshot", result="stale"}.
+"""
+import fcntl
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, g, has_request_context, jsonify, request
+from sqlalchemy import select
+from sqlalchemy.exc import InterfaceError, OperationalError, SQLAlchemyError
+from werkzeug.exceptions import HTTPException
+
+from catalog_cache import PRIVATE_SETTINGS, SETTINGS_VERSION_KEY, catalog_version, pin_catalog
+from db_routing import failover_to_primary
+from metrics import record_cache
+from models import Category, Product, SiteSetting, db, parse_aliases
+from product_index import ProductIndex, ProductSummary
+
+
+logger = logging.getLogger('ep.catalog_snapshot')
+
+SNAPSHOT_FORMAT = 1
+PRODUCT_COLUMNS = ('id', 'name', 'slug', 'category_id', 'origin', 'description', 'presentation',
+                   'image', 'featured', 'aliases', 'scientific_name', 'seo_title_override',
+                   'seo_description_override', 'created_at', 'updated_at')
+_DATETIME_COLUMNS = {'created_at', 'updated_at'}
+_DB_ERRORS = (OperationalError, InterfaceError)
+# 503s while the database is down: retried soon, never stored.
+_UNAVAILABLE_HEADERS = {'Retry-After': '30', 'Cache-Control': 'no-store'}
+
+
+# ── Snapshot contents ──
+
+class SnapshotCategory:
+    __slots__ = ('id', 'name', 'slug', 'order')
+
+    def __init__(self, id, name, slug, order):
+        self.id = id
+        self.name = name
+        self.slug = slug
+        self.order = order
+
+    def __repr__(self):
+        return f'<SnapshotCategory {self.slug}>'
+
+
+class SnapshotProduct:
+    """An active product with the attributes templates read from Product
+    (`category`, `alias_list`, `to_dict()`), plus `category_name` and
+    `category_slug` so it can feed ProductSummary."""
+
+    __slots__ = PRODUCT_COLUMNS + ('category',)
+    active = True
+
+    def __init__(self, values, category):
+        for column, value in zip(PRODUCT_COLUMNS, values):
+            if column in _DATETIME_COLUMNS and value:
+                value = datetime.fromisoformat(value)
+            setattr(self, column, value)
+        self.category = category
+
+    @property
+    def alias_list(self):
+        return parse_aliases(self.aliases)
+
+    @property
+    def category_name(self):
+        return self.category.name
+
+    @property
+    def category_slug(self):
+        return self.category.slug
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'slug': self.slug,
+            'category_id': self.category_id,
+            'category_name': self.category.name,
+            'origin': self.origin,
+            'description': self.description,
+            'presentation': self.presentation,
+            'image': self.image,
+            'featured': self.featured,
+            'active': True,
+            'aliases': list(self.alias_list),
+            'scientific_name': self.scientific_name,
+        }
+
+    def __repr__(self):
+        return f'<SnapshotProduct {self.slug}>'
+
+
+class CatalogSnapshot:
+    def __init__(self, data):
+        self.written_at = data['written_at']
+        self.catalog_version = data['catalog_version']
+        self.settings_version = data['settings_version']
+        self.settings = data['settings']
+        self.categories = tuple(SnapshotCategory(*row) for row in data['categories'])
+        by_id = {c.id: c for c in self.categories}
+        # Products are stored in (name, id) order, the listing order.
+        self.products = tuple(
+            SnapshotProduct(row, by_id[row[3]]) for row in data['products'] if row[3] in by_id
+        )
+        self._by_slug = {p.slug: p for p in self.products}
+        self._categories_by_slug = {c.slug: c for c in self.categories}
+        self._listings = {None: self.products}
+        for p in self.products:
+            self._listings.setdefault(p.category_id, []).append(p)
+        # Versioned tables for requests pinned to this snapshot.
+        self.tables = {'product_index': ProductIndex(ProductSummary(p) for p in self.products)}
+
+    def category(self, slug):
+        return self._categories_by_slug.get(slug)
+
+    def product(self, slug):
+        return self._by_slug.get(slug)
+
+    def listing(self, category=None):
+        """Active products (of `category`), in (name, id) order."""
+        return self._listings.get(category.id if category is not None else None, ())
+
+    def setting(self, key, default=''):
+        return self.settings.get(key, default)
+
+
+def _versions():
+    """(catalog version, settings version) as stored right now."""
+    settings_version = SiteSetting.get(SETTINGS_VERSION_KEY, '')
+    return catalog_version(), settings_version
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def write_snapshot(path, versions=None):
+    """Write the snapshot of the current catalog to `path`. Returns the
+    number of products written."""
+    # The versions are read before the rows, so a write committed in
+    # between leaves the snapshot labelled older than its contents and the
+    # next refresh rewrites it.
+    catalog, settings = versions or _versions()
+    categories = db.session.execute(
+        select(Category.id, Category.name, Category.slug, Category.order).order_by(Category.order)
+    ).all()
+    products = db.session.execute(
+        select(*(getattr(Product, c) for c in PRODUCT_COLUMNS))
+        .where(Product.active == True)
+        .order_by(Product.name, Product.id)
+    ).all()
+    public_settings = {
+        key: value for key, value in db.session.execute(select(SiteSetting.key, SiteSetting.value))
+        if key not in PRIVATE_SETTINGS
+    }
+    data = {
+        'format': SNAPSHOT_FORMAT,
+        'written_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'catalog_version': catalog,
+        'settings_version': settings,
+        'settings': public_settings,
+        'categories': [list(row) for row in categories],
+        'products': [[_json_value(v) for v in row] for row in products],
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, path)
+    return len(products)
+
+
+_loaded = (None, None, None)  # (path, mtime_ns, CatalogSnapshot)
+_load_lock = threading.Lock()
+
+
+def load_snapshot(path):
+    """The snapshot at `path`, parsed once per worker per file version;
+    None when there is none or it can't be read."""
+    global _loaded
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if _loaded[:2] == (path, mtime):
+        return _loaded[2]
+    with _load_lock:
+        if _loaded[:2] != (path, mtime):
+            try:
+                with gzip.open(path, 'rt', encoding='utf-8') as f:
+                    data = json.load(f)
+                snapshot = CatalogSnapshot(data) if data.get('format') == SNAPSHOT_FORMAT else None
+            except (OSError, ValueError, KeyError, TypeError):
+                logger.exception('catalog snapshot %s unreadable', path)
+                snapshot = None
+            _loaded = (path, mtime, snapshot)
+    return _loaded[2]
+
+
+def refresh_snapshot(path):
+    """Rewrite the snapshot if the catalog or settings changed since it was
+    written and no other worker is already doing it. Returns the number of
+    products written, or None when nothing was written."""
+    versions = _versions()
+    current = load_snapshot(path)
+    if current is not None and (current.catalog_version, current.settings_version) == versions:
+        return None
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd = os.open(f'{path}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return None
+        written = write_snapshot(path, versions)
+        logger.info('catalog snapshot written: %d products -> %s', written, path)
+        return written
+    finally:
+        os.close(fd)
+
+
+# ── Database availability ──
+
+_down_until = 0.0
+
+
+def db_down():
+    return time.monotonic() < _down_until
+
+
+def is_disconnect(exc):
+    """True when `exc` is a lost or refused connection rather than an
+    error in one statement: SQLAlchemy invalidated the connection, or the
+    error came from connecting (it carries no statement)."""
+    return getattr(exc, 'connection_invalidated', False) or getattr(exc, 'statement', '') is None
+
+
+def mark_db_down(app, exc=None):
+    global _down_until
+    if not db_down():
+        app.logger.error('database unavailable (%s); serving the catalog snapshot',
+                         type(exc).__name__ if exc else 'boot')
+    _down_until = time.monotonic() + app.config['SNAPSHOT_RETRY_SECONDS']
+
+
+def current_snapshot():
+    """The snapshot the current request is served from, or None."""
+    return g.get('_catalog_snapshot') if has_request_context() else None
+
+
+def snapshot_fallback(view):
+    """Mark a public view as able to render from the snapshot."""
+    view.snapshot_fallback = True
+    return view
+
+
+def snapshot_error_page(handler):
+    """Error handler counterpart of @snapshot_fallback. Error pages render
+    the site context (settings, categories), so while the database is down,
+    or once rendering loses the connection, the handler runs again pinned
+    to the snapshot."""
+
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        app = current_app._get_current_object()
+        if current_snapshot() is None and db_down():
+            snapshot = load_snapshot(app.config['CATALOG_SNAPSHOT_PATH'])
+            if snapshot is not None:
+                _activate(snapshot)
+        try:
+            return handler(*args, **kwargs)
+        except _DB_ERRORS as exc:
+            if current_snapshot() is not None or not is_disconnect(exc):
+                raise
+            _rollback()
+            mark_db_down(app, exc)
+            snapshot = load_snapshot(app.config['CATALOG_SNAPSHOT_PATH'])
+            if snapshot is None:
+                raise
+            _activate(snapshot)
+            return handler(*args, **kwargs)
+
+    return wrapper
+
+
+def _activate(snapshot):
+    g._catalog_snapshot = snapshot
+    pin_catalog(snapshot.catalog_version, snapshot.tables)
+    record_cache('catalog_snapshot', 'stale')
+
+
+def _maintenance(app):
+    # Rendered without the context processors, which read site settings.
+    body = app.jinja_env.get_template('admin/maintenance.html').render()
+    return body, 503, _UNAVAILABLE_HEADERS
+
+
+def _unavailable():
+    return jsonify({'error': 'service unavailable'}), 503, _UNAVAILABLE_HEADERS
+
+
+def _serves_from_snapshot(app):
+    view = app.view_functions.get(request.endpoint)
+    return request.method in ('GET', 'HEAD') and getattr(view, 'snapshot_fallback', False)
+
+
+def _is_admin():
+    return (request.endpoint or '').startswith('admin') or request.path.startswith('/admin')
+
+
+def _rollback():
+    try:
+        db.session.rollback()
+    except SQLAlchemyError:
+        pass
+
+
+def _dispatch(app):
+    """Run the matched view again, inside the error handler."""
+    try:
+        return app.ensure_sync(app.view_functions[request.endpoint])(**request.view_args)
+    except HTTPException as exc:
+        return app.handle_http_exception(exc)
+
+
+# ── Wiring ──
+
+def _writer_loop(app):
+    interval = app.config['SNAPSHOT_INTERVAL']
+    path = app.config['CATALOG_SNAPSHOT_PATH']
+    while True:
+        time.sleep(interval)
+        if db_down():
+            continue
+        with app.app_context():
+            try:
+                refresh_snapshot(path)
+            except SQLAlchemyError:
+                logger.warning('catalog snapshot refresh skipped: database error', exc_info=True)
+            except OSError:
+                logger.exception('catalog snapshot refresh failed')
+            finally:
+                db.session.remove()
+
+
+_writer_pid = None
+
+
+def _start_writer(app):
+    global _writer_pid
+    if _writer_pid == os.getpid() or not app.config['SNAPSHOT_INTERVAL']:
+        return
+    _writer_pid = os.getpid()
+    threading.Thread(target=_writer_loop, args=(app,), name='catalog-snapshot', daemon=True).start()
+
+
+def init_catalog_snapshot(app):
+    """Register the fallback hooks and start the writer thread lazily in
+    each worker process."""
+
+    @app.before_request
+    def _serve_while_down():
+        _start_writer(app)
+        if not db_down():
+            return None
+        if _is_admin():
+            return _maintenance(app)
+        snapshot = load_snapshot(app.config['CATALOG_SNAPSHOT_PATH'])
+        if snapshot is not None and _serves_from_snapshot(app):
+            _activate(snapshot)
+        return None
+
+    def _on_db_error(exc):
+        if current_snapshot() is not None:
+            raise exc
+        _rollback()
+        if failover_to_primary():
+            # The request read from a replica; replay it on the primary.
+            try:
+                return _dispatch(app)
+            except _DB_ERRORS as retry_exc:
+                exc = retry_exc
+                _rollback()
+        if not is_disconnect(exc):
+            raise exc
+        mark_db_down(app, exc)
+        if _is_admin():
+            return _maintenance(app)
+        snapshot = load_snapshot(app.config['CATALOG_SNAPSHOT_PATH'])
+        if snapshot is None:
+            raise exc
+        if not _serves_from_snapshot(app):
+            return _unavailable()
+        _activate(snapshot)
+        return _dispatch(app)
+
+    for error in _DB_ERRORS:
+        app.register_error_handler(error, _on_db_error)
+
+    @app.after_request
+    def _mark_snapshot_response(response):
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            response.headers['X-Catalog-Snapshot'] = snapshot.written_at
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['Surrogate-Control'] = 'no-store'
+        return response
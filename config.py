@@ -1,6 +1,65 @@
 import os
 import secrets
 
+from image_pipeline import WEBP_METHOD, WEBP_QUALITY
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _database_url(url):
+    # Railway uses postgres:// but SQLAlchemy needs postgresql://
+    if url and url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+
+def _engine_options(uri, bind='default'):
+    """SQLAlchemy engine options for the database at `uri`; `bind` names
+    its pool in the pool metrics.
+
+    Every checkout is pre-pinged so connections Railway Postgres dropped
+    while idle are replaced transparently instead of surfacing as errors.
+    The pool sizing applies per gunicorn worker: the database sees up to
+    workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+    """
+    options = {'pool_pre_ping': True}
+    if not uri.startswith('postgresql'):
+        return options
+
+    from db_pool import InstrumentedQueuePool
+    options.update({
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': _env_int('DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 5),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 10),
+        # Recycle below the proxy/server idle cut-off so a pooled connection
+        # is never handed out after the other side silently closed it.
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 300),
+        # LIFO keeps the hot connections busy and lets the surplus ones age
+        # out through pool_recycle after a traffic spike.
+        'pool_use_lifo': True,
+        'pool_logging_name': bind,
+    })
+    connect_args = {'connect_timeout': _env_int('DB_CONNECT_TIMEOUT', 5)}
+    statement_timeout = _env_int('DB_STATEMENT_TIMEOUT_MS', 15000)
+    if statement_timeout:
+        connect_args['options'] = f'-c statement_timeout={statement_timeout}'
+    # Server-side prepared statements are a psycopg 3 feature; psycopg2
+    # has no equivalent, so the setting is ignored under that driver.
+    prepare_threshold = _env_int('DB_PREPARE_THRESHOLD', 0)
+    if prepare_threshold:
+        from sqlalchemy.engine import make_url
+        if make_url(uri).get_dialect().driver == 'psycopg':
+            connect_args['prepare_threshold'] = prepare_threshold
+    options['connect_args'] = connect_args
+    return options
+
+
 class Config:
     # SECRET_KEY must be set via env in every environment. Empty or missing
     # value in production is refused at app import time (see app.py below).
@@ -10,11 +69,25 @@ class Config:
     if not _secret and not os.environ.get('DATABASE_URL'):
         _secret = secrets.token_hex(32)
     SECRET_KEY = _secret
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///graos.db')
-    # Railway uses postgres:// but SQLAlchemy needs postgresql://
-    if SQLALCHEMY_DATABASE_URI and SQLALCHEMY_DATABASE_URI.startswith('postgres://'):
-        SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace('postgres://', 'postgresql://', 1)
+    SQLALCHEMY_DATABASE_URI = _database_url(os.environ.get('DATABASE_URL', 'sqlite:///graos.db'))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # Read replicas (db_routing.py). Each URL in DATABASE_REPLICA_URLS
+    # (comma-separated) becomes a bind `replica1`, `replica2`, ... that
+    # public GET requests read from while it is healthy: reachable and no
+    # more than DB_REPLICA_MAX_LAG seconds behind, checked every
+    # DB_REPLICA_CHECK_INTERVAL seconds. A visitor whose request wrote is
+    # kept on the primary for DB_PRIMARY_PIN_SECONDS.
+    _replica_urls = [_database_url(u.strip())
+                     for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+    SQLALCHEMY_BINDS = {
+        f'replica{i}': {'url': url, **_engine_options(url, f'replica{i}')}
+        for i, url in enumerate(_replica_urls, 1)
+    }
+    DB_REPLICA_CHECK_INTERVAL = _env_int('DB_REPLICA_CHECK_INTERVAL', 5)
+    DB_REPLICA_MAX_LAG = _env_int('DB_REPLICA_MAX_LAG', 30)
+    DB_PRIMARY_PIN_SECONDS = _env_int('DB_PRIMARY_PIN_SECONDS', 15)
 
     # Upload folder: use RAILWAY_VOLUME_MOUNT_PATH if available (persistent storage),
     # otherwise fall back to local static/uploads
@@ -24,12 +97,100 @@ class Config:
     else:
         UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
 
+    # Uploads manifest (image_pipeline.py): per-file hashes and the source of
+    # each image's WebP derivatives. Kept next to the uploads folder on the
+    # volume, never inside a served directory.
+    IMAGE_MANIFEST_PATH = os.environ.get('IMAGE_MANIFEST_PATH') or (
+        os.path.join(_volume, 'image-manifest.json') if _volume
+        else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'image-manifest.json')
+    )
+    # WebP encoding of uploads and of reencode_images.py. To roll out a new
+    # setting, change it here (or in the env) and run the re-encoder: images
+    # encoded with other settings are stale, and new uploads match them.
+    IMAGE_WEBP_QUALITY = _env_int('IMAGE_WEBP_QUALITY', WEBP_QUALITY)
+    IMAGE_WEBP_METHOD = _env_int('IMAGE_WEBP_METHOD', WEBP_METHOD)
+    # Upload serving (upload_serving.py). UPLOADS_OFFLOAD hands the bytes to
+    # the front proxy: 'x-accel' (nginx, internal location mapped to
+    # UPLOADS_ACCEL_PREFIX) or 'x-sendfile' (Apache/lighttpd). Empty serves
+    # from the worker with sendfile and Range support.
+    UPLOADS_OFFLOAD = os.environ.get('UPLOADS_OFFLOAD', '').lower()
+    UPLOADS_ACCEL_PREFIX = os.environ.get('UPLOADS_ACCEL_PREFIX', '/_uploads/')
+
+    # Checkpoint of the /admin/migrate-images background job (image_migration.py).
+    IMAGE_MIGRATION_STATE_PATH = os.environ.get('IMAGE_MIGRATION_STATE_PATH') or (
+        os.path.join(_volume, 'image-migration.json') if _volume
+        else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'image-migration.json')
+    )
+
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB max upload
     ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'admin')
     # ADMIN_PASSWORD is read directly from os.environ by the bootstrap in
     # app.py::ensure_admin_password_hash. The app NEVER compares plaintext —
     # the env var is hashed to the DB on first boot and can be removed after.
 
+    # Monitoring. /admin/metrics accepts an admin session or a scraper
+    # presenting `Authorization: Bearer <METRICS_TOKEN>`; empty disables
+    # token access. SERVER_TIMING_ENABLED toggles the Server-Timing header.
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', '1') != '0'
+
+    # Slow-request log (slowlog.py). Requests over SLOW_REQUEST_MS (0 turns
+    # the log off) are appended to SLOW_LOG_PATH — default
+    # instance/slow_requests.log — with their SQL. SLOW_PROFILE_SAMPLE_RATE
+    # is the fraction of requests stack-sampled every
+    # SLOW_PROFILE_INTERVAL_MS; a couple of percent is cheap in production.
+    SLOW_REQUEST_MS = _env_int('SLOW_REQUEST_MS', 1000)
+    SLOW_LOG_PATH = os.environ.get('SLOW_LOG_PATH', '')
+    SLOW_PROFILE_SAMPLE_RATE = float(os.environ.get('SLOW_PROFILE_SAMPLE_RATE', '0.02'))
+    SLOW_PROFILE_INTERVAL_MS = _env_int('SLOW_PROFILE_INTERVAL_MS', 10)
+
+    # Edge cache (surrogate_keys.py). Public responses carry Surrogate-Key
+    # tags and a Surrogate-Control of CDN_EDGE_TTL; admin writes purge the
+    # affected keys through CDN_PURGER ('' none, 'http' -> CDN_PURGE_URL,
+    # 'local' in-process stand-in proxy). Browsers keep the short
+    # Cache-Control, with the same stale windows.
+    CDN_PURGER = os.environ.get('CDN_PURGER', '').lower()
+    CDN_PURGE_URL = os.environ.get('CDN_PURGE_URL', '')
+    CDN_PURGE_TOKEN = os.environ.get('CDN_PURGE_TOKEN', '')
+    CDN_EDGE_TTL = _env_int('CDN_EDGE_TTL', 86400)
+    CDN_STALE_WHILE_REVALIDATE = _env_int('CDN_STALE_WHILE_REVALIDATE', 60)
+    CDN_STALE_IF_ERROR = _env_int('CDN_STALE_IF_ERROR', 86400)
+
+    # Rendered-page cache (view_cache.py), shared by the workers of one host.
+    # Entries are re-rendered by one worker at a time when the catalog or
+    # site settings change or after VIEW_CACHE_TTL seconds; the others serve
+    # the stale copy meanwhile, and on database errors for up to
+    # VIEW_CACHE_STALE_IF_ERROR seconds. Beyond VIEW_CACHE_MAX_ENTRIES pages
+    # the least recently rendered are pruned. VIEW_CACHE_DIR defaults to
+    # instance/view-cache; it must belong to the app's user (see view_cache.py).
+    VIEW_CACHE_ENABLED = os.environ.get('VIEW_CACHE_ENABLED', '1') != '0'
+    VIEW_CACHE_DIR = os.environ.get('VIEW_CACHE_DIR', '')
+    VIEW_CACHE_TTL = _env_int('VIEW_CACHE_TTL', 300)
+    VIEW_CACHE_STALE_IF_ERROR = _env_int('VIEW_CACHE_STALE_IF_ERROR', 86400)
+    VIEW_CACHE_MAX_ENTRIES = _env_int('VIEW_CACHE_MAX_ENTRIES', 5000)
+
+    # Catalog snapshot (catalog_snapshot.py): categories, active products and
+    # public settings, rewritten every SNAPSHOT_INTERVAL seconds when they
+    # changed (0 disables the writer thread) and served while the database
+    # is unreachable. After a connection error the database is retried
+    # every SNAPSHOT_RETRY_SECONDS.
+    CATALOG_SNAPSHOT_PATH = os.environ.get('CATALOG_SNAPSHOT_PATH') or (
+        os.path.join(_volume, 'catalog-snapshot.json.gz') if _volume
+        else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'catalog-snapshot.json.gz')
+    )
+    SNAPSHOT_INTERVAL = _env_int('SNAPSHOT_INTERVAL', 60)
+    SNAPSHOT_RETRY_SECONDS = _env_int('SNAPSHOT_RETRY_SECONDS', 10)
+
+    # Compiled templates (template_cache.py): Jinja bytecode written by
+    # precompile_templates.py / gunicorn's on_starting hook and loaded by the
+    # workers instead of compiling every template on its first render.
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'instance', 'jinja-bytecode'
+    )
+
+    # Catalog listing page size (/productos and its infinite-scroll API).
+    CATALOG_PAGE_SIZE = _env_int('CATALOG_PAGE_SIZE', 48)
+
     # Meta (Facebook) tracking — Pixel + Conversions API
     META_PIXEL_ID = os.environ.get('META_PIXEL_ID', '')
     META_CAPI_ACCESS_TOKEN = os.environ.get('META_CAPI_ACCESS_TOKEN', '')
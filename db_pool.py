@@ -0,0 +1,75 @@
+"""Connection pool instrumentation.
+
+`InstrumentedQueuePool` is a drop-in QueuePool that measures how long each
+checkout waits for a connection (including the connect itself when the
+pool has to open a new one). config.py selects it for PostgreSQL; SQLite
+keeps SQLAlchemy's default pool.
+
+`pool_status(engine)` returns a JSON-friendly snapshot of the pool —
+configured size, connections checked in/out, overflow in use and checkout
+wait statistics — for the admin monitoring endpoints.
+"""
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from metrics import DB_POOL_WAIT
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that keeps checkout wait counters on the pool instance.
+    Waits are observed under the pool's logging name (the bind)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bind_name = kwargs.get('logging_name') or 'default'
+        self._wait_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            DB_POOL_WAIT.labels(self.bind_name).observe(waited)
+            with self._wait_lock:
+                self.wait_count += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+                self.timeouts += timed_out
+
+
+def pool_status(engine):
+    """Snapshot of `engine`'s pool. Pools other than QueuePool (e.g. the
+    SQLite pools) only report their class name."""
+    pool = engine.pool
+    status = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        with pool._wait_lock:
+            count = pool.wait_count
+            status.update({
+                'checkouts': count,
+                'checkout_timeouts': pool.timeouts,
+                'wait_avg_ms': round(pool.wait_total / count * 1000, 3) if count else 0.0,
+                'wait_max_ms': round(pool.wait_max * 1000, 3),
+                'wait_total_s': round(pool.wait_total, 3),
+            })
+    return status
@@ -0,0 +1,224 @@
+"""Read/write splitting between the primary database and read replicas.
+
+Replicas are the SQLAlchemy binds config.py builds from
+DATABASE_REPLICA_URLS (`replica1`, `replica2`, ...); no model is bound to
+them. `RoutingSession`, the class behind db.session, sends a statement
+to a replica only when:
+
+- the request is a GET/HEAD outside /admin, and the visitor has no
+  primary-pin cookie (set for DB_PRIMARY_PIN_SECONDS after one of their
+  requests committed a write, so they read their own writes despite
+  replication lag);
+- the session has not written yet in this request (once it flushes or
+  runs an INSERT/UPDATE/DELETE, everything after goes to the primary);
+- a replica is healthy.
+
+Anything else (admin, POSTs, boot, scripts, background jobs) uses the
+primary. A request picks one replica, round-robin, and keeps it.
+
+Health: a thread in each worker runs `SELECT 1` on every replica every
+DB_REPLICA_CHECK_INTERVAL seconds, plus the replay lag on PostgreSQL,
+and takes replicas that fail or lag more than DB_REPLICA_MAX_LAG out of
+rotation until a later check passes. A connection error on a replica
+during a request takes it out at once; on any database error,
+`failover_to_primary()` lets the error handler (catalog_snapshot.py)
+replay the request on the primary. Health and lag are exported per bind
+(ep_db_replica_healthy, ep_db_replica_lag_seconds), next to the per-bind
+pool gauges.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.sql.dml import UpdateBase
+
+from metrics import DB_REPLICA_HEALTHY, DB_REPLICA_LAG
+
+
+logger = logging.getLogger('ep.db_routing')
+
+PRIMARY = 'default'
+PIN_COOKIE = '_ep_db_primary'
+
+# Replay lag on a PostgreSQL standby; 0 when it has replayed everything
+# it received (an idle primary doesn't make a caught-up standby "lag").
+_PG_LAG_SQL = text(
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+
+
+_health_lock = threading.Lock()
+
+
+class Replica:
+    __slots__ = ('name', 'healthy', 'lag', 'checked', 'error')
+
+    def __init__(self, name):
+        self.name = name
+        self.healthy = True
+        self.lag = 0.0
+        self.checked = None
+        self.error = None
+
+    def set_health(self, healthy, error=None):
+        with _health_lock:
+            changed = healthy != self.healthy
+            self.healthy = healthy
+            self.error = error
+        if changed and healthy:
+            logger.warning('replica %s back in rotation', self.name)
+        elif changed:
+            logger.error('replica %s out of rotation: %s', self.name, error)
+        DB_REPLICA_HEALTHY.labels(self.name).set(1 if healthy else 0)
+
+    def status(self):
+        return {'healthy': self.healthy, 'lag_s': round(self.lag, 3),
+                'checked': self.checked, 'error': self.error}
+
+
+_replicas = {}
+_round_robin = itertools.count()
+
+
+def replicas():
+    """{bind name: Replica} for the configured replicas."""
+    return _replicas
+
+
+# ── Routing ──
+
+def _choose_replica():
+    if request.method not in ('GET', 'HEAD') or request.cookies.get(PIN_COOKIE):
+        return None
+    if (request.endpoint or '').startswith('admin') or request.path.startswith('/admin'):
+        return None
+    healthy = [r.name for r in _replicas.values() if r.healthy]
+    if not healthy:
+        return None
+    return healthy[next(_round_robin) % len(healthy)]
+
+
+def routed_replica():
+    """Replica bind the current request reads from, or None for the primary."""
+    if not _replicas or not has_request_context():
+        return None
+    if '_db_replica' not in g:
+        g._db_replica = _choose_replica()
+    return g._db_replica
+
+
+def failover_to_primary():
+    """After a database error: if the request was reading from a replica,
+    move it to the primary and return True. Connection errors have already
+    taken the replica out of rotation; other errors (statement timeouts,
+    recovery conflicts) only cost this request its replica."""
+    if not has_request_context() or g.get('_db_replica') is None:
+        return False
+    g._db_replica = None
+    return True
+
+
+class RoutingSession(Session):
+    """db.session class: reads go to the request's replica until the
+    session writes; see the module docstring."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self.info.get('wrote'):
+            if self._flushing or isinstance(clause, UpdateBase):
+                self.info['wrote'] = True
+            else:
+                name = routed_replica()
+                if name is not None:
+                    return self._db.engines[name]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# ── Health checks ──
+
+def check_replica(engine, replica, max_lag):
+    try:
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            lag = float(conn.execute(_PG_LAG_SQL).scalar() or 0) \
+                if engine.dialect.name == 'postgresql' else 0.0
+    except Exception as exc:
+        replica.checked = time.time()
+        replica.set_health(False, f'{type(exc).__name__}: {exc}'.splitlines()[0])
+        return
+    replica.checked = time.time()
+    replica.lag = lag
+    DB_REPLICA_LAG.labels(replica.name).set(lag)
+    if lag > max_lag:
+        replica.set_health(False, f'lag {lag:.1f}s > {max_lag}s')
+    else:
+        replica.set_health(True)
+
+
+def _checker_loop(app):
+    interval = app.config['DB_REPLICA_CHECK_INTERVAL']
+    max_lag = app.config['DB_REPLICA_MAX_LAG']
+    with app.app_context():
+        engines = {name: app.extensions['sqlalchemy'].engines[name] for name in _replicas}
+    while True:
+        for name, replica in _replicas.items():
+            check_replica(engines[name], replica, max_lag)
+        time.sleep(interval)
+
+
+_checker_pid = None
+
+
+def _start_checker(app):
+    global _checker_pid
+    if _checker_pid == os.getpid():
+        return
+    _checker_pid = os.getpid()
+    threading.Thread(target=_checker_loop, args=(app,), name='replica-health', daemon=True).start()
+
+
+def bind_engines(db):
+    """(bind name, engine) for the primary and every replica."""
+    yield PRIMARY, db.engine
+    for name in _replicas:
+        yield name, db.engines[name]
+
+
+def init_db_routing(app, db):
+    """Register the configured replicas, their error hooks and the
+    primary-pin cookie. A no-op without replicas."""
+    names = [name for name in app.config.get('SQLALCHEMY_BINDS', {}) if name.startswith('replica')]
+    if not names:
+        return
+    with app.app_context():
+        for name in names:
+            replica = _replicas[name] = Replica(name)
+            replica.set_health(True)
+
+            @event.listens_for(db.engines[name], 'handle_error')
+            def _replica_error(context, replica=replica):
+                if context.is_disconnect or context.connection is None:
+                    replica.set_health(False, f'connection error: {type(context.original_exception).__name__}')
+
+    @event.listens_for(db.session, 'after_commit')
+    def _note_write(session):
+        if session.info.get('wrote') and has_request_context():
+            g._db_wrote = True
+
+    @app.before_request
+    def _start():
+        _start_checker(app)
+
+    @app.after_request
+    def _pin_writer(response):
+        if g.get('_db_wrote'):
+            response.set_cookie(PIN_COOKIE, '1', max_age=app.config['DB_PRIMARY_PIN_SECONDS'],
+                                httponly=True, samesite='Lax', secure=not app.debug)
+        return response
+
+    app.logger.info('read replicas: %s', ', '.join(names))
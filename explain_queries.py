@@ -0,0 +1,107 @@
+"""
+Query plan check — runs EXPLAIN on the queries behind the public routes and
+fails when any of them falls back to a full table scan or an extra sort.
+
+Run after changing models, indexes or the public views:
+
+    python explain_queries.py            # prints plans, exit 1 on a miss
+    python explain_queries.py --quiet    # only the verdict lines
+
+Works on SQLite (EXPLAIN QUERY PLAN) and PostgreSQL (EXPLAIN with
+enable_seqscan off, so the planner reports whether an index is usable at
+all instead of preferring a seq scan on a small table).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import and_, or_, select, text
+from sqlalchemy.orm import joinedload
+
+from app import app, db
+from catalog_cache import CATALOG_VERSION_KEY, SETTINGS_VERSION_KEY
+from models import Category, Product, SiteSetting
+from product_index import index_query
+
+
+def public_queries(category_id, product):
+    """(label, statement) pairs mirroring the queries issued by the public
+    routes in app.py. Keep this list in sync when a view changes shape.
+
+    The home page, category counts, alias pools, guides, related products
+    and sitemaps are all served from the product index (product_index.py),
+    so their only query is the index build, run once per catalog version;
+    every cached page and derived table first reads the catalog version."""
+    def listing():
+        return select(Product).options(joinedload(Product.category)).filter_by(active=True)
+
+    return [
+        ('catalog version', select(SiteSetting.key, SiteSetting.value)
+            .where(SiteSetting.key.in_((CATALOG_VERSION_KEY, SETTINGS_VERSION_KEY)))),
+        ('product index: build', index_query()),
+        ('productos: categories', select(Category).order_by(Category.order)),
+        ('productos: first page', listing()
+            .order_by(Product.name, Product.id).limit(49)),
+        ('productos: after cursor', listing()
+            .where(or_(Product.name > 'M', and_(Product.name == 'M', Product.id > 1)))
+            .order_by(Product.name, Product.id).limit(49)),
+        ('productos: before cursor', listing()
+            .where(or_(Product.name < 'M', and_(Product.name == 'M', Product.id < 1)))
+            .order_by(Product.name.desc(), Product.id.desc()).limit(49)),
+        ('productos: category page', listing().filter_by(category_id=category_id)
+            .order_by(Product.name, Product.id).limit(49)),
+        ('productos: category by slug', select(Category).filter_by(slug=product.category.slug)),
+        ('producto: by slug', select(Product).options(joinedload(Product.category))
+            .filter_by(slug=product.slug, active=True)),
+        ('admin: products by date', select(Product).order_by(Product.created_at.desc())),
+    ]
+
+
+def _plan_lines(conn, stmt):
+    sql = str(stmt.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    if db.engine.dialect.name == 'sqlite':
+        return [row[-1] for row in conn.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+    return [row[0] for row in conn.execute(text('EXPLAIN ' + sql))]
+
+
+def _misses(lines):
+    """Return the plan lines that indicate the query is not index-backed."""
+    bad = []
+    for line in lines:
+        stripped = line.strip()
+        if db.engine.dialect.name == 'sqlite':
+            if stripped.startswith('SCAN ') and 'INDEX' not in stripped:
+                bad.append(stripped)
+            elif 'TEMP B-TREE' in stripped:
+                bad.append(stripped)
+        elif 'Seq Scan' in stripped:
+            bad.append(stripped)
+    return bad
+
+
+def main(argv):
+    quiet = '--quiet' in argv
+    failures = 0
+    with app.app_context():
+        product = Product.query.filter_by(active=True).first()
+        if not product:
+            print('No active products — seed the database first.')
+            return 1
+        with db.engine.connect() as conn:
+            if db.engine.dialect.name == 'postgresql':
+                conn.execute(text('SET enable_seqscan = off'))
+            for label, stmt in public_queries(product.category_id, product):
+                lines = _plan_lines(conn, stmt)
+                bad = _misses(lines)
+                failures += bool(bad)
+                print(f"{'FAIL' if bad else 'ok  '} {label}")
+                if not quiet or bad:
+                    for line in lines:
+                        print(f'       {line}')
+    print(f'\n{failures} quer{"y" if failures == 1 else "ies"} without index support.')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,55 @@
+"""gunicorn settings — picked up automatically by `gunicorn app:app`.
+
+Only the Prometheus multiprocess wiring and template precompilation live
+here; workers, bind and timeouts keep coming from gunicorn's defaults and
+the Railway env (WEB_CONCURRENCY, PORT).
+
+- PROMETHEUS_MULTIPROC_DIR is set (and wiped) in the master before any
+  worker forks, so every worker writes its samples to the same directory
+  and /metrics can merge them.
+- child_exit marks a dead worker's live gauges so they stop counting.
+- METRICS_PORT, when set, also serves the merged metrics from the master
+  on that port, for scrapers on the private network that should not go
+  through the public app.
+- on_starting also compiles the templates into TEMPLATE_CACHE_DIR (see
+  template_cache.py), so workers load bytecode instead of compiling each
+  template on its first render. Only stale entries are recompiled; a
+  failure is logged and the workers compile on demand as before.
+"""
+import os
+import shutil
+
+_multiproc_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join('/tmp', f'ep-prometheus-{os.getpid()}')
+)
+
+
+def on_starting(server):
+    shutil.rmtree(_multiproc_dir, ignore_errors=True)
+    os.makedirs(_multiproc_dir, exist_ok=True)
+    try:
+        from template_cache import precompile, template_app
+        report = precompile(template_app().jinja_env)
+    except Exception:
+        server.log.exception('template precompilation failed')
+        return
+    for name, error in report['failed'].items():
+        server.log.warning('template %s not precompiled: %s', name, error)
+    server.log.info('templates: %d compiled, %d up to date in %.0f ms',
+                    len(report['compiled']), len(report['fresh']), report['seconds'] * 1000)
+
+
+def when_ready(server):
+    port = os.environ.get('METRICS_PORT')
+    if not port:
+        return
+    from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(int(port), registry=registry)
+    server.log.info('Prometheus metrics on internal port %s', port)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
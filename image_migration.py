@@ -0,0 +1,296 @@
+"""Background job behind /admin/migrate-images.
+
+The job moves the image library onto the Railway volume and points the
+catalog at it, in three phases:
+
+1. copy:  static/uploads -> <volume>/uploads on a small thread pool. A file
+          already on the volume with the same size and mtime is skipped; same
+          size but a different mtime is compared by sha256 before copying.
+          Copies land in a temp file and are os.replace()d into place.
+2. paths: image paths rewritten in SQL, one UPDATE per rule:
+          `/static/uploads/` -> `/uploads/` (on the volume) and `.png` ->
+          `.webp` for the images whose WebP exists.
+3. seed:  products with no image get the one from seed_data.json (read only
+          when there is such a product), as one executemany UPDATE.
+
+Phases 2 and 3 commit together with a single catalog version bump.
+
+Progress is checkpointed to a JSON state file (IMAGE_MIGRATION_STATE_PATH):
+the current phase, counters, and the files copied so far. An fcntl lock
+next to it makes sure only one worker runs the job; a state that says
+"running" while nobody holds the lock belongs to a job whose worker died,
+and starting again resumes from the checkpoint.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import String, bindparam, func, or_, select, update
+
+from catalog_cache import bump_catalog_version
+from models import Product, db
+from surrogate_keys import stage_purge
+
+
+PHASES = ('copy', 'paths', 'seed', 'done')
+COPY_THREADS = 8
+CHECKPOINT_EVERY = 2.0  # seconds between state writes during the copy
+
+
+class MigrationState:
+    """JSON checkpoint of the job, shared by every worker through the file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write(self, state):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f'{self.path}.{uuid.uuid4().hex[:8]}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+
+
+class JobLock:
+    """Non-blocking exclusive flock on `<state>.lock`."""
+
+    def __init__(self, path):
+        self.path = f'{path}.lock'
+        self._fd = None
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def held_elsewhere(self):
+        if self._fd is not None:
+            return False
+        if self.acquire():
+            self.release()
+            return False
+        return True
+
+
+def job_status(state_path):
+    """State for the progress page. A "running" job that nobody holds the
+    lock for is reported as "interrupted"."""
+    state = MigrationState(state_path).read()
+    if state.get('status') == 'running' and not JobLock(state_path).held_elsewhere():
+        state['status'] = 'interrupted'
+    return state
+
+
+# ── Copy ──
+
+def _digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.digest()
+
+
+def _copy_one(src, dst):
+    """'copied' or 'skipped'."""
+    s = os.stat(src)
+    try:
+        d = os.stat(dst)
+    except FileNotFoundError:
+        d = None
+    if d is not None and d.st_size == s.st_size:
+        if int(d.st_mtime) == int(s.st_mtime) or _digest(src) == _digest(dst):
+            return 'skipped'
+    tmp = f'{dst}.{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return 'copied'
+
+
+def _copy_phase(state, save, src_dir, dst_dir):
+    os.makedirs(dst_dir, exist_ok=True)
+    done = set(state.setdefault('completed', []))
+    names = sorted(
+        e.name for e in os.scandir(src_dir) if e.is_file() and not e.name.endswith('.tmp')
+    ) if os.path.isdir(src_dir) else []
+    pending = [n for n in names if n not in done]
+    state['total'] = len(names)
+    state['done'] = len(names) - len(pending)
+    save()
+    last = time.monotonic()
+    with ThreadPoolExecutor(max_workers=COPY_THREADS) as pool:
+        results = pool.map(lambda n: (n, _copy_one(os.path.join(src_dir, n), os.path.join(dst_dir, n))),
+                           pending)
+        for name, outcome in results:
+            state[outcome] = state.get(outcome, 0) + 1
+            state['completed'].append(name)
+            state['done'] += 1
+            if time.monotonic() - last >= CHECKPOINT_EVERY:
+                save()
+                last = time.monotonic()
+
+
+# ── Database ──
+
+def _paths_phase(volume, check_dir):
+    """Rewrite image paths set-based. Returns rows changed."""
+    now = datetime.utcnow()
+    changed = 0
+    if volume:
+        stage_purge(*(f'product:{slug}' for slug in db.session.execute(
+            select(Product.slug).where(Product.image.like('/static/uploads/%'))).scalars()))
+        result = db.session.execute(
+            update(Product)
+            .where(Product.image.like('/static/uploads/%'))
+            .values(image=func.replace(Product.image, '/static/uploads/', '/uploads/'), updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        changed += result.rowcount
+    # .png -> .webp only where the WebP is on disk: one SELECT to find the
+    # candidates, one UPDATE ... IN for the ones that qualify.
+    pngs = db.session.execute(
+        select(Product.image).where(Product.image.like('%.png')).distinct()
+    ).scalars().all()
+    webp_ready = [
+        path for path in pngs
+        if os.path.exists(os.path.join(check_dir, path.rsplit('/', 1)[-1][:-4] + '.webp'))
+    ]
+    if webp_ready:
+        stage_purge(*(f'product:{slug}' for slug in db.session.execute(
+            select(Product.slug).where(Product.image.in_(webp_ready))).scalars()))
+        result = db.session.execute(
+            update(Product)
+            .where(Product.image.in_(webp_ready))
+            .values(
+                image=func.substr(Product.image, 1, func.length(Product.image) - 4, type_=String) + '.webp',
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        changed += result.rowcount
+    return changed
+
+
+def _seed_phase(volume, seed_path):
+    """Fill empty images from seed_data.json. Returns rows changed."""
+    empty = db.session.execute(
+        select(Product.id, Product.slug).where(or_(Product.image == '', Product.image.is_(None)))
+    ).all()
+    if not empty or not os.path.exists(seed_path):
+        return 0
+    with open(seed_path, encoding='utf-8') as f:
+        seed_map = {p['slug']: p.get('image', '') for p in json.load(f)['products']}
+    now = datetime.utcnow()
+    params = []
+    for row in empty:
+        image = seed_map.get(row.slug, '')
+        if not image:
+            continue
+        if volume:
+            image = image.replace('/static/uploads/', '/uploads/')
+        if image.endswith('.png'):
+            image = image.rsplit('.', 1)[0] + '.webp'
+        params.append({'b_id': row.id, 'b_image': image})
+        stage_purge(f'product:{row.slug}')
+    if params:
+        db.session.execute(
+            update(Product.__table__)
+            .where(Product.__table__.c.id == bindparam('b_id'))
+            .values(image=bindparam('b_image'), updated_at=now),
+            params,
+        )
+    return len(params)
+
+
+# ── Runner ──
+
+def run_migration(app, state_path, lock):
+    """Run (or resume) the job in the calling thread. `lock` is an acquired
+    JobLock, released on exit."""
+    store = MigrationState(state_path)
+    state = store.read()
+    if state.get('status') in (None, 'done'):
+        state = {'id': uuid.uuid4().hex[:12], 'phase': PHASES[0], 'started': time.time()}
+    state.update(status='running', host=socket.gethostname(), pid=os.getpid(), error=None)
+
+    def save():
+        state['heartbeat'] = time.time()
+        store.write(state)
+
+    volume = os.environ.get('RAILWAY_VOLUME_MOUNT_PATH')
+    src_dir = os.path.join(app.root_path, 'static', 'uploads')
+    check_dir = os.path.join(volume, 'uploads') if volume else src_dir
+    try:
+        with app.app_context():
+            if state['phase'] == 'copy':
+                if volume:
+                    _copy_phase(state, save, src_dir, check_dir)
+                state['phase'] = 'paths'
+                save()
+            if state['phase'] in ('paths', 'seed'):
+                state['paths_fixed'] = _paths_phase(volume, check_dir)
+                state['phase'] = 'seed'
+                state['seed_synced'] = _seed_phase(volume, os.path.join(app.root_path, 'seed_data.json'))
+                if state['paths_fixed'] or state['seed_synced']:
+                    bump_catalog_version()
+                    stage_purge('catalog')
+                db.session.commit()
+                state['phase'] = 'done'
+        state['status'] = 'done'
+        state['finished'] = time.time()
+        state.pop('completed', None)
+        app.logger.info('image migration %s done: %s', state['id'],
+                        {k: state.get(k) for k in ('copied', 'skipped', 'paths_fixed', 'seed_synced')})
+    except Exception as exc:
+        app.logger.exception('image migration %s failed', state.get('id'))
+        with app.app_context():
+            db.session.rollback()
+        state['status'] = 'failed'
+        state['error'] = f'{type(exc).__name__}: {exc}'
+    finally:
+        save()
+        lock.release()
+
+
+def start_migration(app, state_path):
+    """Start or resume the job on a daemon thread of this worker. Returns
+    False when another worker already runs it."""
+    lock = JobLock(state_path)
+    if not lock.acquire():
+        return False
+    thread = threading.Thread(target=run_migration, args=(app, state_path, lock),
+                              name='image-migration', daemon=True)
+    thread.start()
+    return True
@@ -0,0 +1,155 @@
+"""Image encoding shared by uploads (app.save_image) and the bulk
+re-encoder (reencode_images.py), plus the uploads manifest.
+
+Every product image is stored as WebP derivatives named `<stem><suffix>.webp`
+(VARIANTS: the 600px main image and the 400px `-sm` thumbnail), square
+center-cropped. Legacy uploads also keep their PNG/JPEG original next to
+them. Derivatives are written to a temp file in the same directory and
+moved into place with os.replace(), so a reader never sees a half-written
+image.
+
+The manifest (IMAGE_MANIFEST_PATH, kept outside the served uploads folder)
+is a JSON file with two maps:
+
+- `files`: every file in the uploads folder -> size, mtime_ns and sha256.
+  Entries are refreshed only when size or mtime change.
+- `sources`: stem -> the source file its derivatives were built from, that
+  file's size/mtime_ns, and the encoding signature. A stem whose entry
+  still matches is up to date and is skipped by the re-encoder.
+"""
+import hashlib
+import json
+import os
+import uuid
+
+
+VARIANTS = (('', 600), ('-sm', 400))
+WEBP_QUALITY = 85
+WEBP_METHOD = 4
+
+# Preferred source for each stem, best first. A stem with only WebP
+# derivatives uses its main image to rebuild the smaller variants.
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+MANIFEST_VERSION = 1
+
+
+def encoding_signature(variants=VARIANTS, quality=WEBP_QUALITY, method=WEBP_METHOD):
+    sizes = ','.join(f'{suffix or "main"}{size}' for suffix, size in variants)
+    return f'webp:q{quality}:m{method}:{sizes}'
+
+
+# ── Encoding ──
+
+def to_rgb(img):
+    """Flatten transparency onto white and convert to RGB."""
+    from PIL import Image as PILImage
+
+    if img.mode == 'RGBA':
+        bg = PILImage.new('RGB', img.size, (255, 255, 255))
+        bg.paste(img, mask=img.split()[3])
+        return bg
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def square(img, size):
+    """Center-crop to a square and shrink to `size` if larger."""
+    from PIL import Image as PILImage
+
+    resized = img.copy()
+    w, h = resized.size
+    if w != h:
+        side = min(w, h)
+        left = (w - side) // 2
+        top = (h - side) // 2
+        resized = resized.crop((left, top, left + side, top + side))
+    if max(w, h) > size:
+        resized = resized.resize((size, size), PILImage.LANCZOS)
+    return resized
+
+
+def atomic_save(img, path, **params):
+    tmp = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        img.save(tmp, **params)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def write_variants(img, folder, stem, variants=VARIANTS, quality=WEBP_QUALITY,
+                   method=WEBP_METHOD, skip=()):
+    """Write the WebP derivatives of an RGB image. Returns the filenames
+    written; suffixes in `skip` are left alone."""
+    written = []
+    for suffix, size in variants:
+        if suffix in skip:
+            continue
+        filename = f'{stem}{suffix}.webp'
+        atomic_save(square(img, size), os.path.join(folder, filename),
+                    format='WEBP', quality=quality, method=method)
+        written.append(filename)
+    return written
+
+
+# ── Manifest ──
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_entry(path, st=None):
+    st = st or os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': file_digest(path)}
+
+
+def load_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    if data.get('version') != MANIFEST_VERSION:
+        data = {}
+    data.setdefault('version', MANIFEST_VERSION)
+    data.setdefault('files', {})
+    data.setdefault('sources', {})
+    return data
+
+
+def save_manifest(path, data):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def refresh_files(manifest, folder):
+    """Bring manifest['files'] in line with the folder, hashing only files
+    whose size or mtime changed. Returns the number of files hashed."""
+    files = manifest['files']
+    present = set()
+    hashed = 0
+    with os.scandir(folder) as it:
+        for entry in it:
+            if not entry.is_file() or entry.name.startswith('.') or entry.name.endswith('.tmp'):
+                continue
+            present.add(entry.name)
+            st = entry.stat()
+            known = files.get(entry.name)
+            if known and known['size'] == st.st_size and known['mtime_ns'] == st.st_mtime_ns:
+                continue
+            files[entry.name] = file_entry(entry.path, st)
+            hashed += 1
+    for name in set(files) - present:
+        del files[name]
+    return hashed
@@ -14,6 +14,9 @@ import time
 import requests
 from flask import current_app
 
+from metrics import CAPI_INFLIGHT, CAPI_LATENCY
+from perf import timed
+
 
 GRAPH_API_VERSION = 'v20.0'
 GRAPH_TIMEOUT_SECONDS = 3
@@ -83,17 +86,25 @@ def send_capi_event(event_name, event_id, event_source_url, user_data=None, cust
         payload['test_event_code'] = test_code
 
     url = f'https://graph.facebook.com/{GRAPH_API_VERSION}/{pixel_id}/events'
+    started = time.perf_counter()
+    outcome = 'error'
+    CAPI_INFLIGHT.inc()
     try:
-        resp = requests.post(
-            url,
-            params={'access_token': access_token},
-            json=payload,
-            timeout=GRAPH_TIMEOUT_SECONDS,
-        )
+        with timed('http'):
+            resp = requests.post(
+                url,
+                params={'access_token': access_token},
+                json=payload,
+                timeout=GRAPH_TIMEOUT_SECONDS,
+            )
+        outcome = 'ok' if resp.ok else 'rejected'
         return resp.json()
     except Exception as exc:
         current_app.logger.warning('CAPI send failed for %s: %s', event_name, exc)
         return None
+    finally:
+        CAPI_INFLIGHT.dec()
+        CAPI_LATENCY.labels(event_name, outcome).observe(time.perf_counter() - started)
 
 
 def user_data_from_request(req, form=None):
@@ -0,0 +1,132 @@
+"""Prometheus metrics.
+
+Collectors for the things worth tuning the deployment on: request latency
+and status per route, connection pool usage and checkout waits, cache
+hit/miss, Meta CAPI sends, image processing and rate-limiter rejections.
+
+Under gunicorn the collectors run in multiprocess mode: gunicorn.conf.py
+points PROMETHEUS_MULTIPROC_DIR at a scratch directory before the workers
+fork, each worker writes its samples there, and `render_metrics()` merges
+every worker's files so a single scrape sees the whole service. Without
+that variable (flask dev server, scripts) the default in-process registry
+is used.
+"""
+import os
+import time
+
+from flask import g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from prometheus_client import REGISTRY as DEFAULT_REGISTRY
+
+from perf import LATENCY_BUCKETS
+
+
+REQUEST_LATENCY = Histogram(
+    'ep_http_request_duration_seconds', 'Request wall time by route.',
+    ['route', 'method'], buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    'ep_http_requests_total', 'Requests by route, method and status code.',
+    ['route', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'ep_http_request_db_queries', 'SQL statements issued per request.',
+    ['route'], buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'ep_db_pool_connections', 'Pooled connections by bind and state.',
+    ['bind', 'state'], multiprocess_mode='livesum',
+)
+DB_POOL_WAIT = Histogram(
+    'ep_db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection, by bind.',
+    ['bind'], buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0),
+)
+DB_REPLICA_HEALTHY = Gauge(
+    'ep_db_replica_healthy', 'Whether a read replica is in rotation (1) or not (0), by bind.',
+    ['bind'], multiprocess_mode='livemin',
+)
+DB_REPLICA_LAG = Gauge(
+    'ep_db_replica_lag_seconds', 'Replication lag seen by the last health check, by bind.',
+    ['bind'], multiprocess_mode='livemax',
+)
+CACHE_REQUESTS = Counter(
+    'ep_cache_requests_total', 'In-app cache lookups by cache and result.',
+    ['cache', 'result'],
+)
+CAPI_INFLIGHT = Gauge(
+    'ep_capi_inflight', 'Meta CAPI sends in progress (send queue depth).',
+    multiprocess_mode='livesum',
+)
+CAPI_LATENCY = Histogram(
+    'ep_capi_send_duration_seconds', 'Meta CAPI send latency by event and outcome.',
+    ['event', 'outcome'], buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0),
+)
+IMAGE_JOB_DURATION = Histogram(
+    'ep_image_job_duration_seconds', 'Image processing job duration by job.',
+    ['job'], buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    'ep_rate_limit_rejections_total', 'Requests rejected by Flask-Limiter, by route.',
+    ['route'],
+)
+
+# Pool gauges are refreshed from the request hook at most this often.
+POOL_SAMPLE_INTERVAL = 1.0
+_last_pool_sample = 0.0
+
+
+def record_cache(cache, result):
+    """Count one lookup in `cache`; result is 'hit', 'stale' or 'miss'."""
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+
+def record_rate_limit(limit):
+    """Flask-Limiter `on_breach` callback."""
+    RATE_LIMIT_REJECTIONS.labels(request.endpoint or 'unmatched').inc()
+
+
+def sample_pool(bind, status):
+    """Copy a db_pool.pool_status() snapshot into the pool gauges."""
+    for state in ('checked_in', 'checked_out', 'overflow'):
+        if state in status:
+            DB_POOL_CONNECTIONS.labels(bind, state).set(status[state])
+
+
+def init_metrics(app, pool_sampler=None):
+    """Observe every request into the Prometheus collectors.
+
+    `pool_sampler` is a zero-argument callable that refreshes the pool
+    gauges; it runs at most once per POOL_SAMPLE_INTERVAL per worker.
+    """
+
+    @app.after_request
+    def _observe_request(response):
+        global _last_pool_sample
+        state = g.get('_perf')
+        if state is None:
+            return response
+        route = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(route, request.method).observe(time.perf_counter() - state['started'])
+        REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+        REQUEST_QUERIES.labels(route).observe(state['queries'])
+        now = time.monotonic()
+        if pool_sampler is not None and now - _last_pool_sample >= POOL_SAMPLE_INTERVAL:
+            _last_pool_sample = now
+            pool_sampler()
+        return response
+
+
+def multiprocess_enabled():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def render_metrics():
+    """(body, content_type) in the Prometheus text exposition format,
+    aggregated across gunicorn workers when multiprocess mode is on."""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = DEFAULT_REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,7 +1,24 @@
+from functools import lru_cache
+
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
-db = SQLAlchemy()
+from db_routing import RoutingSession
+
+# RoutingSession reads from a replica on public GETs when replicas are
+# configured (see db_routing.py); otherwise it behaves like the default.
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+@lru_cache(maxsize=8192)
+def parse_aliases(raw):
+    """Split a comma-separated `aliases` value into trimmed, non-empty
+    strings. Memoized on the raw text, so repeated reads of an unchanged
+    product (every card, every page) skip the split, and an edit simply
+    produces a new key."""
+    if not raw:
+        return ()
+    return tuple(a.strip() for a in raw.split(',') if a.strip())
 
 
 class Category(db.Model):
@@ -12,6 +29,10 @@ class Category(db.Model):
     order = db.Column(db.Integer, default=0)
     products = db.relationship('Product', backref='category', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_categories_order', 'order'),
+    )
+
     def to_dict(self):
         return {'id': self.id, 'name': self.name, 'slug': self.slug, 'order': self.order}
 
@@ -29,6 +50,7 @@ class Product(db.Model):
     featured = db.Column(db.Boolean, default=False)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # SEO breadth layer — additive over the existing graos.com.py / Grãos S.A.
     # baseline. None of these fields change the slug, canonical or sitemap
@@ -40,12 +62,28 @@ class Product(db.Model):
     seo_title_override = db.Column(db.String(200), default='')
     seo_description_override = db.Column(db.Text, default='')
 
+    # Composite indexes for the hot public predicates. Every public route
+    # filters on `active` first, then narrows by category or featured and
+    # orders by name, so the leading columns follow that shape. New tables
+    # get them from create_all(); existing databases get them from
+    # app.py::_ensure_indexes() on boot.
+    __table_args__ = (
+        db.Index('ix_products_active_name', 'active', 'name'),
+        db.Index('ix_products_active_category_name', 'active', 'category_id', 'name'),
+        db.Index('ix_products_active_featured_name', 'active', 'featured', 'name'),
+        db.Index('ix_products_category_id', 'category_id'),
+        db.Index('ix_products_created_at', 'created_at'),
+        db.Index('ix_products_active_updated_at', 'active', 'updated_at'),
+    )
+
     @property
     def alias_list(self):
-        """Return aliases as a normalized list of trimmed, non-empty strings."""
-        if not self.aliases:
-            return []
-        return [a.strip() for a in self.aliases.split(',') if a.strip()]
+        """Return aliases as a normalized tuple of trimmed, non-empty strings."""
+        return parse_aliases(self.aliases)
+
+    @property
+    def category_name(self):
+        return self.category.name if self.category else ''
 
     @property
     def search_corpus(self):
@@ -59,7 +97,7 @@ class Product(db.Model):
             self.scientific_name or '',
             self.category.name if self.category else '',
             self.origin or '',
-        ] + self.alias_list
+        ] + list(self.alias_list)
         return ' '.join(parts).lower()
 
     def to_dict(self):
@@ -75,7 +113,7 @@ class Product(db.Model):
             'image': self.image,
             'featured': self.featured,
             'active': self.active,
-            'aliases': self.alias_list,
+            'aliases': list(self.alias_list),
             'scientific_name': self.scientific_name,
         }
 
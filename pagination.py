@@ -0,0 +1,109 @@
+"""Keyset (cursor) pagination for the catalog listing.
+
+Pages are ordered by (name, id) and addressed by an opaque cursor that
+encodes the (name, id) of the row at the page edge, so fetching page N is
+an index range scan from that key instead of an OFFSET that reads and
+discards every earlier row. `after=<cursor>` returns the rows following
+the cursor, `before=<cursor>` the rows preceding it (fetched in reverse
+order and flipped back).
+
+`keyset_slice()` pages an in-memory sequence the same way, with the same
+cursors (used when serving the listing from the catalog snapshot).
+"""
+import base64
+import json
+from bisect import bisect_left, bisect_right
+
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(name, id_):
+    raw = json.dumps([name, id_], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def canonical_cursor(token):
+    """`token` re-encoded, so equivalent spellings of a cursor compare
+    equal. Raises InvalidCursor."""
+    return encode_cursor(*decode_cursor(token))
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        name, id_ = json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError, UnicodeDecodeError) as exc:
+        raise InvalidCursor(token) from exc
+    if not isinstance(name, str) or not isinstance(id_, int):
+        raise InvalidCursor(token)
+    return name, id_
+
+
+class KeysetPage:
+    """One page of rows plus the cursors of its neighbours (None at the
+    ends of the listing)."""
+
+    __slots__ = ('items', 'next_cursor', 'prev_cursor')
+
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def keyset_page(query, name_col, id_col, per_page, after=None, before=None):
+    """Fetch one page of `query` ordered by (name_col, id_col).
+
+    `after` / `before` are cursor strings (at most one is honoured; `after`
+    wins). Raises InvalidCursor for tokens that don't decode.
+    """
+    if after:
+        name, id_ = decode_cursor(after)
+        query = query.filter(or_(name_col > name, and_(name_col == name, id_col > id_)))
+        rows = query.order_by(name_col, id_col).limit(per_page + 1).all()
+        has_more, has_less = len(rows) > per_page, True
+        rows = rows[:per_page]
+    elif before:
+        name, id_ = decode_cursor(before)
+        query = query.filter(or_(name_col < name, and_(name_col == name, id_col < id_)))
+        rows = query.order_by(name_col.desc(), id_col.desc()).limit(per_page + 1).all()
+        has_more, has_less = True, len(rows) > per_page
+        rows = rows[:per_page][::-1]
+    else:
+        rows = query.order_by(name_col, id_col).limit(per_page + 1).all()
+        has_more, has_less = len(rows) > per_page, False
+        rows = rows[:per_page]
+
+    def edge(row):
+        return encode_cursor(getattr(row, name_col.key), getattr(row, id_col.key))
+
+    next_cursor = edge(rows[-1]) if rows and has_more else None
+    prev_cursor = edge(rows[0]) if rows and has_less else None
+    return KeysetPage(rows, next_cursor, prev_cursor)
+
+
+def keyset_slice(rows, per_page, after=None, before=None):
+    """keyset_page() over `rows`, a sequence of objects with `name` and `id`
+    already sorted by (name, id)."""
+    def key(row):
+        return (row.name, row.id)
+
+    if after:
+        start = bisect_right(rows, decode_cursor(after), key=key)
+        end = start + per_page
+        has_more, has_less = end < len(rows), True
+    elif before:
+        end = bisect_left(rows, decode_cursor(before), key=key)
+        start = max(end - per_page, 0)
+        has_more, has_less = True, start > 0
+    else:
+        start, end = 0, per_page
+        has_more, has_less = len(rows) > per_page, False
+    items = list(rows[start:end])
+    next_cursor = encode_cursor(items[-1].name, items[-1].id) if items and has_more else None
+    prev_cursor = encode_cursor(items[0].name, items[0].id) if items and has_less else None
+    return KeysetPage(items, next_cursor, prev_cursor)
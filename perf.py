@@ -0,0 +1,199 @@
+"""Request-level performance instrumentation.
+
+Every request accumulates wall time spent in a few buckets:
+
+- db:   SQL statements, via SQLAlchemy before/after_cursor_execute hooks
+        (the count is kept alongside the time)
+- tpl:  Jinja rendering, via Flask's before_render_template /
+        template_rendered signals (includes any lazy loads the template
+        triggers, which are also counted under db)
+- http: outbound HTTP calls wrapped in `timed('http')` (Meta CAPI)
+- fs:   filesystem checks wrapped in `timed('fs')` (the img_sm filter, template_filters.py)
+
+The totals go out in a `Server-Timing` header so they show up in the
+browser devtools, and each request is folded into a per-endpoint histogram
+kept in process memory. `route_metrics()` returns those histograms; they
+are per gunicorn worker, so a scraper sees whichever worker answered.
+
+The statements themselves (truncated, with their timings) are kept on the
+request state for slowlog.py.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Upper bounds (seconds) of the latency histogram buckets; the implicit
+# last bucket is +Inf.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+TIMING_KINDS = ('db', 'tpl', 'http', 'fs')
+
+# Per-request cap on the statements remembered for the slow-request log.
+QUERY_LOG_LIMIT = 100
+QUERY_LOG_SQL_CHARS = 400
+
+
+class RouteHistogram:
+    """Latency histogram plus per-bucket time totals for one endpoint."""
+
+    __slots__ = ('buckets', 'count', 'total', 'max', 'statuses', 'queries', 'kinds')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.statuses = {}
+        self.queries = 0
+        self.kinds = dict.fromkeys(TIMING_KINDS, 0.0)
+
+    def observe(self, duration, status, timings, queries):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.queries += queries
+        for kind in TIMING_KINDS:
+            self.kinds[kind] += timings.get(kind, 0.0)
+
+    def as_dict(self):
+        count = self.count or 1
+        return {
+            'count': self.count,
+            'sum_s': round(self.total, 6),
+            'avg_ms': round(self.total / count * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'buckets': {
+                **{str(b): n for b, n in zip(LATENCY_BUCKETS, self.buckets)},
+                '+Inf': self.buckets[-1],
+            },
+            'statuses': {str(k): v for k, v in sorted(self.statuses.items())},
+            'avg_queries': round(self.queries / count, 2),
+            'avg_kind_ms': {k: round(v / count * 1000, 3) for k, v in self.kinds.items()},
+        }
+
+
+_routes = {}
+_routes_lock = threading.Lock()
+
+
+def _current():
+    """Per-request timing state, or None outside a request."""
+    if not has_request_context():
+        return None
+    return g.get('_perf')
+
+
+@contextmanager
+def timed(kind):
+    """Add the wall time of the block to the current request's `kind`
+    bucket. A no-op outside a request (boot, CLI scripts)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        state = _current()
+        if state is not None:
+            state['timings'][kind] = state['timings'].get(kind, 0.0) + time.perf_counter() - started
+
+
+# ── SQLAlchemy hooks (registered once, on every Engine) ──
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_perf_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_perf_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    state = _current()
+    if state is not None:
+        state['queries'] += 1
+        state['timings']['db'] = state['timings'].get('db', 0.0) + elapsed
+        if len(state['query_log']) < QUERY_LOG_LIMIT:
+            state['query_log'].append((statement[:QUERY_LOG_SQL_CHARS], elapsed))
+
+
+# ── Flask hooks ──
+
+def _on_before_render(sender, template, context, **extra):
+    state = _current()
+    if state is not None:
+        state['render_stack'].append(time.perf_counter())
+
+
+def _on_rendered(sender, template, context, **extra):
+    state = _current()
+    if state is not None and state['render_stack']:
+        started = state['render_stack'].pop()
+        if not state['render_stack']:
+            state['timings']['tpl'] = state['timings'].get('tpl', 0.0) + time.perf_counter() - started
+
+
+def _start_request():
+    g._perf = {
+        'started': time.perf_counter(),
+        'timings': {},
+        'queries': 0,
+        'query_log': [],
+        'render_stack': [],
+    }
+
+
+def server_timing_header(state, total):
+    parts = []
+    for kind in TIMING_KINDS:
+        if kind not in state['timings']:
+            continue
+        entry = f"{kind};dur={state['timings'][kind] * 1000:.1f}"
+        if kind == 'db':
+            entry += f';desc="{state["queries"]} queries"'
+        parts.append(entry)
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def init_perf(app):
+    """Wire the instrumentation into `app`. Call right after the app is
+    created so its after_request hook runs last and sees the final response."""
+    app.config.setdefault('SERVER_TIMING_ENABLED', True)
+    before_render_template.connect(_on_before_render, app)
+    template_rendered.connect(_on_rendered, app)
+    app.before_request(_start_request)
+
+    @app.after_request
+    def _finish_request(response):
+        state = _current()
+        if state is None:
+            return response
+        total = time.perf_counter() - state['started']
+        if app.config['SERVER_TIMING_ENABLED']:
+            response.headers['Server-Timing'] = server_timing_header(state, total)
+        endpoint = request.endpoint or 'unmatched'
+        with _routes_lock:
+            hist = _routes.get(endpoint)
+            if hist is None:
+                hist = _routes[endpoint] = RouteHistogram()
+            hist.observe(total, response.status_code, state['timings'], state['queries'])
+        return response
+
+
+def route_metrics():
+    """Snapshot of the per-endpoint histograms for this worker."""
+    with _routes_lock:
+        return {endpoint: hist.as_dict() for endpoint, hist in sorted(_routes.items())}
@@ -0,0 +1,99 @@
+"""
+Precompile every template into the Jinja bytecode cache (TEMPLATE_CACHE_DIR).
+
+Run it as a build step so the image ships with compiled templates; gunicorn
+also runs it from on_starting, before forking the workers, so a deploy
+without the build step still starts with a warm cache. Templates whose
+entry matches their current source are left alone, entries for deleted
+templates are removed (see template_cache.py).
+
+    python precompile_templates.py            # compile what is missing or stale
+    python precompile_templates.py --measure  # and time loading them cold vs. cached
+
+--measure loads every template in two fresh processes, one with an empty
+cache (what a worker paid on first render before) and one reading the
+precompiled cache, and prints the time per template and in total.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from template_cache import precompile, template_app
+
+
+def parse_args(argv):
+    from config import Config
+
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--dir', default=Config.TEMPLATE_CACHE_DIR, help='bytecode cache directory')
+    p.add_argument('--measure', action='store_true', help='time cold vs. cached template loads')
+    p.add_argument('--load-timings', metavar='DIR', help=argparse.SUPPRESS)
+    return p.parse_args(argv)
+
+
+def _app(cache_dir):
+    from config import Config
+
+    class _Config(Config):
+        TEMPLATE_CACHE_DIR = cache_dir
+
+    return template_app(_Config)
+
+
+def load_timings(cache_dir):
+    """{template: ms} to load each template once in this process."""
+    env = _app(cache_dir).jinja_env
+    timings = {}
+    for name in env.list_templates():
+        started = time.perf_counter()
+        env.get_template(name)
+        timings[name] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def _timings_in_subprocess(cache_dir):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--load-timings', cache_dir],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out)
+
+
+def measure(cache_dir):
+    with tempfile.TemporaryDirectory() as empty:
+        cold = _timings_in_subprocess(empty)
+    warm = _timings_in_subprocess(cache_dir)
+    print(f'{"template":<36} {"compile ms":>10} {"cached ms":>10}')
+    for name in sorted(cold, key=cold.get, reverse=True):
+        print(f'{name:<36} {cold[name]:>10.2f} {warm.get(name, 0):>10.2f}')
+    total_cold, total_warm = sum(cold.values()), sum(warm.values())
+    print(f'{"total":<36} {total_cold:>10.1f} {total_warm:>10.1f}'
+          f'  ({total_cold / total_warm if total_warm else 0:.1f}x)')
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.load_timings:
+        json.dump(load_timings(args.load_timings), sys.stdout)
+        return 0
+
+    report = precompile(_app(args.dir).jinja_env)
+    for name, error in sorted(report['failed'].items()):
+        print(f'  failed {name}: {error}')
+    print(f"Templates: {len(report['compiled'])} compiled, {len(report['fresh'])} up to date, "
+          f"{len(report['failed'])} failed, {report['pruned']} stale entries removed "
+          f"in {report['seconds'] * 1000:.0f} ms -> {args.dir}")
+    if args.measure:
+        measure(args.dir)
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,119 @@
+"""Read-only product summaries resident in each worker.
+
+Most pages that show other products (home featured grid, guides, related
+products, sitemaps) only need a handful of columns. Loading them as ORM
+objects means identity-map bookkeeping and instrumented attribute access
+for every row; this index holds plain `__slots__` objects instead, built
+with one joined query over the active catalog and rebuilt through
+catalog_cache.versioned_table() whenever the catalog version changes.
+
+ProductSummary exposes the same attribute names as Product (including
+`alias_list` and `category_name`), so templates render either one. It
+deliberately leaves out the long text columns (description, SEO
+overrides); pages that need those still load the Product.
+
+`ProductIndex.search()` backs the listing search box: a case- and
+accent-insensitive substring match over name, scientific name, category,
+origin and aliases, built lazily once per index.
+"""
+import unicodedata
+
+from sqlalchemy import select
+
+from catalog_cache import versioned_table
+from models import Category, Product, db, parse_aliases
+
+
+class ProductSummary:
+    __slots__ = ('id', 'slug', 'name', 'image', 'category_id', 'category_name', 'category_slug',
+                 'origin', 'presentation', 'alias_list', 'scientific_name', 'featured',
+                 'created_at', 'updated_at')
+
+    def __init__(self, row):
+        self.id = row.id
+        self.slug = row.slug
+        self.name = row.name
+        self.image = row.image or ''
+        self.category_id = row.category_id
+        self.category_name = row.category_name
+        self.category_slug = row.category_slug
+        self.origin = row.origin or ''
+        self.presentation = row.presentation or ''
+        self.alias_list = parse_aliases(row.aliases)
+        self.scientific_name = row.scientific_name or ''
+        self.featured = bool(row.featured)
+        self.created_at = row.created_at
+        self.updated_at = row.updated_at
+
+    def __repr__(self):
+        return f'<ProductSummary {self.slug}>'
+
+
+def fold(text):
+    """Lowercase `text` and strip its accents ("Té" -> "te")."""
+    return ''.join(c for c in unicodedata.normalize('NFD', text.lower()) if not unicodedata.combining(c))
+
+
+def _search_text(s):
+    return fold(' '.join((s.name, s.scientific_name, s.category_name, s.origin, *s.alias_list)))
+
+
+class ProductIndex:
+    """Active products by slug and id; `ordered` is name order."""
+
+    __slots__ = ('ordered', 'by_slug', 'by_id', '_featured', '_search_texts')
+
+    def __init__(self, summaries):
+        self.ordered = tuple(summaries)
+        self.by_slug = {s.slug: s for s in self.ordered}
+        self.by_id = {s.id: s for s in self.ordered}
+        self._featured = tuple(s for s in self.ordered if s.featured)
+        self._search_texts = None
+
+    def __len__(self):
+        return len(self.ordered)
+
+    def __iter__(self):
+        return iter(self.ordered)
+
+    def get(self, slug):
+        return self.by_slug.get(slug)
+
+    def get_many(self, slugs):
+        """{slug: summary} for the slugs that are active products."""
+        by_slug = self.by_slug
+        return {slug: by_slug[slug] for slug in slugs if slug in by_slug}
+
+    def featured(self, limit=None):
+        return self._featured[:limit]
+
+    def search(self, query, category_id=None):
+        """Products matching `query`, optionally within one category, in
+        name order."""
+        if self._search_texts is None:
+            self._search_texts = tuple(_search_text(s) for s in self.ordered)
+        needle = fold(query)
+        return [s for s, text in zip(self.ordered, self._search_texts)
+                if needle in text and (category_id is None or s.category_id == category_id)]
+
+
+def index_query():
+    """The one query the index is built from (also checked by explain_queries.py)."""
+    return (
+        select(Product.id, Product.slug, Product.name, Product.image, Product.category_id,
+               Category.name.label('category_name'), Category.slug.label('category_slug'),
+               Product.origin, Product.presentation, Product.aliases, Product.scientific_name,
+               Product.featured, Product.created_at, Product.updated_at)
+        .join(Category, Product.category_id == Category.id)
+        .where(Product.active == True)
+        .order_by(Product.name, Product.id)
+    )
+
+
+def build_product_index():
+    rows = db.session.execute(index_query())
+    return ProductIndex(ProductSummary(row) for row in rows)
+
+
+def product_index():
+    return versioned_table('product_index', build_product_index)
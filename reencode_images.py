@@ -0,0 +1,191 @@
+"""
+Bulk re-encode the uploads folder into WebP derivatives.
+
+Groups the files in UPLOAD_FOLDER by stem, picks each stem's best source
+(PNG/JPEG original, else the main WebP) and rebuilds its derivatives
+across a process pool, one stem per task. Stems whose manifest entry
+still matches the source's size/mtime and the current encoding settings
+are skipped, so re-running after an interrupted run or a single new
+upload only touches what changed. Derivatives are written atomically.
+
+    python reencode_images.py                        # everything that is stale
+    IMAGE_WEBP_QUALITY=80 python reencode_images.py  # roll out a new setting
+    python reencode_images.py --only stems.txt       # a subset (stems or filenames)
+
+The encoding defaults to IMAGE_WEBP_QUALITY / IMAGE_WEBP_METHOD from the
+config, which uploads use too; set the new value there (and in the app's
+env) to roll it out, so the next plain run keeps it. --quality / --method
+override it for one run only.
+
+Prints throughput and how many bytes the derivatives gained or saved, and
+refreshes the manifest's per-file hashes (used for upload ETags).
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+import image_pipeline as ip
+
+
+def variant_suffixes(variants):
+    return tuple(suffix for suffix, _ in variants if suffix)
+
+
+def collect_stems(folder, variants):
+    """stem -> {extension: filename} for the originals and main images in
+    `folder` (derivative files like `x-sm.webp` are folded into their stem)."""
+    suffixes = variant_suffixes(variants)
+    stems = defaultdict(dict)
+    with os.scandir(folder) as it:
+        for entry in it:
+            if not entry.is_file() or entry.name.startswith('.'):
+                continue
+            stem, ext = os.path.splitext(entry.name)
+            ext = ext.lower()
+            if ext not in ip.SOURCE_EXTENSIONS:
+                continue
+            if ext == '.webp' and stem.endswith(suffixes):
+                continue
+            stems[stem][ext] = entry.name
+    return stems
+
+
+def pick_source(files):
+    for ext in ip.SOURCE_EXTENSIONS:
+        if ext in files:
+            return files[ext]
+    return None
+
+
+def is_current(manifest, folder, stem, source, signature, variants):
+    known = manifest['sources'].get(stem)
+    if not known or known.get('source') != source or known.get('signature') != signature:
+        return False
+    st = os.stat(os.path.join(folder, source))
+    if known.get('size') != st.st_size or known.get('mtime_ns') != st.st_mtime_ns:
+        return False
+    return all(os.path.exists(os.path.join(folder, f'{stem}{suffix}.webp')) for suffix, _ in variants)
+
+
+def encode_stem(job):
+    """Worker: rebuild one stem's derivatives. Returns a result dict; never
+    raises, so one broken file doesn't stop the pool."""
+    folder, stem, source, variants, quality, method = job
+    from PIL import Image as PILImage
+
+    source_path = os.path.join(folder, source)
+    # A stem whose only source is its main WebP can't rebuild that file
+    # from itself without losing quality; only the smaller variants are redone.
+    skip = ('',) if source == f'{stem}.webp' else ()
+    targets = [f'{stem}{suffix}.webp' for suffix, _ in variants if suffix not in skip]
+    before = sum(os.path.getsize(os.path.join(folder, t)) for t in targets
+                 if os.path.exists(os.path.join(folder, t)))
+    result = {'stem': stem, 'source': source, 'before': before, 'after': 0,
+              'read': 0, 'written': [], 'error': None}
+    try:
+        st = os.stat(source_path)
+        result['read'] = st.st_size
+        with PILImage.open(source_path) as img:
+            img.load()
+            rgb = ip.to_rgb(img)
+        result['written'] = ip.write_variants(rgb, folder, stem, variants, quality, method, skip=skip)
+        result['after'] = sum(os.path.getsize(os.path.join(folder, t)) for t in result['written'])
+        result['size'] = st.st_size
+        result['mtime_ns'] = st.st_mtime_ns
+    except Exception as exc:
+        result['error'] = f'{type(exc).__name__}: {exc}'
+    return result
+
+
+def read_subset(path):
+    with open(path, encoding='utf-8') as f:
+        names = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return {os.path.splitext(os.path.basename(n))[0] for n in names}
+
+
+def parse_args(argv):
+    from config import Config
+
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--folder', default=Config.UPLOAD_FOLDER)
+    p.add_argument('--manifest', default=Config.IMAGE_MANIFEST_PATH)
+    p.add_argument('--only', default='', help='file listing the stems or filenames to process')
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    p.add_argument('--quality', type=int, default=Config.IMAGE_WEBP_QUALITY)
+    p.add_argument('--method', type=int, default=Config.IMAGE_WEBP_METHOD, choices=range(7))
+    p.add_argument('--force', action='store_true', help='re-encode even if derivatives are current')
+    p.add_argument('--dry-run', action='store_true', help='list what would be re-encoded')
+    return p.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    variants = ip.VARIANTS
+    signature = ip.encoding_signature(variants, args.quality, args.method)
+    manifest = ip.load_manifest(args.manifest)
+
+    stems = collect_stems(args.folder, variants)
+    if args.only:
+        wanted = read_subset(args.only)
+        unknown = wanted - set(stems)
+        for stem in sorted(unknown):
+            print(f'  not found: {stem}')
+        stems = {s: f for s, f in stems.items() if s in wanted}
+
+    jobs = []
+    skipped = 0
+    for stem in sorted(stems):
+        source = pick_source(stems[stem])
+        if not args.force and is_current(manifest, args.folder, stem, source, signature, variants):
+            skipped += 1
+            continue
+        jobs.append((args.folder, stem, source, variants, args.quality, args.method))
+
+    print(f'{len(stems)} images, {len(jobs)} to encode, {skipped} up to date ({signature})')
+    if args.dry_run:
+        for job in jobs:
+            print(f'  {job[1]} <- {job[2]}')
+        return 0
+
+    started = time.perf_counter()
+    done = failed = read = before = after = 0
+    if jobs:
+        workers = max(1, min(args.workers, len(jobs)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(encode_stem, jobs, chunksize=max(1, len(jobs) // (workers * 8))):
+                if result['error']:
+                    failed += 1
+                    print(f"  failed {result['source']}: {result['error']}")
+                    continue
+                done += 1
+                read += result['read']
+                before += result['before']
+                after += result['after']
+                manifest['sources'][result['stem']] = {
+                    'source': result['source'], 'size': result['size'],
+                    'mtime_ns': result['mtime_ns'], 'signature': signature,
+                }
+    elapsed = time.perf_counter() - started
+    hashed = ip.refresh_files(manifest, args.folder)
+    ip.save_manifest(args.manifest, manifest)
+
+    if jobs:
+        rate = done / elapsed if elapsed else 0
+        mb_s = read / elapsed / 1e6 if elapsed else 0
+        saved = before - after
+        pct = saved / before * 100 if before else 0
+        print(f'Encoded {done} images ({failed} failed) in {elapsed:.2f}s with {workers} workers: '
+              f'{rate:,.1f} images/s, {mb_s:,.1f} MB/s of sources')
+        print(f'Derivatives {before:,} -> {after:,} bytes (saved {saved:,}, {pct:.1f}%)')
+    print(f'Manifest: {len(manifest["files"])} files ({hashed} rehashed) -> {args.manifest}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
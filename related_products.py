@@ -0,0 +1,136 @@
+"""Precomputed related-products graph.
+
+For every active product we keep a short ranked list of neighbours. The
+score is built from four signals:
+
+- guide links: a guide's `related_slugs` (both directions), +4
+- same category, +3
+- each shared alias, +2 (aliases used by more than ALIAS_FANOUT_MAX
+  products are too generic to mean anything and are skipped)
+- same origin, +1
+
+Candidates come from inverted indexes (alias -> products, guide links),
+so building costs roughly the number of alias postings, not n². Products
+with too few scored neighbours are topped up with the products next to
+them in their category's name order.
+
+The graph is built from product_index (no query of its own) and, with the
+per-category gallery lists, rebuilt through catalog_cache.versioned_table(),
+so a page view reads it with no queries beyond the request's catalog
+version check.
+"""
+from collections import defaultdict
+from itertools import islice
+
+from catalog_cache import versioned_table
+from guias_data import GUIDES
+from product_index import product_index
+
+
+NEIGHBORS_PER_PRODUCT = 6
+ALIAS_FANOUT_MAX = 200
+
+SCORE_GUIDE = 4
+SCORE_CATEGORY = 3
+SCORE_ALIAS = 2
+SCORE_ORIGIN = 1
+
+
+class RelatedGraph:
+    __slots__ = ('cards', 'neighbors', 'category_gallery', 'category_of')
+
+    def __init__(self, cards, neighbors, category_gallery, category_of):
+        self.cards = cards                        # id -> ProductSummary
+        self.neighbors = neighbors                # id -> tuple of ids, best first
+        self.category_gallery = category_gallery  # category id -> tuple of ids
+        self.category_of = category_of            # id -> category id
+
+    def related(self, product_id, limit=4):
+        return [self.cards[i] for i in self.neighbors.get(product_id, ())[:limit]]
+
+    def gallery(self, product_id, limit=6):
+        """Other products with an image in the product's category, featured
+        first, then by name."""
+        ids = self.category_gallery.get(self.category_of.get(product_id), ())
+        return [self.cards[i] for i in islice((i for i in ids if i != product_id), limit)]
+
+
+def build_related_graph():
+    index = product_index()
+    cards = index.by_id
+    category_of = {}
+    origin_of = {}
+    aliases_of = {}
+    by_category = defaultdict(list)
+    alias_index = defaultdict(list)
+    for p in index:
+        category_of[p.id] = p.category_id
+        origin_of[p.id] = p.origin.strip().lower()
+        by_category[p.category_id].append(p.id)
+        keys = {a.lower() for a in p.alias_list}
+        aliases_of[p.id] = keys
+        for key in keys:
+            alias_index[key].append(p.id)
+    id_by_slug = {slug: p.id for slug, p in index.by_slug.items()}
+
+    guide_links = defaultdict(set)
+    for slug, guide in GUIDES.items():
+        source = id_by_slug.get(guide.get('product_slug', slug))
+        if source is None:
+            continue
+        for related_slug in guide.get('related_slugs', ()):
+            target = id_by_slug.get(GUIDES.get(related_slug, {}).get('product_slug', related_slug))
+            if target is not None and target != source:
+                guide_links[source].add(target)
+                guide_links[target].add(source)
+
+    position = {}
+    for ids in by_category.values():
+        for i, pid in enumerate(ids):
+            position[pid] = i
+
+    neighbors = {}
+    for pid in cards:
+        scores = defaultdict(int)
+        for key in aliases_of[pid]:
+            posting = alias_index[key]
+            if len(posting) > ALIAS_FANOUT_MAX:
+                continue
+            for other in posting:
+                scores[other] += SCORE_ALIAS
+        for other in guide_links.get(pid, ()):
+            scores[other] += SCORE_GUIDE
+        scores.pop(pid, None)
+        category, origin = category_of[pid], origin_of[pid]
+        for other in scores:
+            if category_of[other] == category:
+                scores[other] += SCORE_CATEGORY
+            if origin and origin_of[other] == origin:
+                scores[other] += SCORE_ORIGIN
+        ranked = sorted(scores, key=lambda o: (-scores[o], cards[o].name))[:NEIGHBORS_PER_PRODUCT]
+
+        if len(ranked) < NEIGHBORS_PER_PRODUCT:
+            # Top up with the nearest products in category name order.
+            siblings = by_category[category]
+            at = position[pid]
+            chosen = set(ranked)
+            chosen.add(pid)
+            for step in range(1, len(siblings)):
+                for j in (at + step, at - step):
+                    if 0 <= j < len(siblings) and siblings[j] not in chosen:
+                        ranked.append(siblings[j])
+                        chosen.add(siblings[j])
+                if len(ranked) >= NEIGHBORS_PER_PRODUCT:
+                    break
+            ranked = ranked[:NEIGHBORS_PER_PRODUCT]
+        neighbors[pid] = tuple(ranked)
+
+    category_gallery = {
+        category: tuple(sorted((i for i in ids if cards[i].image), key=lambda i: not cards[i].featured))
+        for category, ids in by_category.items()
+    }
+    return RelatedGraph(cards, neighbors, category_gallery, category_of)
+
+
+def related_graph():
+    return versioned_table('related_products', build_related_graph)
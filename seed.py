@@ -8,8 +8,9 @@ import json
 
 sys.path.insert(0, os.path.dirname(__file__))
 
-from app import app, db
+from app import app
 from models import Category, Product, SiteSetting
+from catalog_io import bulk_load
 
 
 def seed():
@@ -18,41 +19,22 @@ def seed():
         with open(data_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
 
-        # ── Categories ──
+        # ── Categories and products ──
+        # Each part is skipped when the table already has rows, so re-running
+        # the script doesn't bring back products deleted from the admin.
+        load = {'categories': [], 'products': []}
         if Category.query.count() > 0:
             print("Categories already exist, skipping category seed.")
         else:
-            for c in data['categories']:
-                db.session.add(Category(name=c['name'], slug=c['slug'], order=c['order']))
-            db.session.commit()
-            print(f"Seeded {len(data['categories'])} categories.")
-
-        # Helper
-        def cat(slug):
-            return Category.query.filter_by(slug=slug).first()
-
-        # ── Products ──
+            load['categories'] = data['categories']
         if Product.query.count() > 0:
             print("Products already exist, skipping product seed.")
         else:
-            for p in data['products']:
-                category = cat(p['category_slug'])
-                if not category:
-                    print(f"  Warning: category '{p['category_slug']}' not found for {p['name']}")
-                    continue
-                db.session.add(Product(
-                    name=p['name'],
-                    slug=p['slug'],
-                    category_id=category.id,
-                    origin=p.get('origin', ''),
-                    description=p.get('description', ''),
-                    presentation=p.get('presentation', ''),
-                    image=p.get('image', ''),
-                    featured=p.get('featured', False),
-                    active=p.get('active', True),
-                ))
-            db.session.commit()
-            print(f"Seeded {len(data['products'])} products.")
+            load['products'] = data['products']
+        report = bulk_load(load)
+        for slug in sorted(report.missing_categories):
+            print(f"  Warning: category '{slug}' not found")
+        print(f"Seeded {report}.")
 
         # ── Site Settings ──
         if not SiteSetting.get('whatsapp'):
@@ -0,0 +1,195 @@
+"""Slow-request log with an optional sampling profiler.
+
+Requests slower than SLOW_REQUEST_MS are written as one JSON line to a
+rotating file (SLOW_LOG_PATH): route, status, the Server-Timing buckets
+and every SQL statement with its duration (collected by perf.py from the
+cursor execute hooks).
+
+A fraction of requests (SLOW_PROFILE_SAMPLE_RATE) is also profiled by a
+single background thread per worker that snapshots the request thread's
+stack every SLOW_PROFILE_INTERVAL_MS via sys._current_frames(). Stacks are
+folded ("module:function;module:function") and counted, so the cost is a
+dict increment per sample; the thread sleeps on an Event while no request
+is being profiled. When a profiled request turns out to be slow, its
+heaviest stacks go into the log line.
+
+`worst_requests()` reads the log back for the admin page.
+"""
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+
+from flask import g, request
+
+
+PROFILE_MAX_DEPTH = 40
+PROFILE_TOP_STACKS = 15
+
+logger = logging.getLogger('ep.slow_requests')
+logger.propagate = False
+
+
+class StackSampler:
+    """Samples the stacks of registered threads on a daemon thread."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, ident):
+        profile = Counter()
+        with self._lock:
+            self._targets[ident] = profile
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='slowlog-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return profile
+
+    def stop(self, ident):
+        with self._lock:
+            self._targets.pop(ident, None)
+            if not self._targets:
+                self._wake.clear()
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                targets = list(self._targets.items())
+            if not targets:
+                continue
+            frames = sys._current_frames()
+            for ident, profile in targets:
+                frame = frames.get(ident)
+                if frame is None or ident == own:
+                    continue
+                profile[_fold(frame)] += 1
+
+
+def _fold(frame):
+    parts = []
+    while frame is not None and len(parts) < PROFILE_MAX_DEPTH:
+        code = frame.f_code
+        # Compiled Jinja templates have no __name__; their code objects
+        # carry the template file path instead.
+        module = frame.f_globals.get('__name__') or os.path.basename(code.co_filename)
+        parts.append(f'{module}:{code.co_name}:{frame.f_lineno}')
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+
+def init_slowlog(app):
+    """Register the slow-request hooks on `app`. Must run after
+    perf.init_perf(), which creates the per-request state read here."""
+    app.config.setdefault('SLOW_REQUEST_MS', 1000)
+    if not app.config.get('SLOW_LOG_PATH'):
+        app.config['SLOW_LOG_PATH'] = os.path.join(app.instance_path, 'slow_requests.log')
+    app.config.setdefault('SLOW_LOG_MAX_BYTES', 5 * 1024 * 1024)
+    app.config.setdefault('SLOW_LOG_BACKUPS', 3)
+    app.config.setdefault('SLOW_PROFILE_SAMPLE_RATE', 0.0)
+    app.config.setdefault('SLOW_PROFILE_INTERVAL_MS', 10)
+
+    threshold_ms = app.config['SLOW_REQUEST_MS']
+    if not threshold_ms or threshold_ms <= 0:
+        return
+
+    path = app.config['SLOW_LOG_PATH']
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not logger.handlers:
+        handler = RotatingFileHandler(
+            path, maxBytes=app.config['SLOW_LOG_MAX_BYTES'],
+            backupCount=app.config['SLOW_LOG_BACKUPS'], encoding='utf-8',
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+    sample_rate = app.config['SLOW_PROFILE_SAMPLE_RATE']
+    sampler = StackSampler(app.config['SLOW_PROFILE_INTERVAL_MS'] / 1000.0)
+
+    @app.before_request
+    def _maybe_profile():
+        if sample_rate and random.random() < sample_rate:
+            g._slow_profile = sampler.start(threading.get_ident())
+
+    @app.teardown_request
+    def _stop_profile(exc):
+        if g.get('_slow_profile') is not None:
+            sampler.stop(threading.get_ident())
+
+    @app.after_request
+    def _log_if_slow(response):
+        state = g.get('_perf')
+        if state is None:
+            return response
+        duration_ms = (time.perf_counter() - state['started']) * 1000
+        if duration_ms < threshold_ms:
+            return response
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'pid': os.getpid(),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint or 'unmatched',
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 1),
+            'timings_ms': {k: round(v * 1000, 1) for k, v in state['timings'].items()},
+            'query_count': state['queries'],
+            'queries': [
+                {'sql': sql, 'ms': round(elapsed * 1000, 2)}
+                for sql, elapsed in state['query_log']
+            ],
+        }
+        profile = g.get('_slow_profile')
+        if profile:
+            sampler.stop(threading.get_ident())
+            entry['profile'] = [
+                {'stack': stack, 'samples': n}
+                for stack, n in profile.most_common(PROFILE_TOP_STACKS)
+            ]
+        logger.info(json.dumps(entry, ensure_ascii=False))
+        return response
+
+
+def _read_entries(path, backups):
+    candidates = [path] + [f'{path}.{i}' for i in range(1, backups + 1)]
+    for candidate in candidates:
+        if not os.path.isfile(candidate):
+            continue
+        with open(candidate, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def worst_requests(app, limit=50):
+    """(worst entries, per-endpoint summary) from the slow log files.
+    The summary lists count, max and average duration per endpoint."""
+    entries = list(_read_entries(app.config['SLOW_LOG_PATH'], app.config['SLOW_LOG_BACKUPS']))
+    entries.sort(key=lambda e: e.get('duration_ms', 0), reverse=True)
+    summary = {}
+    for e in entries:
+        s = summary.setdefault(e.get('endpoint', '?'), {'count': 0, 'max_ms': 0.0, 'total_ms': 0.0})
+        s['count'] += 1
+        s['max_ms'] = max(s['max_ms'], e.get('duration_ms', 0))
+        s['total_ms'] += e.get('duration_ms', 0)
+    by_endpoint = sorted(
+        ({'endpoint': k, 'count': v['count'], 'max_ms': v['max_ms'],
+          'avg_ms': round(v['total_ms'] / v['count'], 1)} for k, v in summary.items()),
+        key=lambda row: row['max_ms'], reverse=True,
+    )
+    return entries[:limit], by_endpoint
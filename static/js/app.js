@@ -172,14 +172,90 @@ document.addEventListener('DOMContentLoaded', function () {
             return row;
         }
 
+        /* Product payloads prefetched for the cards in view, so opening
+           the modal usually needs no request. Cards are batched into one
+           /api/productos/lote call shortly after they scroll into view. */
+        var productCache = {};
+        var pendingSlugs = {};
+        var prefetchTimer = null;
+        var BATCH_MAX = 50;
+
+        function fetchBatch(slugs) {
+            var url = '/api/productos/lote?slugs=' + slugs.map(encodeURIComponent).join(',');
+            var req = fetch(url)
+                .then(function (r) { return r.ok ? r.json() : { products: {} }; })
+                .then(function (data) {
+                    slugs.forEach(function (s) {
+                        if (data.products[s]) productCache[s] = data.products[s];
+                        else delete productCache[s];
+                    });
+                    return data.products;
+                });
+            // Park the in-flight promise so a modal opened meanwhile waits
+            // on it instead of firing its own request.
+            slugs.forEach(function (s) {
+                if (!productCache[s] || typeof productCache[s].then === 'function') {
+                    productCache[s] = req.then(function (products) {
+                        if (!products[s]) throw new Error('missing');
+                        return products[s];
+                    });
+                }
+            });
+            req.catch(function () {
+                slugs.forEach(function (s) { delete productCache[s]; });
+            });
+        }
+
+        function flushPrefetch() {
+            prefetchTimer = null;
+            var slugs = Object.keys(pendingSlugs);
+            pendingSlugs = {};
+            for (var i = 0; i < slugs.length; i += BATCH_MAX) {
+                fetchBatch(slugs.slice(i, i + BATCH_MAX));
+            }
+        }
+
+        function queuePrefetch(slug) {
+            if (!slug || productCache[slug]) return;
+            pendingSlugs[slug] = true;
+            if (!prefetchTimer) prefetchTimer = setTimeout(flushPrefetch, 150);
+        }
+
+        var cardObserver = null;
+        if ('IntersectionObserver' in window) {
+            cardObserver = new IntersectionObserver(function (entries) {
+                entries.forEach(function (e) {
+                    if (!e.isIntersecting) return;
+                    cardObserver.unobserve(e.target);
+                    queuePrefetch(e.target.getAttribute('data-slug'));
+                });
+            }, { rootMargin: '200px 0px' });
+        }
+
+        // Exposed for cards appended after load (catalog infinite scroll).
+        window.epObserveProductCards = function (root) {
+            if (!cardObserver) return;
+            (root || document).querySelectorAll('.product-card[data-slug]').forEach(function (card) {
+                cardObserver.observe(card);
+            });
+        };
+        window.epObserveProductCards(document);
+
+        function getProduct(slug) {
+            var cached = productCache[slug];
+            if (cached) return Promise.resolve(cached);
+            return fetch('/api/producto/' + encodeURIComponent(slug))
+                .then(function (r) { return r.json(); })
+                .then(function (p) { productCache[slug] = p; return p; });
+        }
+
         function openProductModal(slug) {
             var box = modal.querySelector('.modal-body');
             setLoading(box, 'Cargando...');
             modal.classList.add('active');
             document.body.style.overflow = 'hidden';
 
-            fetch('/api/producto/' + encodeURIComponent(slug))
-                .then(function (r) { return r.json(); })
+            getProduct(slug)
                 .then(function (p) {
                     // All user-provided fields below are inserted via textContent or
                     // attribute setters that are XSS-safe. Do NOT switch back to innerHTML.
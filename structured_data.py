@@ -0,0 +1,228 @@
+"""Structured data for product pages: FAQ, HowTo and the JSON-LD blocks.
+
+Everything here depends only on the product row, its category and the
+code-defined guides, so the result is memoized per (product id,
+updated_at, catalog version) and a product page view becomes a dict
+lookup. JSON-LD is built as Python dicts and serialized with
+htmlsafe_json_dumps, which escapes <, >, & and ' so the output is safe
+inside <script> without per-field template filters.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict, namedtuple
+
+from jinja2.utils import htmlsafe_json_dumps
+
+from catalog_cache import catalog_version
+from guias_data import get_guide
+from metrics import record_cache
+
+
+SITE_URL = 'https://www.graos.com.py'
+
+# Products kept per worker. Each entry is a few KB of serialized JSON.
+STRUCTURED_DATA_CACHE_SIZE = 2048
+
+ProductStructuredData = namedtuple('ProductStructuredData', 'faq howto has_guide json_ld')
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def default_product_faq(product) -> list[dict]:
+    """Generic high-quality B2B FAQ template for products without dedicated
+    guides. Parameterized by product attributes so each product gets a
+    coherent FAQ that actually relates to itself, not boilerplate.
+
+    Used by product_structured_data() to populate FAQPage schema on every
+    canonical /producto/<slug> page. Products that DO have a dedicated
+    guide pull the richer FAQ from that guide instead.
+    """
+    aliases = product.alias_list[:4] if product.alias_list else []
+    aliases_str = ', '.join(aliases) if aliases else ''
+    cat_lower = product.category.name.lower() if product.category else ''
+    return [
+        {
+            'q': f'¿Qué es {product.name}?',
+            'a': (
+                f'{product.name}'
+                + (f' (también conocido como {aliases_str})' if aliases_str else '')
+                + f' es un producto de la categoría {product.category.name} importado al por mayor por Especias del Paraguay '
+                + (f'desde {product.origin}. ' if product.origin else 'con calidad estable lote a lote. ')
+                + (product.description if product.description else f'Ideal para industria, gastronomía profesional y reventa.')
+            ),
+        },
+        {
+            'q': f'¿De dónde es el origen de {product.name}?',
+            'a': (
+                f'Origen: {product.origin}. Importación directa con certificado de origen y análisis bromatológico básico.'
+                if product.origin else
+                'Importación directa con certificado de origen disponible bajo pedido. Cada lote viene con análisis bromatológico básico.'
+            ),
+        },
+        {
+            'q': '¿Cuál es la presentación al por mayor disponible?',
+            'a': (
+                f'Presentación estándar: {product.presentation}. Para volúmenes mayores se cotiza por proyecto.'
+                if product.presentation else
+                'Presentación según volumen requerido. Consulte por WhatsApp para cotización al volumen específico.'
+            ),
+        },
+        {
+            'q': '¿Hacen entregas a todo el Paraguay?',
+            'a': 'Sí. Despachamos a todo el territorio nacional con factura legal. Para volúmenes mayoristas trabajamos transferencia bancaria y coordinamos logística según destino.',
+        },
+        {
+            'q': '¿Trabajan con factura legal y crédito fiscal IVA?',
+            'a': 'Sí. Toda venta lleva factura legal con IVA discriminado, apta para crédito fiscal y registro contable. Sin factura no operamos.',
+        },
+        {
+            'q': f'¿Cuál es el pedido mínimo para mayoristas de {product.name}?',
+            'a': (
+                f'El formato mayorista de {product.name} es {product.presentation}. Para volúmenes menores y reventa al por menor también atendemos por consulta directa por WhatsApp.'
+                if product.presentation else
+                f'Atendemos cualquier volumen serio. Para consultar disponibilidad y cotización para {product.name}, contactar por WhatsApp.'
+            ),
+        },
+    ]
+
+
+def product_faq_and_howto(product, guide: dict | None) -> tuple[list[dict], dict | None]:
+    """Resolve the FAQ and HowTo data for a product page. If the product
+    has a dedicated editorial `guide`, use the curated FAQ + first HowTo
+    from the guide. Otherwise fall back to the generic template. Returns
+    (faq_list, howto_dict_or_None).
+    """
+    if guide:
+        faq = guide.get('faq', []) or default_product_faq(product)
+        howto = None
+        for section in guide.get('sections', []):
+            if section.get('howto'):
+                howto = section['howto']
+                break
+        return faq, howto
+    return default_product_faq(product), None
+
+
+def _product_json_ld(product, faq, howto):
+    url = f'{SITE_URL}/producto/{product.slug}'
+    aliases = list(product.alias_list)
+    alias_primary = aliases[0] if aliases else ''
+    scientific = product.scientific_name or ''
+    category_name = product.category.name if product.category else ''
+
+    blocks = []
+    item = {
+        '@context': 'https://schema.org',
+        '@type': 'Product',
+        'name': product.name,
+    }
+    if aliases:
+        item['alternateName'] = aliases
+    item['description'] = product.description or (
+        f'{product.name} — {category_name} al por mayor en Paraguay. Importación directa por Grãos S.A.'
+    )
+    item['category'] = category_name
+    if aliases or scientific:
+        item['keywords'] = ', '.join(([scientific] if scientific else []) + [product.name] + aliases)
+    if product.image:
+        item['image'] = f'{SITE_URL}{product.image}'
+    item['url'] = url
+    item['brand'] = {'@type': 'Brand', 'name': 'Grãos S.A.'}
+    item['manufacturer'] = {'@type': 'Organization', 'name': 'Grãos S.A.', '@id': f'{SITE_URL}/#organization'}
+    if product.origin:
+        item['countryOfOrigin'] = {'@type': 'Country', 'name': product.origin}
+    item['sku'] = product.slug
+    properties = []
+    if scientific:
+        properties.append({'@type': 'PropertyValue', 'name': 'Nombre científico', 'value': scientific})
+    if product.presentation:
+        properties.append({'@type': 'PropertyValue', 'name': 'Presentación', 'value': product.presentation})
+    item['additionalProperty'] = properties
+    item['audience'] = {
+        '@type': 'BusinessAudience',
+        'audienceType': 'Importadores, distribuidores, mayoristas, fábricas y restaurantes en Paraguay',
+    }
+    item['@id'] = f'{url}#product'
+    blocks.append(item)
+
+    breadcrumb = [
+        {'@type': 'ListItem', 'position': 1, 'name': 'Inicio', 'item': f'{SITE_URL}/'},
+        {'@type': 'ListItem', 'position': 2, 'name': 'Productos', 'item': f'{SITE_URL}/productos'},
+    ]
+    if product.category:
+        breadcrumb.append({'@type': 'ListItem', 'position': 3, 'name': category_name,
+                           'item': f'{SITE_URL}/productos/{product.category.slug}'})
+    breadcrumb.append({'@type': 'ListItem', 'position': len(breadcrumb) + 1, 'name': product.name})
+    blocks.append({'@context': 'https://schema.org', '@type': 'BreadcrumbList', 'itemListElement': breadcrumb})
+
+    # WebPage with `mentions` of the alias terms — an explicit hint that
+    # this URL answers each alias query.
+    if aliases:
+        name = product.name
+        if alias_primary and alias_primary != product.name:
+            name = f'{name} — {alias_primary}'
+        blocks.append({
+            '@context': 'https://schema.org',
+            '@type': 'WebPage',
+            '@id': f'{url}#webpage',
+            'url': url,
+            'name': name,
+            'inLanguage': 'es-PY',
+            'isPartOf': {'@id': f'{SITE_URL}/#website'},
+            'about': {'@id': f'{url}#product'},
+            'mentions': [{'@type': 'Thing', 'name': a} for a in aliases],
+        })
+
+    if faq:
+        blocks.append({
+            '@context': 'https://schema.org',
+            '@type': 'FAQPage',
+            '@id': f'{url}#faq',
+            'mainEntity': [
+                {'@type': 'Question', 'name': entry['q'],
+                 'acceptedAnswer': {'@type': 'Answer', 'text': entry['a']}}
+                for entry in faq
+            ],
+        })
+
+    if howto:
+        blocks.append({
+            '@context': 'https://schema.org',
+            '@type': 'HowTo',
+            'name': howto['name'],
+            'totalTime': howto.get('total_time', ''),
+            'step': [
+                {'@type': 'HowToStep', 'position': i, 'name': step['name'], 'text': step['text']}
+                for i, step in enumerate(howto.get('steps', []), 1)
+            ],
+        })
+
+    return [htmlsafe_json_dumps(block, ensure_ascii=False, indent=4) for block in blocks]
+
+
+def product_structured_data(product) -> ProductStructuredData:
+    """FAQ, HowTo, guide flag and serialized JSON-LD blocks for `product`,
+    memoized per (id, updated_at, catalog version)."""
+    key = (product.id, product.updated_at, catalog_version())
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+    if entry is not None:
+        record_cache('structured_data', 'hit')
+        return entry
+
+    guide = get_guide(product.slug)
+    faq, howto = product_faq_and_howto(product, guide)
+    entry = ProductStructuredData(
+        faq=faq, howto=howto, has_guide=bool(guide),
+        json_ld=_product_json_ld(product, faq, howto),
+    )
+    record_cache('structured_data', 'miss')
+    with _cache_lock:
+        _cache[key] = entry
+        while len(_cache) > STRUCTURED_DATA_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return entry
@@ -0,0 +1,348 @@
+"""Surrogate keys for an edge cache (CDN or caching reverse proxy) and
+targeted purges.
+
+Public GET responses are tagged with the keys of what they render:
+
+    product:<slug>   a product page or payload
+    category:<slug>  a category listing, and product pages in that category
+    guide:<slug>     a guide page
+    catalog          listings, sitemaps and APIs built from the whole catalog
+    settings         every HTML page (footer/contact data from SiteSetting)
+
+Views add keys with `tag(...)`. The after-request hook writes them to the
+`Surrogate-Key` header and, for responses an edge may store (200, no
+session cookie involved, not admin), adds `Surrogate-Control` with the
+edge TTL and its stale-while-revalidate / stale-if-error windows. The
+browser-facing Cache-Control stays short (see add_security_headers), and
+is `private, no-store` for admin and session-bound pages (`is_private`).
+
+Writes are turned into purges at the session level: a before_flush hook
+collects the keys of every Product, Category and SiteSetting being
+written (old and new slugs), and after_commit hands them to the purger in
+one call; a rollback drops them. Core bulk statements bypass the flush,
+so their callers stage keys themselves with `stage_purge(...)`.
+
+With read replicas (db_routing.py) the edge's refetch after a purge is a
+public GET served from a replica, which may not have replayed the write
+yet: it would re-render (or the view cache would serve) the old page and
+the edge would keep it for CDN_EDGE_TTL. So every purge is sent again
+once a replica still in rotation must have caught up, DB_REPLICA_MAX_LAG
+plus one DB_REPLICA_CHECK_INTERVAL after the commit; repeats falling due
+together go out in one call.
+
+The purger is chosen by CDN_PURGER:
+
+- ''      nothing to purge (no edge in front); keys are only logged at debug
+- 'http'  POST to CDN_PURGE_URL with the keys in a `Surrogate-Key` header and
+          a JSON body, authenticated with CDN_PURGE_TOKEN, from a background
+          sender thread (the commit doesn't wait on the CDN)
+- 'local' LocalEdgeCache, an in-process caching proxy wrapped around the
+          WSGI app that honours Surrogate-Control and the purges; it stands in
+          for the real edge in development and tests
+"""
+import atexit
+import logging
+import os
+import re
+import threading
+import time
+
+from flask import g, has_request_context, request, session as flask_session
+from sqlalchemy import event, inspect, select
+
+from catalog_cache import PRIVATE_SETTINGS
+from db_routing import replicas
+from models import Category, Product, SiteSetting, db
+
+
+logger = logging.getLogger('ep.surrogate_keys')
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+def tag(*keys):
+    """Add surrogate keys to the current response."""
+    if has_request_context():
+        g.setdefault('_surrogate_keys', set()).update(k for k in keys if k)
+
+
+def stage_purge(*keys, session=None):
+    """Queue keys to purge when `session` (default db.session) commits."""
+    (session or db.session).info.setdefault('purge_keys', set()).update(k for k in keys if k)
+
+
+# ── Purgers ──
+
+class NullPurger:
+    def purge(self, keys):
+        logger.debug('purge (no edge configured): %s', ' '.join(sorted(keys)))
+
+
+class HttpPurger:
+    """Posts purges from a sender thread, one per worker, so a commit never
+    waits on the CDN. Keys queued while a purge is in flight go out
+    together in the next one; whatever is still queued when the process
+    exits is sent from an atexit hook (scripts commit and exit at once)."""
+    timeout = 3
+
+    def __init__(self, url, token=''):
+        self.url = url
+        self.token = token
+        self._pending = set()
+        self._sending = False
+        self._cond = threading.Condition()
+        self._pid = None
+        atexit.register(self.flush, self.timeout * 2)
+
+    def purge(self, keys):
+        with self._cond:
+            self._pending.update(keys)
+            # Threads don't survive gunicorn's fork: start one per process.
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='cdn-purge', daemon=True).start()
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until every queued purge has been sent."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._sending, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                keys, self._pending = self._pending, set()
+                self._sending = True
+            try:
+                self._post(keys)
+            finally:
+                with self._cond:
+                    self._sending = False
+                    self._cond.notify_all()
+
+    def _post(self, keys):
+        import requests
+
+        headers = {'Surrogate-Key': ' '.join(sorted(keys))}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        try:
+            resp = requests.post(self.url, json={'keys': sorted(keys)}, headers=headers, timeout=self.timeout)
+            resp.raise_for_status()
+        except Exception:
+            logger.exception('purge failed for %d keys', len(keys))
+
+
+class LocalEdgeCache:
+    """Minimal caching reverse proxy around a WSGI app.
+
+    Stores GET 200 responses that carry Surrogate-Control for its max-age,
+    indexed by their Surrogate-Key, and serves them back with
+    `X-Edge-Cache: HIT`. Set-Cookie is stripped from stored responses, as
+    an edge configured for this site would do.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def purge(self, keys):
+        keys = set(keys)
+        with self._lock:
+            stale = [url for url, entry in self._entries.items() if entry[3] & keys]
+            for url in stale:
+                del self._entries[url]
+        logger.debug('local edge purged %d entries for %s', len(stale), ' '.join(sorted(keys)))
+        return len(stale)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') not in ('GET', 'HEAD'):
+            return self.wsgi_app(environ, start_response)
+        url = environ.get('PATH_INFO', '') + '?' + environ.get('QUERY_STRING', '')
+        entry = self._entries.get(url)
+        if entry is not None and entry[4] > time.monotonic():
+            status, headers, body, _, _ = entry
+            start_response(status, headers + [('X-Edge-Cache', 'HIT')])
+            return [body]
+
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            return start_response(status, headers + [('X-Edge-Cache', 'MISS')], exc_info)
+
+        app_iter = self.wsgi_app(environ, capture)
+        try:
+            body = b''.join(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        headers = captured.get('headers', [])
+        control = next((v for k, v in headers if k.lower() == 'surrogate-control'), '')
+        match = _MAX_AGE_RE.search(control)
+        if captured.get('status', '').startswith('200') and match and environ['REQUEST_METHOD'] == 'GET':
+            keys = set(next((v for k, v in headers if k.lower() == 'surrogate-key'), '').split())
+            stored = [(k, v) for k, v in headers
+                      if k.lower() not in ('set-cookie', 'surrogate-control', 'surrogate-key')]
+            with self._lock:
+                self._entries[url] = (captured['status'], stored, body, keys,
+                                      time.monotonic() + int(match.group(1)))
+        return [body]
+
+
+_purger = NullPurger()
+
+
+def purger():
+    return _purger
+
+
+# ── Repeating purges past replica lag ──
+
+_repeat_lock = threading.Lock()
+_repeat_due = {}  # key -> monotonic time its repeat purge is due
+_repeat_timer = None
+
+
+def _schedule_repeat(keys, delay):
+    due = time.monotonic() + delay
+    with _repeat_lock:
+        for key in keys:
+            _repeat_due[key] = max(_repeat_due.get(key, 0), due)
+        if _repeat_timer is None:
+            _arm_repeat(delay)
+
+
+def _arm_repeat(delay):
+    global _repeat_timer
+    _repeat_timer = threading.Timer(delay, _send_repeats)
+    _repeat_timer.daemon = True
+    _repeat_timer.start()
+
+
+def _send_repeats():
+    global _repeat_timer
+    now = time.monotonic()
+    with _repeat_lock:
+        keys = {key for key, due in _repeat_due.items() if due <= now}
+        for key in keys:
+            del _repeat_due[key]
+        _repeat_timer = None
+        if _repeat_due:
+            _arm_repeat(max(min(_repeat_due.values()) - now, 0))
+    if keys:
+        try:
+            _purger.purge(keys)
+        except Exception:
+            logger.exception('repeat purge failed for %d keys', len(keys))
+
+
+# ── Collecting keys from writes ──
+
+def _history_values(obj, attr):
+    """Current and previous values of a column attribute."""
+    hist = inspect(obj).attrs[attr].history
+    values = set(hist.added or ()) | set(hist.deleted or ()) | set(hist.unchanged or ())
+    current = getattr(obj, attr, None)
+    if current is not None:
+        values.add(current)
+    return {v for v in values if v is not None}
+
+
+def _keys_for_flush(session):
+    keys = set()
+    category_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Product):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            keys.add('catalog')
+            keys.update(f'product:{s}' for s in _history_values(obj, 'slug'))
+            category_ids.update(_history_values(obj, 'category_id'))
+        elif isinstance(obj, Category):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            keys.add('catalog')
+            keys.update(f'category:{s}' for s in _history_values(obj, 'slug'))
+        elif isinstance(obj, SiteSetting) and obj.key not in PRIVATE_SETTINGS:
+            keys.add('settings')
+    if category_ids:
+        with session.no_autoflush:
+            slugs = session.execute(select(Category.slug).where(Category.id.in_(category_ids))).scalars()
+            keys.update(f'category:{s}' for s in slugs)
+    return keys
+
+
+def _is_admin():
+    return (request.endpoint or '').startswith('admin') or request.path.startswith('/admin')
+
+
+def is_private(response):
+    """Admin pages and responses that read or wrote the session (CSRF
+    token, flashes, login) are per-visitor: no shared cache may store them."""
+    return _is_admin() or flask_session.accessed or 'Cookie' in response.vary
+
+
+def is_storable(response):
+    """A 200 to a public GET/HEAD that an edge or shared cache may store."""
+    return request.method in ('GET', 'HEAD') and response.status_code == 200 \
+        and not is_private(response)
+
+
+def _edge_headers(app, response):
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200 or _is_admin():
+        return response
+    keys = set(g.get('_surrogate_keys', ()))
+    if 'text/html' in (response.content_type or ''):
+        keys.add('settings')
+    if not keys:
+        return response
+    response.headers['Surrogate-Key'] = ' '.join(sorted(keys))
+    if is_storable(response) and not response.headers.get('Surrogate-Control'):
+        response.headers['Surrogate-Control'] = (
+            f"max-age={app.config['CDN_EDGE_TTL']}, "
+            f"stale-while-revalidate={app.config['CDN_STALE_WHILE_REVALIDATE']}, "
+            f"stale-if-error={app.config['CDN_STALE_IF_ERROR']}"
+        )
+    return response
+
+
+def init_surrogate_keys(app):
+    """Tag responses, wire the purge hooks and pick the purger."""
+    global _purger
+    kind = app.config.get('CDN_PURGER', '')
+    if kind == 'http':
+        _purger = HttpPurger(app.config['CDN_PURGE_URL'], app.config.get('CDN_PURGE_TOKEN', ''))
+    elif kind == 'local':
+        _purger = LocalEdgeCache(app.wsgi_app)
+        app.wsgi_app = _purger
+    else:
+        _purger = NullPurger()
+
+    app.after_request(lambda response: _edge_headers(app, response))
+    repeat_after = (app.config['DB_REPLICA_MAX_LAG'] + app.config['DB_REPLICA_CHECK_INTERVAL']
+                    if replicas() else 0)
+
+    @event.listens_for(db.session, 'before_flush')
+    def _collect_purge_keys(session, flush_context, instances):
+        keys = _keys_for_flush(session)
+        if keys:
+            session.info.setdefault('purge_keys', set()).update(keys)
+
+    @event.listens_for(db.session, 'after_commit')
+    def _send_purge(session):
+        keys = session.info.pop('purge_keys', None)
+        if keys:
+            _purger.purge(keys)
+            if repeat_after:
+                _schedule_repeat(keys, repeat_after)
+
+    @event.listens_for(db.session, 'after_rollback')
+    def _drop_purge(session):
+        session.info.pop('purge_keys', None)
@@ -0,0 +1,112 @@
+"""Persistent Jinja bytecode cache and template precompilation.
+
+Without it every worker compiles each template (Jinja source -> Python
+source -> code object) the first time it renders it, so the first visits
+after a deploy or a worker restart pay for the compiles of base.html, the
+page and its macros. With it the app's Jinja environment reads and writes
+compiled templates in TEMPLATE_CACHE_DIR, and `precompile()` fills that
+directory ahead of time: from gunicorn's on_starting hook, before any
+worker forks, and from `python precompile_templates.py` as a build step.
+
+Invalidation is Jinja's own: each entry stores the checksum of the
+template source it was compiled from, and an entry whose checksum no
+longer matches (or that was written by another Python version) is
+ignored and recompiled. The Jinja version is part of the file names, so
+an upgrade starts from an empty set. Entries for templates that no
+longer exist are pruned by `precompile()`.
+
+The directory may be read-only in the running image: failing to write an
+entry only costs that worker a compile, as before.
+"""
+import os
+import time
+
+import jinja2
+from flask import Flask
+from jinja2 import FileSystemBytecodeCache
+
+from template_filters import TEMPLATE_FILTERS
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+_PATTERN = f'__jinja2_{jinja2.__version__}_%s.cache'
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache that never fails a render over a write."""
+
+    def __init__(self, directory):
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            pass
+        super().__init__(directory, _PATTERN)
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+    def write(self, bucket):
+        """dump_bytecode that raises, for precompile()."""
+        super().dump_bytecode(bucket)
+
+    def entry_path(self, bucket):
+        return self._get_cache_filename(bucket)
+
+
+def init_template_cache(app):
+    """Give the app's Jinja environment the bytecode cache. Must run before
+    anything touches app.jinja_env (it is created on first access)."""
+    app.jinja_options = {
+        **app.jinja_options,
+        'bytecode_cache': TemplateBytecodeCache(app.config['TEMPLATE_CACHE_DIR']),
+    }
+
+
+def template_app(config=None):
+    """A Flask app whose Jinja environment compiles templates exactly as the
+    real one does (same templates path, options and filters), without
+    importing app.py and its database setup."""
+    if config is None:
+        from config import Config as config
+    app = Flask('app', root_path=ROOT)
+    app.config.from_object(config)
+    init_template_cache(app)
+    app.jinja_env.filters.update(TEMPLATE_FILTERS)
+    return app
+
+
+def precompile(env):
+    """Compile every template whose cache entry is missing or stale, the
+    way Jinja's loader does on a render, and prune entries for templates
+    that are gone. Returns {'compiled': [...], 'fresh': [...],
+    'failed': {name: error}, 'pruned': n, 'seconds': s}."""
+    bcc = env.bytecode_cache
+    report = {'compiled': [], 'fresh': [], 'failed': {}, 'pruned': 0}
+    started = time.perf_counter()
+    keep = set()
+    for name in env.loader.list_templates():
+        try:
+            source, filename, _ = env.loader.get_source(env, name)
+            bucket = bcc.get_bucket(env, name, filename, source)
+            keep.add(os.path.basename(bcc.entry_path(bucket)))
+            if bucket.code is not None:
+                report['fresh'].append(name)
+                continue
+            bucket.code = env.compile(source, name, filename)
+            bcc.write(bucket)
+        except Exception as exc:
+            report['failed'][name] = f'{type(exc).__name__}: {exc}'
+            continue
+        report['compiled'].append(name)
+    for entry in os.scandir(bcc.directory) if os.path.isdir(bcc.directory) else ():
+        if entry.name.endswith('.cache') and entry.name not in keep:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+            report['pruned'] += 1
+    report['seconds'] = time.perf_counter() - started
+    return report
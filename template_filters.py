@@ -0,0 +1,39 @@
+"""Jinja filters.
+
+Kept out of app.py so precompile_templates.py can build the same Jinja
+environment as the app without importing it (and touching the database):
+compiling a template checks that every filter it uses is registered.
+"""
+import os
+
+from flask import current_app
+
+from perf import timed
+
+
+def img_sm(image_path):
+    """Return the -sm (400px thumbnail) variant of an image path,
+    but ONLY if the -sm file actually exists on disk. Otherwise return
+    the original path so the browser always has a working image."""
+    if not image_path:
+        return image_path
+    if '.' not in image_path:
+        return image_path
+    base, ext = image_path.rsplit('.', 1)
+    sm_path = f"{base}-sm.{ext}"
+
+    # Resolve the filesystem path to check existence
+    sm_filename = sm_path.split('/')[-1]
+    full_path = os.path.join(current_app.config['UPLOAD_FOLDER'], sm_filename)
+    with timed('fs'):
+        sm_exists = os.path.isfile(full_path)
+    if sm_exists:
+        # Return the -sm URL using the same prefix as the original
+        prefix = image_path.rsplit('/', 1)[0]  # e.g. /static/uploads or /uploads
+        return f"{prefix}/{sm_filename}"
+    return image_path
+
+
+TEMPLATE_FILTERS = {
+    'img_sm': img_sm,
+}
@@ -0,0 +1,117 @@
+"""Serving files from the uploads folder (/uploads/<name> and, on Railway,
+/static/uploads/<name>).
+
+Upload filenames are unique per upload (uuid stems), but re-encodes
+(reencode_images.py) rewrite the files in place under the same URL, so
+responses are cacheable for MAX_AGE and then revalidated rather than
+`immutable`: a re-encode reaches browsers and the CDN within MAX_AGE,
+and stale-while-revalidate keeps the revalidation off the critical path.
+Revalidation is a cheap 304 against a strong ETag: the file's sha256
+from the image manifest (image_pipeline.py) when the manifest entry
+still matches the file's size and mtime, otherwise hashed once per worker
+and remembered under the same (size, mtime) key.
+
+How the bytes leave the worker depends on UPLOADS_OFFLOAD:
+
+- 'x-accel':    empty response with `X-Accel-Redirect: <UPLOADS_ACCEL_PREFIX><name>`;
+                nginx serves the file from an internal location.
+- 'x-sendfile': empty response with `X-Sendfile: <absolute path>` (Apache
+                mod_xsendfile, lighttpd).
+- '' (default): werkzeug send_file, which answers conditional and Range
+                requests itself and hands whole-file responses to the
+                server's wsgi.file_wrapper (gunicorn uses sendfile(2)).
+"""
+import mimetypes
+import os
+import threading
+import time
+
+from flask import Response, abort, request, send_file
+from werkzeug.security import safe_join
+
+import image_pipeline
+
+
+MAX_AGE = 3600
+CACHE_CONTROL = f'public, max-age={MAX_AGE}, stale-while-revalidate=86400'
+MANIFEST_RECHECK = 30.0  # seconds between manifest mtime checks
+
+
+class _Etags:
+    """sha256 per upload, from the manifest or computed and remembered."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._manifest_path = None
+        self._manifest_mtime = None
+        self._checked = 0.0
+        self._files = {}
+        self._computed = {}
+
+    def _manifest_files(self, path):
+        now = time.monotonic()
+        if path != self._manifest_path or now - self._checked > MANIFEST_RECHECK:
+            with self._lock:
+                self._checked = now
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    mtime = None
+                if path != self._manifest_path or mtime != self._manifest_mtime:
+                    self._manifest_path = path
+                    self._manifest_mtime = mtime
+                    self._files = image_pipeline.load_manifest(path)['files'] if mtime else {}
+        return self._files
+
+    def get(self, manifest_path, name, full_path, st):
+        entry = self._manifest_files(manifest_path).get(name)
+        if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+            return entry['sha256']
+        key = (name, st.st_size, st.st_mtime_ns)
+        digest = self._computed.get(key)
+        if digest is None:
+            digest = image_pipeline.file_digest(full_path)
+            with self._lock:
+                self._computed[key] = digest
+        return digest
+
+
+_etags = _Etags()
+
+
+def serve_upload(app, filename):
+    folder = app.config['UPLOAD_FOLDER']
+    if filename.startswith('.'):
+        abort(404)
+    path = safe_join(folder, filename)
+    if path is None:
+        abort(404)
+    try:
+        st = os.stat(path)
+    except OSError:
+        abort(404)
+    if not os.path.isfile(path):
+        abort(404)
+
+    etag = _etags.get(app.config['IMAGE_MANIFEST_PATH'], filename, path, st)[:32]
+    offload = app.config.get('UPLOADS_OFFLOAD', '')
+
+    if offload in ('x-accel', 'x-sendfile'):
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = Response(mimetype=mimetype)
+        response.set_etag(etag)
+        response.last_modified = st.st_mtime
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+            return response
+        if offload == 'x-accel':
+            response.headers['X-Accel-Redirect'] = app.config['UPLOADS_ACCEL_PREFIX'] + filename
+        else:
+            response.headers['X-Sendfile'] = os.path.abspath(path)
+        return response
+
+    response = send_file(path, etag=etag, max_age=MAX_AGE, conditional=True,
+                         last_modified=st.st_mtime)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
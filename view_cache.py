@@ -0,0 +1,339 @@
+"""Shared rendered-page cache with stale-while-revalidate and single-flight
+regeneration.
+
+`@cached_view(name)` stores a view's rendered response in VIEW_CACHE_DIR,
+one file per page, shared by every gunicorn worker on the host. An entry
+is fresh while the content version it was rendered under (catalog version
++ site settings version, read in one query) is still current and it is
+younger than VIEW_CACHE_TTL. Otherwise:
+
+- the worker that takes the page's fcntl lock re-renders it, alone;
+- every other worker keeps serving the stale entry meanwhile, or waits
+  on the lock when there is nothing to serve yet, then reads what the
+  regenerating worker wrote;
+- if the database errors (version read or render), an entry up to
+  VIEW_CACHE_STALE_IF_ERROR old is served instead of the error.
+
+Lookups are counted in ep_cache_requests_total{cache=name, result=hit|stale|miss}.
+
+Cached pages must not contain per-visitor data. Requests carrying flash
+messages bypass the cache, responses that touched the session are not
+stored, and the Meta Pixel PageView event id is rendered as
+PAGE_EVENT_ID_SENTINEL and replaced with a fresh id on every response.
+Surrogate keys the view added are stored with the entry and re-applied.
+Requests served from the catalog snapshot (catalog_snapshot.py) render
+the view directly and are not stored.
+
+The body of a cached page may depend only on the request path and its
+`vary_args`, which `normalize` can canonicalize (cursors) so equivalent
+spellings share one entry. Query arguments can still mint any number of
+keys, so after a save a worker prunes the directory at most every
+PRUNE_INTERVAL seconds: entries too old to be served even on error, the
+oldest beyond VIEW_CACHE_MAX_ENTRIES, and idle lock and temp files.
+
+An entry is one file: a JSON header line (key, version, status, headers,
+surrogate keys) followed by the raw body, so reading one never runs
+code. VIEW_CACHE_DIR (default instance/view-cache) is created 0700, and
+`init_view_cache` turns the cache off, with an error in the log, when the
+directory belongs to another user or others can write to it.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import stat
+import time
+import uuid
+from functools import wraps
+
+from flask import Response, current_app, g, make_response, request, session
+from sqlalchemy import event, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from catalog_cache import CATALOG_VERSION_KEY, PRIVATE_SETTINGS, SETTINGS_VERSION_KEY, catalog_pinned
+from metrics import record_cache
+from models import SiteSetting, db
+from surrogate_keys import tag as surrogate_tag
+
+
+PAGE_EVENT_ID_SENTINEL = '__ep_page_event_id_0000000000000__'
+
+_DROP_HEADERS = {'content-length', 'set-cookie', 'vary'}
+PRUNE_INTERVAL = 300  # seconds between prunes, per worker
+
+_last_prune = 0.0
+
+
+def rendering_for_cache():
+    return g.get('_view_cache_render', False)
+
+
+def page_event_id():
+    """Meta Pixel PageView event id for the page being rendered."""
+    return PAGE_EVENT_ID_SENTINEL if rendering_for_cache() else uuid.uuid4().hex
+
+
+def _content_version():
+    rows = dict(db.session.execute(
+        select(SiteSetting.key, SiteSetting.value)
+        .where(SiteSetting.key.in_((CATALOG_VERSION_KEY, SETTINGS_VERSION_KEY)))
+    ).all())
+    if rows.get(CATALOG_VERSION_KEY):
+        g._catalog_version = rows[CATALOG_VERSION_KEY]
+    return f'{rows.get(CATALOG_VERSION_KEY, "")}:{rows.get(SETTINGS_VERSION_KEY, "")}'
+
+
+# ── Storage ──
+
+class _Store:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + ext)
+
+    def load(self, key):
+        try:
+            with open(self._path(key, '.page'), 'rb') as f:
+                header, _, body = f.read().partition(b'\n')
+            entry = json.loads(header)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get('key') != key:
+            return None
+        entry['headers'] = [tuple(h) for h in entry['headers']]
+        entry['body'] = body
+        return entry
+
+    def save(self, key, entry):
+        path = self._path(key, '.page')
+        tmp = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+        header = {k: v for k, v in entry.items() if k != 'body'}
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+            f.write(json.dumps(header, separators=(',', ':')).encode('utf-8'))
+            f.write(b'\n')
+            f.write(entry['body'])
+        os.replace(tmp, path)
+
+    def lock(self, key):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        return os.open(self._path(key, '.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+
+    def prune(self, max_age, max_entries, idle_age):
+        """Remove entries older than `max_age`, then the oldest beyond
+        `max_entries`, and lock/temp files idle for `idle_age` whose entry
+        is gone. Returns the number of files removed."""
+        now = time.time()
+        pages, others = [], []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    continue
+                (pages if entry.name.endswith('.page') else others).append((mtime, entry.path))
+        pages.sort(reverse=True)
+        doomed = [path for i, (mtime, path) in enumerate(pages) if i >= max_entries or now - mtime > max_age]
+        kept = {path[:-len('.page')] for _, path in pages} - {path[:-len('.page')] for path in doomed}
+        removed = 0
+        for path in doomed:
+            removed += _unlink(path)
+        for mtime, path in others:
+            if now - mtime <= idle_age or path.rsplit('.', 1)[0] in kept:
+                continue
+            if path.endswith('.lock'):
+                try:
+                    fd = os.open(path, os.O_RDWR)
+                except OSError:
+                    continue
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # someone is rendering that page right now
+                else:
+                    removed += _unlink(path)
+                finally:
+                    os.close(fd)
+            elif path.endswith('.tmp'):
+                removed += _unlink(path)
+        return removed
+
+
+def _check_directory(directory):
+    """Create `directory` 0700 if missing; return why it can't be used
+    (another user's, or writable by others), or None."""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode):
+        return 'not a directory'
+    if st.st_uid != os.getuid():
+        return f'owned by uid {st.st_uid}'
+    if st.st_mode & 0o022:
+        return f'writable by others (mode {stat.S_IMODE(st.st_mode):o})'
+    return None
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except OSError:
+        return 0
+    return 1
+
+
+def _maybe_prune(store, config):
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune < PRUNE_INTERVAL:
+        return
+    _last_prune = now
+    fd = store.lock('.prune')
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return  # another worker is pruning
+    try:
+        removed = store.prune(config['VIEW_CACHE_STALE_IF_ERROR'], config['VIEW_CACHE_MAX_ENTRIES'],
+                              PRUNE_INTERVAL)
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+    if removed:
+        current_app.logger.info('view cache: pruned %d files', removed)
+
+
+def _serve(entry):
+    body = entry['body'].replace(PAGE_EVENT_ID_SENTINEL.encode(), uuid.uuid4().hex.encode())
+    surrogate_tag(*entry['keys'])
+    return Response(body, status=entry['status'], headers=entry['headers'])
+
+
+def _render(view, args, kwargs, version, key):
+    g._view_cache_render = True
+    try:
+        response = make_response(view(*args, **kwargs))
+    finally:
+        g._view_cache_render = False
+    if response.status_code != 200 or response.is_streamed or session.accessed:
+        body = response.get_data().replace(PAGE_EVENT_ID_SENTINEL.encode(), uuid.uuid4().hex.encode())
+        response.set_data(body)
+        return response, None
+    entry = {
+        'key': key,
+        'version': version,
+        'created': time.time(),
+        'status': response.status_code,
+        'headers': [(k, v) for k, v in response.headers.items() if k.lower() not in _DROP_HEADERS],
+        'body': response.get_data(),
+        'keys': sorted(g.get('_surrogate_keys', ())),
+    }
+    return _serve(entry), entry
+
+
+def cached_view(name, vary_args=(), bypass_args=(), normalize=None):
+    """Cache a GET view. Only the query arguments in `vary_args` are part
+    of the cache key; others are ignored. `normalize` maps some of them to
+    a function returning their canonical form; a ValueError from it means
+    the argument is invalid, and the request renders directly. Requests
+    carrying any of `bypass_args` (free-text searches) render directly too."""
+    normalize = normalize or {}
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            if not config['VIEW_CACHE_ENABLED'] or request.method != 'GET' or '_flashes' in session \
+                    or catalog_pinned() or any(a in request.args for a in bypass_args):
+                return view(*args, **kwargs)
+            try:
+                varied = '&'.join(f'{a}={normalize.get(a, str)(request.args[a])}'
+                                  for a in vary_args if request.args.get(a))
+            except ValueError:
+                return view(*args, **kwargs)
+            key = f'{name}:{request.path}?{varied}'
+            store = _Store(config['VIEW_CACHE_DIR'])
+            entry = store.load(key)
+            age = time.time() - entry['created'] if entry else None
+            stale_limit = config['VIEW_CACHE_STALE_IF_ERROR']
+
+            try:
+                version = _content_version()
+            except SQLAlchemyError:
+                if entry and age < stale_limit:
+                    current_app.logger.warning('view cache %s: database error, serving stale %s', name, key)
+                    record_cache(name, 'stale')
+                    return _serve(entry)
+                raise
+
+            if entry and entry['version'] == version and age < config['VIEW_CACHE_TTL']:
+                record_cache(name, 'hit')
+                return _serve(entry)
+
+            fd = store.lock(key)
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    if entry and age < stale_limit:
+                        # Someone else is regenerating; keep serving what we have.
+                        record_cache(name, 'stale')
+                        return _serve(entry)
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    fresh = store.load(key)
+                    if fresh and fresh['version'] == version:
+                        record_cache(name, 'hit')
+                        return _serve(fresh)
+
+                try:
+                    response, new_entry = _render(view, args, kwargs, version, key)
+                except SQLAlchemyError:
+                    if entry and age < stale_limit:
+                        current_app.logger.warning('view cache %s: render failed, serving stale %s', name, key)
+                        record_cache(name, 'stale')
+                        return _serve(entry)
+                    raise
+                record_cache(name, 'miss')
+                if new_entry is not None:
+                    store.save(key, new_entry)
+                    _maybe_prune(store, config)
+                return response
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+        return wrapper
+
+    return decorator
+
+
+def init_view_cache(app):
+    """Check VIEW_CACHE_DIR (the cache is turned off if it is unsafe), and
+    bump the settings version whenever a public SiteSetting is written, so
+    cached pages pick up footer/contact changes."""
+    if not app.config.get('VIEW_CACHE_DIR'):
+        app.config['VIEW_CACHE_DIR'] = os.path.join(app.instance_path, 'view-cache')
+    if app.config['VIEW_CACHE_ENABLED']:
+        try:
+            problem = _check_directory(app.config['VIEW_CACHE_DIR'])
+        except OSError as exc:
+            problem = str(exc)
+        if problem:
+            app.logger.error('view cache disabled, %s: %s', app.config['VIEW_CACHE_DIR'], problem)
+            app.config['VIEW_CACHE_ENABLED'] = False
+
+    @event.listens_for(db.session, 'before_flush')
+    def _bump_settings_version(session, flush_context, instances):
+        for obj in (*session.new, *session.dirty):
+            if isinstance(obj, SiteSetting) and obj.key not in PRIVATE_SETTINGS \
+                    and (obj in session.new or session.is_modified(obj)):
+                break
+        else:
+            return
+        token = uuid.uuid4().hex
+        with session.no_autoflush:
+            row = session.query(SiteSetting).filter_by(key=SETTINGS_VERSION_KEY).first()
+            if row is None:
+                session.add(SiteSetting(key=SETTINGS_VERSION_KEY, value=token))
+            else:
+                row.value = token